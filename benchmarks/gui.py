@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+GUI benchmark: cost of the host table in MainWindow as the number of hosts
+grows, rendered offscreen against a stub server.
+
+Every host count runs in a fresh process with its own HOME:
+
+  populate   update_hosts_view with every host, from the /bootstrap reply
+  paint      first paint after populating, then full repaints of the
+             viewport at the top and at the bottom of the list
+  refresh    refresh_hosts until the view is updated; each scan returns
+             the hosts with 10% of their hostnames changed
+  memory     RSS growth across populate and first paint, per row; the host
+             dicts decoded from the reply are not counted
+  actions    selecting the middle row, then cut and resume of it: the time
+             to the optimistic update and to the server's confirmation
+
+    python benchmarks/gui.py [--hosts 100,1000,5000,10000] [--repeat 5] [--json] [--pin-singletons]
+
+PySide6 6.12.0 on Python 3.11 (seen here; other releases not checked)
+drops a reference to True or False on signal emits and to None on virtual
+calls returning it, such as data(). Before Python 3.12 made them immortal,
+a long run frees one and aborts with 'bool_dealloc' or 'none_dealloc'.
+--pin-singletons works around it by holding 3 million extra references to
+them, frozen out of the garbage collector and taken before anything is
+measured; results with it are marked, and the client itself is not changed.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CLIENT_DIR = os.path.join(ROOT, 'client')
+SERVER_DIR = os.path.join(ROOT, 'server')
+IFACE = 'eth0'
+HISTORY = [0.4, 0.5, None, 0.6, 0.5, 0.4, 0.7, 0.5, 0.5, 0.6, None, 0.4, 0.5, 0.5, 0.6, 0.4, 0.5, 0.8, 0.5, 0.4]
+
+
+def fake_hosts(count, generation=0):
+    """
+    :param generation: Changes the hostname of every tenth host.
+    """
+    return [{'ip': f'10.{i // 65536}.{i // 256 % 256}.{i % 256}',
+             'mac': '02:00:00:%02x:%02x:%02x' % (i // 65536, i // 256 % 256, i % 256),
+             'hostname': f'host-{i}' + (f'-{generation}' if i % 10 == 0 else ''),
+             'source': 'arp', 'iface': IFACE} for i in range(count)]
+
+
+def serve(path):
+    """
+    Serves a stub of the daemon API on the Unix socket at path, with the
+    listener the server uses. Returns the dict holding the host count.
+    """
+    sys.path.insert(0, SERVER_DIR)
+    from bottle import Bottle, request
+    from listeners import make_unix_server, KeepAliveRequestHandler
+
+    KeepAliveRequestHandler.log_message = lambda self, *args: None
+    state = {'hosts': 0, 'scans': 0}
+    gw = {'ip': '10.0.0.1', 'mac': '02:00:00:00:00:01', 'hostname': '', 'iface': IFACE}
+    my = {'ip': '10.0.0.2', 'mac': '02:00:00:00:00:02', 'netmask': '255.0.0.0', 'hostname': ''}
+    app = Bottle()
+
+    @app.get('/bootstrap')
+    def bootstrap():
+        return {'status': 'success', 'iface': IFACE, 'gw': gw, 'my': my,
+                'interfaces': [{'iface': IFACE, 'gw': gw, 'my': my}],
+                'hosts': {IFACE: fake_hosts(state['hosts'])}, 'victims': []}
+
+    @app.get('/interfaces/<iface>/scan')
+    def scan(iface):
+        state['scans'] += 1
+        return {'status': 'success', 'result': {'iface': iface, 'hosts': fake_hosts(state['hosts'], state['scans'])}}
+
+    @app.get('/hosts/history')
+    def history():
+        return {'status': 'success', 'hosts': {host['mac']: {'up': True, 'rtt': HISTORY}
+                                               for host in fake_hosts(state['hosts'])}}
+
+    @app.post('/cut')
+    @app.post('/resume')
+    def action():
+        return {'status': 'success', 'result': {'status': 'success', 'ip': request.json['ip']}}
+
+    server = make_unix_server(app, path, group=None)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return state
+
+
+def rss_kib():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+PIN_SINGLETONS = 1000000 # References held to each of True, False and None with --pin-singletons
+SINGLETON_CRASH = ('bool_dealloc', 'none_dealloc')
+
+
+def child(path, repeat, pin_singletons=False):
+    """
+    Runs one window against the stub and prints its timings as JSON.
+    """
+    pinned = None
+    if pin_singletons:
+        pinned = (True, False, None) * PIN_SINGLETONS # See the module docstring
+        gc.freeze() # So collections during the run do not traverse them
+    sys.path.insert(0, CLIENT_DIR)
+    from PySide6.QtCore import QObject, QEvent
+    from PySide6.QtWidgets import QApplication
+    import main_window
+    from transport import Transport
+
+    main_window.api = Transport(socket_path=path)
+    main_window.MainWindow.ensure_root_access = lambda self: True
+    main_window.MainWindow.ask_cut_duration = lambda self, host: (None, True)
+    app = QApplication(sys.argv[:1])
+    window = main_window.MainWindow()
+    view = window.hosts_view
+    result = dict()
+    updates = list() # Durations of update_hosts_view calls, in ms
+    paints = [0]
+    memory = dict()
+
+    def wait(done, timeout=120):
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                raise TimeoutError('the window did not get there in time')
+            app.processEvents()
+            time.sleep(0.0005)
+
+    # Time every update of the view, whichever path it comes from
+    update_hosts_view = window.update_hosts_view
+    def timed_update(iface, hosts):
+        if not updates:
+            memory['before'] = rss_kib()
+        started = time.perf_counter()
+        update_hosts_view(iface, hosts)
+        updates.append((time.perf_counter() - started) * 1000)
+    window.update_hosts_view = timed_update
+
+    class PaintCounter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                paints[0] += 1
+            return False
+
+    counter = PaintCounter()
+    view.viewport().installEventFilter(counter)
+    window.resize(1024, 768)
+    window.show()
+
+    # Populate from /bootstrap, then the first paint
+    wait(lambda: updates)
+    result['rows'] = window.hosts_model.rowCount()
+    result['populate_ms'] = updates[0]
+    started, seen = time.perf_counter(), paints[0]
+    wait(lambda: paints[0] > seen)
+    result['first_paint_ms'] = (time.perf_counter() - started) * 1000
+    result['kib_per_row'] = (rss_kib() - memory['before']) / max(1, result['rows'])
+    wait(lambda: len(updates) > 1) # The scan started by on_bootstrap
+
+    # Full repaints at the top and at the bottom of the list
+    for where, scroll in (('top', view.scrollToTop), ('bottom', view.scrollToBottom)):
+        scroll()
+        app.processEvents()
+        samples = list()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            view.viewport().repaint()
+            samples.append((time.perf_counter() - started) * 1000)
+        result[f'repaint_{where}_ms'] = statistics.median(samples)
+    view.scrollToTop()
+
+    # Refreshes, each applying a 10% diff
+    samples = list()
+    for _ in range(repeat):
+        count = len(updates)
+        started = time.perf_counter()
+        window.refresh_hosts()
+        wait(lambda: len(updates) > count)
+        samples.append((time.perf_counter() - started) * 1000)
+    result['refresh_ms'] = statistics.median(samples)
+    result['refresh_update_ms'] = statistics.median(updates[-repeat:])
+
+    # Actions on the selected row
+    selects, applies, round_trips = list(), list(), list()
+    middle = window.hosts_proxy.index(result['rows'] // 2, 0)
+    for _ in range(repeat):
+        for action in (window.cut_host, window.resume_host):
+            started = time.perf_counter()
+            view.setCurrentIndex(middle)
+            window.selected_host()
+            selected = time.perf_counter()
+            action()
+            applied = time.perf_counter()
+            wait(lambda: window.actions.pending == 0)
+            selects.append((selected - started) * 1000)
+            applies.append((applied - selected) * 1000)
+            round_trips.append((time.perf_counter() - selected) * 1000)
+    result['select_ms'] = statistics.median(selects)
+    result['action_apply_ms'] = statistics.median(applies)
+    result['action_round_trip_ms'] = statistics.median(round_trips)
+
+    result['pinned_singletons'] = pinned is not None
+    print(json.dumps(result), flush=True)
+    os._exit(0) # Skip joining the scan and action threads
+
+
+COLUMNS = (('rows', 'hosts', '{:.0f}'), ('populate_ms', 'populate ms', '{:.1f}'),
+           ('first_paint_ms', 'paint ms', '{:.1f}'), ('repaint_top_ms', 'repaint ms', '{:.2f}'),
+           ('repaint_bottom_ms', 'at end ms', '{:.2f}'), ('refresh_ms', 'refresh ms', '{:.1f}'),
+           ('refresh_update_ms', 'diff ms', '{:.1f}'), ('kib_per_row', 'KiB/row', '{:.2f}'),
+           ('select_ms', 'select ms', '{:.2f}'), ('action_apply_ms', 'apply ms', '{:.2f}'),
+           ('action_round_trip_ms', 'action ms', '{:.2f}'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', default='100,1000,5000,10000', help='comma separated host counts')
+    parser.add_argument('--repeat', type=int, default=5, help='samples per measurement')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per host count')
+    parser.add_argument('--pin-singletons', action='store_true',
+                        help='work around a PySide6 refcount bug on Python < 3.12 (see above)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.repeat, args.pin_singletons)
+        return
+
+    path = os.path.join(tempfile.mkdtemp(prefix='tuxcut-bench-'), 'tuxcut.sock')
+    state = serve(path)
+    if not args.json:
+        if args.pin_singletons:
+            print('With --pin-singletons: 3 million extra references held by every window process')
+        print('  '.join(title.rjust(10) for key, title, spec in COLUMNS))
+    for count in [int(value) for value in args.hosts.split(',')]:
+        state['hosts'] = count
+        env = dict(os.environ, HOME=tempfile.mkdtemp(prefix='tuxcut-bench-'), QT_QPA_PLATFORM='offscreen')
+        command = [sys.executable, __file__, '--child', path, '--repeat', str(args.repeat)]
+        if args.pin_singletons:
+            command.append('--pin-singletons')
+        run = subprocess.run(command, env=env, capture_output=True, text=True, timeout=600)
+        lines = [line for line in run.stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            print(f'{count} hosts: the window did not finish (exit status {run.returncode})')
+            if any(crash in run.stderr for crash in SINGLETON_CRASH):
+                print('  PySide6 freed a singleton it did not own; see --pin-singletons in --help', file=sys.stderr)
+            else:
+                print(run.stderr.strip()[-2000:], file=sys.stderr)
+            continue
+        result = json.loads(lines[-1])
+        if args.json:
+            print(json.dumps(dict(result, hosts=count)))
+        else:
+            print('  '.join(spec.format(result[key]).rjust(10) for key, title, spec in COLUMNS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Capture ingestion benchmark: packets per second and memory of reading a
+pcap into the host inventory and ARP bindings.
+
+Writes a synthetic capture of the given size: IPv4 traffic of a few
+thousand hosts on 10.1.0.0/16, some of it from remote addresses behind the
+gateway, with ARP and DHCP mixed in. Peak RSS stays flat as the file grows,
+since it is read one packet at a time.
+
+    python benchmarks/ingest.py [--size 2] [--hosts 4000] [--keep FILE]
+"""
+import os
+import sys
+import time
+import random
+import struct
+import socket
+import argparse
+import resource
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+
+PCAP_HEADER = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+RECORD = struct.Struct('<IIII')
+GATEWAY = (bytes.fromhex('020000000001'), socket.inet_aton('10.1.0.1'))
+
+
+def host(i):
+    return bytes.fromhex('0200%08x' % (i + 16)), socket.inet_aton('10.1.{}.{}'.format((i + 16) // 256, (i + 16) % 256))
+
+
+def arp(op, sha, spa, tha, tpa):
+    dst = b'\xff' * 6 if op == 1 else tha
+    return dst + sha + b'\x08\x06' + struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, op, sha, spa, tha, tpa)
+
+
+def ipv4(src_mac, dst_mac, src, dst, size):
+    header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, size - 14, 0, 0, 64, 6, 0, src, dst)
+    return dst_mac + src_mac + b'\x08\x00' + header + bytes(size - 34)
+
+
+def dhcp_ack(mac, ip, name):
+    options = b'\x63\x82\x53\x63' + bytes([53, 1, 5, 12, len(name)]) + name + b'\xff'
+    bootp = struct.pack('!BBBBIHH4s4s4s4s16s64s128s', 2, 1, 6, 0, 1, 0, 0, bytes(4), ip, bytes(4), bytes(4),
+                        mac + bytes(10), bytes(64), bytes(128)) + options
+    udp = struct.pack('!HHHH', 67, 68, 8 + len(bootp), 0) + bootp
+    header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, GATEWAY[1], ip)
+    return mac + GATEWAY[0] + b'\x08\x00' + header + udp
+
+
+def write_capture(path, size, hosts):
+    """
+    Writes about size bytes of synthetic traffic and returns the packet count
+    """
+    rng = random.Random(1)
+    addresses = [host(i) for i in range(hosts)]
+    remote = [socket.inet_aton('198.51.100.{}'.format(i)) for i in range(1, 255)]
+    packets, written, now = 0, len(PCAP_HEADER), 1700000000.0
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.write(PCAP_HEADER)
+        while written < size:
+            mac, ip = addresses[rng.randrange(hosts)]
+            kind = rng.random()
+            if kind < 0.04:
+                frame = arp(1, mac, ip, bytes(6), GATEWAY[1])
+            elif kind < 0.08:
+                frame = arp(2, GATEWAY[0], GATEWAY[1], mac, ip)
+            elif kind < 0.081:
+                frame = dhcp_ack(mac, ip, b'host-%d' % packets)
+            elif kind < 0.5:
+                frame = ipv4(GATEWAY[0], mac, rng.choice(remote), ip, rng.choice((66, 590, 1514)))
+            else:
+                frame = ipv4(mac, GATEWAY[0], ip, rng.choice(remote), rng.choice((66, 66, 590, 1514)))
+            now += 0.0001
+            f.write(RECORD.pack(int(now), int(now % 1 * 1e6), len(frame), len(frame)))
+            f.write(frame)
+            written += RECORD.size + len(frame)
+            packets += 1
+    return packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=2, help='capture size in GB')
+    parser.add_argument('--hosts', type=int, default=4000, help='hosts in the capture')
+    parser.add_argument('--keep', help='write the capture here and keep it, or reuse it if it exists')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING) # The synthetic traffic is full of binding changes
+    from arpwatch import ArpWatch
+    from interfaces import InterfaceRegistry
+    from ingest import IngestJob
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(prefix='tuxcut-bench-'), 'capture.pcap')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        packets = write_capture(path, args.size * 1e9, args.hosts)
+        print(f'wrote {packets} packets, {os.path.getsize(path) / 1e9:.2f} GB in {time.perf_counter() - started:.0f} s')
+    try:
+        interfaces = InterfaceRegistry()
+        job = IngestJob(1, path, 'pcap', interfaces, ArpWatch(interfaces))
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        job.run()
+        status = job.status()
+        print(f"{status['packets']} packets, {status['size'] / 1e9:.2f} GB in {status['elapsed']:.1f} s: "
+              f"{status['pps']:.0f} packets/s, {status['mbps'] / 8:.0f} MB/s")
+        print(f"{status['hosts']} hosts from {status['arp']} ARP, {status['dhcp']} DHCP and {status['ip']} IPv4 packets")
+        print(f'peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB '
+              f'(+{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024:.0f} MiB while reading)')
+    finally:
+        if not args.keep:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Client startup benchmark: time from process start to the first paint of
+hosts_view with hosts in it.
+
+A stub server stands in for the daemon, and every run is a fresh process
+rendering offscreen with its own HOME. The first run starts with no cache;
+the later runs find the cache written by the run before them.
+
+    python benchmarks/startup.py [--runs 5] [--hosts 200] [--bootstrap-delay 0.5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client')
+IFACE = 'eth0'
+
+
+def fake_hosts(count):
+    return [{'ip': f'10.0.{i // 256}.{i % 256}', 'mac': '02:00:00:00:%02x:%02x' % (i // 256, i % 256),
+             'hostname': f'host-{i}', 'source': 'arp', 'iface': IFACE} for i in range(count)]
+
+
+def serve(hosts, bootstrap_delay, scan_delay):
+    """
+    Starts a stub of the daemon API on a free port and returns the port.
+    """
+    gw = {'ip': '10.0.0.1', 'mac': '02:00:00:00:00:01', 'hostname': '', 'iface': IFACE}
+    my = {'ip': '10.0.0.2', 'mac': '02:00:00:00:00:02', 'netmask': '255.255.0.0', 'hostname': ''}
+    replies = {
+        '/bootstrap': {'status': 'success', 'iface': IFACE, 'gw': gw, 'my': my,
+                       'interfaces': [{'iface': IFACE, 'gw': gw, 'my': my}],
+                       'hosts': {IFACE: hosts}, 'victims': []},
+        f'/interfaces/{IFACE}/scan': {'status': 'success', 'result': {'iface': IFACE, 'hosts': hosts}},
+        '/hosts/history': {'status': 'success', 'hosts': {}},
+        '/status': {'status': 'success'},
+    }
+    delays = {'/bootstrap': bootstrap_delay, f'/interfaces/{IFACE}/scan': scan_delay}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delays.get(self.path, 0))
+            body = json.dumps(replies.get(self.path, {'status': 'error'})).encode()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass # The client exited before its scan finished
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def child(port, started):
+    """
+    Runs the client once and prints the time to the first painted host list.
+    :param started: Wall clock time at which the parent spawned this process.
+    """
+    sys.path.insert(0, CLIENT_DIR)
+    from PySide6.QtCore import QObject, QEvent, QTimer
+    from PySide6.QtWidgets import QApplication
+    import main_window
+    from transport import Transport
+
+    main_window.api = Transport(port=port, socket_path=None)
+    main_window.MainWindow.ensure_root_access = lambda self: True
+    app = QApplication(sys.argv[:1])
+    window = main_window.MainWindow()
+
+    class PaintProbe(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and window.hosts_model.rowCount() > 0:
+                print(json.dumps({'first_paint_ms': (time.time() - started) * 1000,
+                                  'rows': window.hosts_model.rowCount()}), flush=True)
+                obj.removeEventFilter(self)
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    probe = PaintProbe()
+    window.hosts_view.viewport().installEventFilter(probe)
+    QTimer.singleShot(30000, app.quit)
+    window.show()
+    app.exec()
+    os._exit(0) # Skip joining the scan and action threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='warm runs after the cold one')
+    parser.add_argument('--hosts', type=int, default=200, help='hosts returned by the stub server')
+    parser.add_argument('--bootstrap-delay', type=float, default=0.5, help='seconds the stub takes for /bootstrap')
+    parser.add_argument('--scan-delay', type=float, default=3.0, help='seconds the stub takes for a scan')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--started', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.started)
+        return
+
+    port = serve(fake_hosts(args.hosts), args.bootstrap_delay, args.scan_delay)
+    home = tempfile.mkdtemp(prefix='tuxcut-bench-')
+    env = dict(os.environ, HOME=home, QT_QPA_PLATFORM='offscreen')
+    results = list()
+    for run in range(args.runs + 1):
+        command = [sys.executable, __file__, '--child', str(port), '--started', repr(time.time())]
+        out = subprocess.run(command, env=env,
+                             capture_output=True, text=True, timeout=60).stdout
+        lines = [line for line in out.splitlines() if line.startswith('{')]
+        if not lines:
+            print(f'run {run}: no host list painted')
+            continue
+        result = json.loads(lines[-1])
+        results.append(result['first_paint_ms'])
+        print(f"{'cold' if run == 0 else 'warm'} run {run}: {result['first_paint_ms']:.0f} ms to first paint "
+              f"of {result['rows']} hosts")
+    if len(results) > 1:
+        print(f'warm median: {statistics.median(results[1:]):.0f} ms '
+              f'(bootstrap delay {args.bootstrap_delay * 1000:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Transport benchmark: round trip time of API calls over TCP loopback and over
+the Unix domain socket.
+
+Both listeners are the ones the server uses, serving a bottle app that
+answers like the daemon. "tcp, new connection" is what every call cost when
+the server closed the connection after each request.
+
+    python benchmarks/transport.py [--requests 2000] [--hosts 0]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import http.client
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+sys.path.insert(0, os.path.join(ROOT, 'client'))
+
+from bottle import Bottle
+from listeners import make_unix_server, make_tcp_server, KeepAliveRequestHandler
+from transport import Transport
+
+
+def make_app(hosts):
+    app = Bottle()
+    reply = {'status': 'success', 'result': {'hosts': [
+        {'ip': f'10.0.{i // 256}.{i % 256}', 'mac': '02:00:00:00:%02x:%02x' % (i // 256, i % 256),
+         'hostname': f'host-{i}', 'source': 'arp', 'iface': 'eth0'} for i in range(hosts)]}}
+
+    @app.get('/status')
+    def status():
+        return reply
+
+    return app
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(call, count):
+    samples = list()
+    for _ in range(count):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='round trips per transport')
+    parser.add_argument('--hosts', type=int, default=0, help='hosts in each reply, to grow the payload')
+    args = parser.parse_args()
+
+    KeepAliveRequestHandler.log_message = lambda self, *args: None # Keep the access log out of the timings
+    app = make_app(args.hosts)
+    path = os.path.join(tempfile.mkdtemp(prefix='tuxcut-bench-'), 'tuxcut.sock')
+    unix = start(make_unix_server(app, path, group=None))
+    tcp = start(make_tcp_server(app, '127.0.0.1', 0))
+    port = tcp.server_address[1]
+
+    def fresh_tcp():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/status', headers={'Connection': 'close'})
+        conn.getresponse().read()
+        conn.close()
+
+    tcp_api = Transport(port=port, socket_path=None)
+    unix_api = Transport(socket_path=path)
+    cases = (('tcp, new connection', fresh_tcp),
+             ('tcp, keep-alive', lambda: tcp_api.get('/status')),
+             ('unix, keep-alive', lambda: unix_api.get('/status')))
+    results = dict()
+    for name, call in cases:
+        timed(call, min(100, args.requests)) # Warm up
+        samples = timed(call, args.requests)
+        results[name] = statistics.median(samples)
+        print(f'{name:20} median {results[name]:7.0f} us  p95 {statistics.quantiles(samples, n=20)[-1]:7.0f} us')
+    print(f"unix is {results['tcp, keep-alive'] / results['unix, keep-alive']:.2f}x faster than tcp keep-alive, "
+          f"{results['tcp, new connection'] / results['unix, keep-alive']:.2f}x faster than a connection per call")
+
+    tcp_api.close()
+    unix_api.close()
+    unix.shutdown()
+    unix.server_close()
+    tcp.shutdown()
+    tcp.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -41,15 +41,30 @@ STAGING="$(mktemp -d)"
 mkdir -p "$STAGING/$INSTALL_DIR"
 mkdir -p "$STAGING/$BIN_DIR"
 
+# Compile the client's icons and stylesheet into a Qt resource module, so the
+# one-file build carries them in memory instead of unpacking them on each start
+echo "Compiling resources..."
+pyside6-rcc --no-compress client/resources.qrc -o client/resources_rc.py
+
 # Build executables with PyInstaller
 echo "Building executables..."
 pyinstaller --clean -F client/tuxcut_qt.py
 pyinstaller --clean -F server/server.py
+rm -f client/resources_rc.py
 
 # Copy files to staging
 cp dist/tuxcut_qt "$STAGING/$INSTALL_DIR/"
 cp dist/server "$STAGING/$INSTALL_DIR/"
 cp tuxcut.png "$STAGING/$INSTALL_DIR/"
+mkdir -p "$STAGING/usr/lib/systemd/system"
+cp server/tuxcutd.service "$STAGING/usr/lib/systemd/system/"
+mkdir -p "$STAGING/etc/tuxcut"
+cp server/tuxcut.toml "$STAGING/etc/tuxcut/"
+
+# The command line client is plain standard-library Python; shipping it as a
+# script avoids the one-file unpacking that would dominate its start time
+mkdir -p "$STAGING/$INSTALL_DIR/cli"
+cp client/tuxcut_cli.py client/transport.py "$STAGING/$INSTALL_DIR/cli/"
 
 # Create launcher script
 cat > "$STAGING/$BIN_DIR/tuxcut-qt" << 'EOF'
@@ -58,6 +73,13 @@ sudo /opt/tuxcut-qt/tuxcut_qt
 EOF
 chmod +x "$STAGING/$BIN_DIR/tuxcut-qt"
 
+cat > "$STAGING/$BIN_DIR/tuxcut" << 'EOF'
+#!/bin/sh
+# -E -s -S: skip environment, user site and site-packages; the CLI needs none of them
+exec python3 -E -s -S /opt/tuxcut-qt/cli/tuxcut_cli.py "$@"
+EOF
+chmod +x "$STAGING/$BIN_DIR/tuxcut"
+
 # Function to build packages
 build_package() {
     local TYPE=$1
@@ -74,6 +96,7 @@ build_package() {
         --license "$LICENSE" \
         -a $ARCH \
         -C "$STAGING" \
+        --config-files /etc/tuxcut/tuxcut.toml \
         --after-install "scripts/postinst" \
         --before-remove "scripts/prerm" \
         -p "dist/tuxcut-qt-${VERSION}-1.${ARCH}.$TYPE" \
@@ -94,12 +117,18 @@ cat > scripts/postinst << 'EOF'
 chmod +x /usr/bin/tuxcut-qt
 chmod +x /opt/tuxcut-qt/tuxcut_qt
 chmod +x /opt/tuxcut-qt/server
+chmod +x /usr/bin/tuxcut
+# Members of this group may use the server socket without sudo
+getent group tuxcut > /dev/null || groupadd --system tuxcut
+systemctl daemon-reload 2> /dev/null || true
 EOF
 
 # Create pre-remove script
 cat > scripts/prerm << 'EOF'
 #!/bin/bash
 rm -f /usr/bin/tuxcut-qt
+rm -f /usr/bin/tuxcut
+systemctl disable --now tuxcutd.service 2> /dev/null || true
 EOF
 
 chmod +x scripts/postinst scripts/prerm
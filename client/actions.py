@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor # Worker thread that talks to the server
+
+from PySide6.QtCore import QObject, Signal as pyqtSignal # Signals deliver replies back on the GUI thread
+
+
+class ActionError(Exception):
+    """
+    Raised when the server answers an action with an error status.
+    """
+
+
+def succeeded(reply):
+    """
+    Checks a server reply for success. Some endpoints report their status
+    at the top level, others inside 'result'.
+    """
+    status = reply.get('status') or reply.get('result', {}).get('status')
+    return status == 'success'
+
+
+class ActionQueue(QObject):
+    """
+    Runs user actions against the server without blocking the GUI thread.
+    Each action applies its effect to the view at once (optimistically); the
+    server's reply then either confirms it or rolls it back. Actions run one
+    at a time in submission order, so e.g. a cut followed by a resume reaches
+    the server in that order.
+    """
+    _finished = pyqtSignal(object, object, object) # (callbacks, reply, error), emitted from the worker thread
+
+    def __init__(self, transport, parent=None):
+        """
+        :param transport: The Transport used to reach the server.
+        :param parent: The parent QObject.
+        """
+        super().__init__(parent)
+        self.transport = transport
+        self.pending = 0 # Actions submitted but not yet answered
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='actions')
+        self._finished.connect(self._on_finished) # Queued onto the GUI thread
+
+    def submit(self, method, path, body=None, apply=None, commit=None, rollback=None, timeout=None):
+        """
+        Queues an action and returns immediately.
+        :param method: 'GET' or 'POST'.
+        :param path: The API path of the action.
+        :param body: Optional JSON body.
+        :param apply: Called now, on the GUI thread, to show the expected result.
+        :param commit: Called with the reply once the server confirms the action.
+        :param rollback: Called with the error if the action failed; must undo apply.
+        :param timeout: Seconds to wait for the server.
+        """
+        if apply:
+            apply()
+        self.pending += 1
+        self._executor.submit(self._run, (commit, rollback), method, path, body, timeout)
+
+    def _run(self, callbacks, method, path, body, timeout):
+        reply, error = None, None
+        try:
+            reply = self.transport.request(method, path, body=body, timeout=timeout)
+            if not succeeded(reply):
+                error = ActionError(reply.get('msg', f'{path} failed'))
+        except Exception as e: # Transport errors, but also replies that are not what we expect
+            error = e
+        self._finished.emit(callbacks, reply, error)
+
+    def _on_finished(self, callbacks, reply, error):
+        self.pending -= 1
+        commit, rollback = callbacks
+        if error is None:
+            if commit:
+                commit(reply)
+        elif rollback:
+            rollback(error)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,55 @@
+import os # For the loose asset files of a source checkout
+
+from PySide6.QtCore import QResource # In-memory access to the compiled bundle
+from PySide6.QtGui import QIcon
+
+# --- Icons and Stylesheet ---
+# Packaged builds carry the assets in resources_rc, compiled from resources.qrc
+# by pyside6-rcc (see build.sh); the bundle lives in memory, so nothing is
+# unpacked or read from disk at startup. A source checkout without it falls
+# back to the files next to this module.
+
+_root = None # ':/' once the bundle is registered, else this directory
+_icons = dict() # Name -> QIcon, built on first use
+
+def root():
+    """
+    :return: The prefix of the asset paths, registering the bundle on first call.
+    """
+    global _root
+    if _root is None:
+        try:
+            import resources_rc # Registers the :/ resources on import
+            _root = ':/'
+        except ImportError:
+            _root = os.path.dirname(os.path.abspath(__file__)) + os.sep
+    return _root
+
+def icon(name):
+    """
+    :param name: Base name of a PNG in images/, e.g. 'cut_32'.
+    :return: The shared QIcon; its pixmap is only decoded when first painted.
+    """
+    cached = _icons.get(name)
+    if cached is None:
+        cached = _icons[name] = QIcon(f'{root()}images/{name}.png')
+    return cached
+
+def stylesheet():
+    """
+    :return: The application stylesheet, or '' if it cannot be read.
+    """
+    path = f'{root()}styles/main_style.qss'
+    if path.startswith(':/'):
+        # QResource maps the bundle without copying; QFile would cost more to set up than the read itself
+        resource = QResource(path)
+        if not resource.isValid():
+            return ''
+        if resource.compressionAlgorithm() == QResource.Compression.NoCompression:
+            return bytes(resource.data()).decode('utf-8')
+        return bytes(resource.uncompressedData()).decode('utf-8')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return ''
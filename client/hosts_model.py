@@ -0,0 +1,209 @@
+import time # For the time left on timed cuts
+import ipaddress # For sorting IP addresses numerically
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+COLUMNS = ['Status', 'IP Address', 'MAC Address', 'Hostname', 'Alias', 'History', 'Cut For']
+STATUS, IP, MAC, HOSTNAME, ALIAS, HISTORY, REMAINING = range(len(COLUMNS))
+SORT_ROLE = Qt.UserRole # Role the proxy sorts on, so IPs sort numerically
+
+# Qt enum lookups are slow from Python; data() is called for every visible cell
+DISPLAY_ROLE = Qt.DisplayRole
+DECORATION_ROLE = Qt.DecorationRole
+TOOLTIP_ROLE = Qt.ToolTipRole
+
+# --- Presence History Rendering ---
+
+SPARK_BARS = '▁▂▃▄▅▆▇█' # Bars from fastest to slowest reply
+SPARK_DOWN = '·' # Probe that got no reply
+
+def sparkline(rtts, width=20):
+    """
+    Renders the most recent ARP round trip times of a host as a text sparkline.
+    :param rtts: RTT samples in milliseconds, None for a missed probe.
+    :param width: Maximum number of samples to draw.
+    :return: A string with one character per sample.
+    """
+    rtts = rtts[-width:]
+    replies = [rtt for rtt in rtts if rtt is not None]
+    if not replies:
+        return SPARK_DOWN * len(rtts)
+    low, high = min(replies), max(replies)
+    span = (high - low) or 1
+    return ''.join(SPARK_DOWN if rtt is None else SPARK_BARS[int((rtt - low) / span * (len(SPARK_BARS) - 1))]
+                   for rtt in rtts)
+
+def countdown(seconds):
+    """
+    Formats the time left on a timed cut.
+    :param seconds: Seconds remaining.
+    :return: 'm:ss', or 'h:mm:ss' from an hour on.
+    """
+    minutes, seconds = divmod(max(0, int(seconds + 0.999)), 60) # Rounded up, so 0:00 means resumed
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+def _ranges(rows):
+    """
+    Groups sorted row numbers into contiguous (first, last) ranges.
+    """
+    ranges = list()
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
+# --- Host Table Model ---
+
+class HostTableModel(QAbstractTableModel):
+    """
+    A table model over the hosts of the last scan, keyed by MAC address.
+    New scan results are applied as a diff, so only the rows that were
+    inserted, changed or removed are signalled to the view, and the view's
+    selection and scroll position survive a refresh.
+    """
+    def __init__(self, aliases, offline_hosts, cut_until, parent=None):
+        """
+        :param aliases: Dict of MAC -> alias, shared with the window.
+        :param offline_hosts: List of IPs that are cut, shared with the window.
+        :param cut_until: Dict of MAC -> time.monotonic() at which a timed cut ends, shared with the window.
+        :param parent: The parent QObject.
+        """
+        super().__init__(parent)
+        self.aliases = aliases
+        self.offline_hosts = offline_hosts
+        self.cut_until = cut_until
+        self.online_icon = None
+        self.offline_icon = None
+        self._keys = list() # Row -> MAC
+        self._hosts = dict() # MAC -> host dict
+        self._rows = dict() # MAC -> row
+        self._cells = dict() # MAC -> (display values, sort keys, cut, IPv6 tooltip), rendered once per change
+
+    def set_icons(self, online_icon, offline_icon):
+        self.online_icon = online_icon
+        self.offline_icon = offline_icon
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def _render(self, host):
+        """
+        Computes the display values and sort keys of a host's row.
+        """
+        offline = host['ip'] in self.offline_hosts
+        until = self.cut_until.get(host['mac']) if offline else None
+        remaining = until - time.monotonic() if until is not None else None
+        display = (None, host['ip'], host['mac'], host.get('hostname', ''),
+                   self.aliases.get(host['mac'], ''), sparkline(host.get('history', [])),
+                   countdown(remaining) if remaining is not None else '')
+        address = ipaddress.ip_address(host['ip'])
+        # A string, as the proxy compares keys in C++; IPv6 addresses do not fit its integers.
+        # The version prefix sorts IPv4 before IPv6 and equal-length hex keeps each family numeric.
+        keys = (int(offline), f'{address.version}{address.packed.hex()}', host['mac'],
+                display[HOSTNAME].lower(), display[ALIAS].lower(), display[HISTORY],
+                remaining if remaining is not None else float('inf'))
+        # IPv6 addresses found for the host, shown when hovering its IP
+        tooltip = '\n'.join(host.get('ipv6', [])) or None
+        self._cells[host['mac']] = (display, keys, offline, tooltip)
+
+    def data(self, index, role=DISPLAY_ROLE):
+        if not index.isValid():
+            return None
+        display, keys, offline, tooltip = self._cells[self._keys[index.row()]]
+        if role == DISPLAY_ROLE:
+            return display[index.column()]
+        if role == SORT_ROLE:
+            return keys[index.column()]
+        if role == DECORATION_ROLE and index.column() == STATUS:
+            return self.offline_icon if offline else self.online_icon
+        if role == TOOLTIP_ROLE and index.column() == IP:
+            return tooltip
+        return None
+
+    def host(self, row):
+        """
+        :return: The host dict shown at row.
+        """
+        return self._hosts[self._keys[row]]
+
+    def set_hosts(self, hosts):
+        """
+        Replaces the hosts by diffing them against the current ones.
+        :param hosts: The new list of host dicts.
+        """
+        new = {host['mac']: host for host in hosts}
+
+        # Removed hosts, from the bottom up so row numbers stay valid
+        removed = [row for row, mac in enumerate(self._keys) if mac not in new]
+        for first, last in reversed(_ranges(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for mac in self._keys[first:last + 1]:
+                del self._hosts[mac]
+                del self._cells[mac]
+            del self._keys[first:last + 1]
+            self.endRemoveRows()
+        if removed:
+            self._rows = {mac: row for row, mac in enumerate(self._keys)}
+
+        # Changed hosts
+        changed = list()
+        for row, mac in enumerate(self._keys):
+            if self._hosts[mac] != new[mac]:
+                self._hosts[mac] = new[mac]
+                self._render(new[mac])
+                changed.append(row)
+        for first, last in _ranges(changed):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(COLUMNS) - 1))
+
+        # New hosts, appended in one block
+        added = [mac for mac in new if mac not in self._hosts]
+        if added:
+            first = len(self._keys)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for mac in added:
+                self._rows[mac] = len(self._keys)
+                self._keys.append(mac)
+                self._hosts[mac] = new[mac]
+                self._render(new[mac])
+            self.endInsertRows()
+
+    def host_by_mac(self, mac):
+        """
+        :return: The host dict with the given MAC address, or None.
+        """
+        return self._hosts.get(mac)
+
+    def host_changed(self, mac):
+        """
+        Signals that the alias or cut state of a host changed.
+        :param mac: The MAC address of the host.
+        """
+        row = self._rows.get(mac)
+        if row is not None:
+            self._render(self._hosts[mac])
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+
+def make_proxy(model, parent=None):
+    """
+    Wraps the model in a proxy that sorts numerically where it matters and
+    filters case-insensitively across every column.
+    """
+    proxy = QSortFilterProxyModel(parent)
+    proxy.setSourceModel(model)
+    proxy.setSortRole(SORT_ROLE)
+    proxy.setFilterKeyColumn(-1)
+    proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+    proxy.setDynamicSortFilter(True)
+    return proxy
@@ -2,23 +2,27 @@
 import os # For interacting with the operating system (e.g., file paths, environment variables)
 import sys # For system-specific parameters and functions (e.g., exit)
 import json # For working with JSON data (e.g., loading/saving aliases)
+import time # For the deadlines of timed cuts
 import logging # For logging application events and errors
 from pathlib import Path # For object-oriented filesystem paths
-import requests # For making HTTP requests to the TuxCut Qt server
-from threading import Thread # For running background tasks (e.g., server status checks)
+from concurrent.futures import CancelledError # Raised when a superseded request is dropped
 
 # PySide6 (Qt for Python) imports for GUI components
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QToolBar, QStatusBar, QMessageBox,
-    QInputDialog, QTreeWidget, QTreeWidgetItem, QHeaderView, QMenuBar, QMenu,
+    QInputDialog, QTreeView, QHeaderView, QMenuBar, QMenu, QAbstractItemView,
     QDialog, QLabel, QLineEdit, QPushButton, QHBoxLayout, QSplitter,
     QTextEdit, QComboBox, QApplication, QSizePolicy
 )
-from PySide6.QtCore import Qt, QThread, Signal as pyqtSignal # Core Qt functionalities, threading, and signals
-from PySide6.QtGui import QAction, QIcon, QPixmap # GUI elements like actions, icons, and pixel maps
+from PySide6.QtCore import Qt, QThread, QTimer, Signal as pyqtSignal # Core Qt functionalities, threading, timers and signals
+from PySide6.QtGui import QAction # Toolbar actions
 
 # Local application configuration imports
 from config import APP_NAME, ABOUT_TEXT # Application name and about text from config.py
+from transport import Transport, SCAN_TIMEOUT # Pooled HTTP transport to the server
+from hosts_model import HostTableModel, make_proxy # Keyed host table model and its sort/filter proxy
+from actions import ActionQueue # Runs server actions off the GUI thread with optimistic updates
+from assets import icon # Icons from the compiled resource bundle, built on first use
 
 # --- Application Directory and Logging Setup ---
 
@@ -41,6 +45,13 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter) # Apply the formatter to the handler
 logger.addHandler(handler) # Add the file handler to the logger
 
+# Single keep-alive transport shared by the window and its worker threads
+api = Transport()
+
+# Choices offered when cutting a host: label -> seconds, None to stay cut until resumed
+CUT_DURATIONS = (('Until resumed', None), ('5 minutes', 300), ('15 minutes', 900),
+                 ('30 minutes', 1800), ('1 hour', 3600), ('8 hours', 28800))
+
 
 # --- Thread for Background Scanning ---
 
@@ -48,31 +59,54 @@ class ScanThread(QThread):
     """
     A QThread subclass for performing network scans in a separate thread
     to keep the GUI responsive.
-    Emits a signal with the list of scanned hosts when finished.
+    Emits a signal with the scanned interface and its list of hosts when finished.
     """
-    finished = pyqtSignal(list) # Signal emitted when scanning is complete, carrying a list of hosts
+    finished = pyqtSignal(str, list) # Signal emitted when scanning is complete, carrying the interface and its hosts
     
-    def __init__(self, ip):
+    def __init__(self, iface):
         """
         Initializes the ScanThread.
-        :param ip: The IP address to scan.
+        :param iface: The network interface to scan.
         """
         super().__init__()
-        self.ip = ip
+        self.iface = iface
         
     def run(self):
         """
         The main execution method of the thread.
         Performs an HTTP GET request to the local server to initiate a scan.
-        Emits the results or an empty list if an error occurs.
+        Emits the results or an empty list if an error occurs. A scan superseded
+        by a newer one (e.g. after switching interfaces) emits nothing.
         """
         try:
-            res = requests.get(f'http://127.0.0.1:8013/scan/{self.ip}')
-            if res.status_code == 200:
-                self.finished.emit(res.json()['result']['hosts'])
+            res = api.submit('GET', f'/interfaces/{self.iface}/scan', timeout=SCAN_TIMEOUT, channel='scan').result()
+            hosts = res['result']['hosts']
+            history = api.get('/hosts/history').get('hosts', {})
+            for host in hosts:
+                host['history'] = history.get(host['mac'], {}).get('rtt', [])
+            self.finished.emit(self.iface, hosts)
+        except CancelledError:
+            logger.info(f"Scan of {self.iface} was superseded")
         except Exception as e:
             logger.error(f"Error during scan thread execution: {str(e)}", exc_info=True)
-            self.finished.emit([]) # Emit empty list on error
+            self.finished.emit(self.iface, []) # Emit empty list on error
+
+# --- Thread for Startup Data ---
+
+class BootstrapThread(QThread):
+    """
+    A QThread subclass that fetches everything the window needs at startup
+    with a single /bootstrap request, so the window can be shown right away.
+    Emits the decoded reply, or an empty dict if the server cannot be reached.
+    """
+    finished = pyqtSignal(dict) # Signal emitted with the /bootstrap reply
+    
+    def run(self):
+        try:
+            self.finished.emit(api.get('/bootstrap'))
+        except Exception as e:
+            logger.error(f"Bootstrap request failed: {str(e)}", exc_info=True)
+            self.finished.emit({})
 
 # --- Sudo Authentication Dialog ---
 
@@ -140,8 +174,16 @@ class MainWindow(QMainWindow):
         self.load_aliases() # Load existing aliases
         self._gw = dict() # Stores gateway information
         self._my = dict() # Stores local network information
+        self._interfaces = dict() # Interface name -> {'my': ..., 'gw': ...} as reported by the server
+        self.scan_thread = None # Scan currently running, if any
+        self._scan_threads = set() # Every scan thread not yet stopped; Qt aborts if a running one is garbage collected
+        self.actions = ActionQueue(api, self) # Queue for cut/resume/MAC/protection requests
         self.live_hosts = list() # List of currently online hosts
         self._offline_hosts = list() # List of hosts marked as offline (cut)
+        self._cut_until = dict() # MAC -> time.monotonic() at which a timed cut ends
+        self.countdown_timer = QTimer(self) # Redraws the time left on timed cuts, only while there are some
+        self.countdown_timer.setInterval(1000)
+        self.countdown_timer.timeout.connect(self.tick_countdowns)
         
         # --- Setup User Interface Components ---
         self.setup_menu() # Setup application menus (currently empty as actions are in toolbar)
@@ -149,39 +191,56 @@ class MainWindow(QMainWindow):
         self.setup_toolbar() # Setup the application toolbar with actions
         self.setup_statusbar() # Setup the status bar at the bottom of the window
         
-        # --- Initial Server and Network Checks ---
-        # Check if the TuxCut Qt server is running and accessible
-        if not self.is_server():
+        # --- Cache-first Startup ---
+        # Draw the last known state at once, then fetch the current one off the GUI thread
+        self.cache_file = os.path.join(APP_DIR, 'cache.json')
+        self.load_cache()
+        self.bootstrap_thread = BootstrapThread()
+        self.bootstrap_thread.finished.connect(self.on_bootstrap)
+        self.bootstrap_thread.start()
+    
+    def on_bootstrap(self, res):
+        """
+        Applies the server's /bootstrap reply: gateway, own interface details, the
+        interface list, cut hosts and the last scanned hosts. Then starts a fresh scan.
+        :param res: The decoded reply, or an empty dict if the server was unreachable.
+        """
+        if not res:
             self.show_error('Server Connection Error',
                           'Failed to connect to the TuxCut Qt server. Please ensure the server is running and accessible.')
             self.close() # Close application if server is not reachable
             return
-            
-        # Get gateway information from the server
-        self.get_gw()
-        if not self._gw:
+        if res['status'] != 'success' or not res.get('gw'):
             self.show_error('Network Configuration Error',
                           'Unable to retrieve gateway information. Please verify your network connection and settings.')
             self.close() # Close if gateway info cannot be obtained
             return
-            
+        if not res.get('my'):
+            self.show_error('Local Network Information Error',
+                          'Unable to retrieve local network details. Please ensure your network is properly configured.')
+            self.close() # Close if local network info cannot be obtained
+            return
+        
         try:
-            # Determine the network interface
-            iface = self._gw.get('iface')
-            if not iface:
-                self.show_error('Network Interface Error',
-                              'Failed to determine the active network interface. Please check your network configuration.')
-                self.close() # Close if interface cannot be determined
-                return
-                
-            # Get local network information using the determined interface
-            self.get_my(iface)
-            if not self._my:
-                self.show_error('Local Network Information Error',
-                              'Unable to retrieve local network details. Please ensure your network is properly configured.')
-                self.close() # Close if local network info cannot be obtained
-                return
-                
+            # Keep the interface picked from the cache if the server still has it
+            iface = self.current_iface()
+            entries = {entry['iface']: entry for entry in res['interfaces']}
+            if iface not in entries:
+                iface = res['iface']
+            self._gw = entries.get(iface, res)['gw']
+            self._my = entries.get(iface, res)['my']
+            self.set_interfaces(res['interfaces'], iface)
+            self._offline_hosts[:] = [victim['ip'] for victim in res['victims']]
+            self._cut_until.clear()
+            for victim in res['victims']:
+                if victim.get('remaining') is not None:
+                    self.set_cut_deadline(victim['mac'], victim['remaining'])
+            
+            self._cache = {'iface': iface, 'interfaces': res['interfaces'], 'hosts': res['hosts']}
+            if res['hosts'].get(iface):
+                self.update_hosts_view(iface, res['hosts'][iface]) # Hosts the server already knows
+            else:
+                self.save_cache()
             self.refresh_hosts() # Refresh the hosts list on successful initialization
         except Exception as e:
             logger.error(f"Initialization error: {str(e)}", exc_info=True)
@@ -189,6 +248,36 @@ class MainWindow(QMainWindow):
                           'The application failed to initialize. Please check the application logs for more detailed error information.')
             self.close() # Close on any unhandled initialization error
     
+    def load_cache(self):
+        """
+        Fills the window from the state saved by the previous run, if any.
+        """
+        self._cache = {'iface': None, 'interfaces': [], 'hosts': {}}
+        try:
+            with open(self.cache_file, 'r') as f:
+                self._cache.update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return
+        entries = {entry['iface']: entry for entry in self._cache['interfaces']}
+        iface = self._cache['iface']
+        if iface not in entries:
+            return
+        self._gw = entries[iface]['gw']
+        self._my = entries[iface]['my']
+        self.set_interfaces(self._cache['interfaces'], iface)
+        self.hosts_model.set_hosts(self._cache['hosts'].get(iface, []))
+        self.statusbar.showMessage("Showing cached hosts, connecting to server...")
+    
+    def save_cache(self):
+        """
+        Saves the interfaces and last known hosts for the next start.
+        """
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump(self._cache, f)
+        except OSError as e:
+            logger.warning(f"Failed to save cache: {e}")
+    
     def setup_menu(self):
         # Menus are not currently used, actions are in toolbar
         pass
@@ -215,9 +304,14 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
         
-        # Top panel for protection mode
+        # Top panel for interface selection and protection mode
         protection_panel = QWidget()
         protection_layout = QHBoxLayout(protection_panel)
+        iface_label = QLabel("Interface:")
+        self.iface_combo = QComboBox()
+        self.iface_combo.currentTextChanged.connect(self.on_interface_changed)
+        protection_layout.addWidget(iface_label)
+        protection_layout.addWidget(self.iface_combo)
         protect_label = QLabel("Protection Mode:")
         self.protect_combo = QComboBox()
         self.protect_combo.addItems(["Disabled", "Enabled"])
@@ -225,12 +319,24 @@ class MainWindow(QMainWindow):
         protection_layout.addWidget(protect_label)
         protection_layout.addWidget(self.protect_combo)
         protection_layout.addStretch()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search hosts...")
+        self.search_box.setClearButtonEnabled(True)
+        protection_layout.addWidget(self.search_box)
         protection_panel.setLayout(protection_layout)
         protection_panel.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed) # Ensure panel doesn't stretch vertically
 
-        # Hosts view
-        self.hosts_view = QTreeWidget()
-        self.hosts_view.setHeaderLabels(['Status', 'IP Address', 'MAC Address', 'Hostname', 'Alias'])
+        # Hosts view, backed by a keyed model that is updated by diffs
+        self.hosts_model = HostTableModel(self.aliases, self._offline_hosts, self._cut_until, self)
+        self.hosts_proxy = make_proxy(self.hosts_model, self)
+        self.search_box.textChanged.connect(self.hosts_proxy.setFilterFixedString) # Instant search
+        self.hosts_view = QTreeView()
+        self.hosts_view.setModel(self.hosts_proxy)
+        self.hosts_view.setRootIsDecorated(False) # Flat table, no tree branches
+        self.hosts_view.setUniformRowHeights(True) # Lets the view skip measuring every row
+        self.hosts_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.hosts_view.setSortingEnabled(True)
+        self.hosts_view.sortByColumn(1, Qt.AscendingOrder) # Sort by IP address
         
         header = self.hosts_view.header()
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Fixed) # Status column
@@ -238,6 +344,10 @@ class MainWindow(QMainWindow):
         header.setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch) # MAC Address
         header.setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch) # Hostname
         header.setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch) # Alias
+        header.setSectionResizeMode(5, QHeaderView.ResizeMode.Fixed) # Presence sparkline; sizing to contents would measure every row
+        header.resizeSection(5, 160)
+        header.setSectionResizeMode(6, QHeaderView.ResizeMode.Fixed) # Time left on a timed cut
+        header.resizeSection(6, 90)
         
         self.hosts_view.setAlternatingRowColors(True) # Enable alternating row colors
         
@@ -255,52 +365,50 @@ class MainWindow(QMainWindow):
         toolbar = QToolBar()
         self.addToolBar(toolbar)
         
-        # Define icon paths
-        icon_path = lambda icon_name: os.path.join(os.path.dirname(__file__), 'images', icon_name)
-
         # Add actions
-        refresh_action = QAction(QIcon(icon_path('refresh_32.png')), "Refresh", self)
+        refresh_action = QAction(icon('refresh_32'), "Refresh", self)
         refresh_action.setStatusTip("Refresh hosts list")
         refresh_action.triggered.connect(self.refresh_hosts)
         toolbar.addAction(refresh_action)
         
-        cut_action = QAction(QIcon(icon_path('cut_32.png')), "Cut", self)
+        cut_action = QAction(icon('cut_32'), "Cut", self)
         cut_action.setStatusTip("Cut selected host")
         cut_action.triggered.connect(self.cut_host)
         toolbar.addAction(cut_action)
         
-        resume_action = QAction(QIcon(icon_path('resume_32.png')), "Resume", self)
+        resume_action = QAction(icon('resume_32'), "Resume", self)
         resume_action.setStatusTip("Resume selected host")
         resume_action.triggered.connect(self.resume_host)
         toolbar.addAction(resume_action)
         
         toolbar.addSeparator()
         
-        mac_action = QAction(QIcon(icon_path('mac_32.png')), "Change MAC", self)
+        mac_action = QAction(icon('mac_32'), "Change MAC", self)
         mac_action.setStatusTip("Change MAC Address")
         mac_action.triggered.connect(self.change_mac)
         toolbar.addAction(mac_action)
         
-        alias_action = QAction(QIcon(icon_path('alias_32.png')), "Alias", self)
+        alias_action = QAction(icon('alias_32'), "Alias", self)
         alias_action.setStatusTip("Give an alias")
         alias_action.triggered.connect(self.give_alias)
         toolbar.addAction(alias_action)
         
         toolbar.addSeparator()
         
-        about_action = QAction(QIcon(icon_path('ninja_32.png')), "About", self)
+        about_action = QAction(icon('ninja_32'), "About", self)
         about_action.setStatusTip("About TuxCut Qt")
         about_action.triggered.connect(self.show_about)
         toolbar.addAction(about_action)
         
-        exit_action = QAction(QIcon(icon_path('exit_32.png')), "Exit", self)
+        exit_action = QAction(icon('exit_32'), "Exit", self)
         exit_action.setStatusTip("Exit application")
         exit_action.triggered.connect(self.close)
         toolbar.addAction(exit_action)
 
         # Update hosts view status icons
-        self.online_icon = QIcon(icon_path('online_24.png'))
-        self.offline_icon = QIcon(icon_path('offline_24.png'))
+        self.online_icon = icon('online_24')
+        self.offline_icon = icon('offline_24')
+        self.hosts_model.set_icons(self.online_icon, self.offline_icon)
     
     def setup_statusbar(self):
         """
@@ -316,112 +424,211 @@ class MainWindow(QMainWindow):
         Initiates a scan for network hosts in a separate thread and updates the UI
         when the scan is complete. Displays status messages in the status bar.
         """
+        iface = self.current_iface()
+        if self.scan_thread is not None and self.scan_thread.isRunning() and self.scan_thread.iface == iface:
+            return # A scan of this interface is already running; its result will update the view
         self.statusbar.showMessage("Refreshing host list, please wait...")
-        self.scan_thread = ScanThread(self._my['ip']) # Create a new scan thread
+        # A superseded scan only has its reply dropped; its request still runs, so keep its thread referenced
+        self._scan_threads = {thread for thread in self._scan_threads if thread.isRunning()}
+        self.scan_thread = ScanThread(iface) # Create a new scan thread
         self.scan_thread.finished.connect(self.update_hosts_view) # Connect thread's finished signal to update method
+        self._scan_threads.add(self.scan_thread)
         self.scan_thread.start() # Start the scan thread
     
-    def update_hosts_view(self, hosts):
+    def update_hosts_view(self, iface, hosts):
         """
-        Updates the QTreeWidget (hosts_view) with the latest list of hosts.
-        Sets appropriate icons (online/offline) and displays aliases.
+        Updates the hosts model with the latest list of hosts. Only the rows that
+        changed are signalled to hosts_view, so selection and scroll position are kept.
+        :param iface: The interface the hosts were found on.
         :param hosts: A list of host dictionaries (e.g., [{'ip': '...', 'mac': '...', 'hostname': '...'}])
         """
-        self.hosts_view.clear() # Clear existing items in the tree view
+        if iface != self.current_iface():
+            # A scan that finished just before a switch to another interface; its hosts are not on this one
+            logger.info(f"Dropping the scan of {iface}, {self.current_iface()} is shown")
+            return
         self.live_hosts = hosts # Store the live hosts list
-        
-        for host in hosts:
-            item = QTreeWidgetItem() # Create a new tree widget item for each host
-            # Set icon based on whether the host is marked as offline
-            if host['ip'] in self._offline_hosts:
-                item.setIcon(0, self.offline_icon)
-            else:
-                item.setIcon(0, self.online_icon)
-            
-            # Set text for each column
-            item.setText(1, host['ip'])
-            item.setText(2, host['mac'])
-            item.setText(3, host['hostname'])
-            try:
-                # Retrieve and set alias, if available
-                alias = self.aliases.get(host['mac'], '')
-                item.setText(4, alias)
-            except:
-                item.setText(4, '') # Set empty string if alias retrieval fails
-            
-            self.hosts_view.addTopLevelItem(item) # Add the item to the tree view
-        
+        self.hosts_model.set_hosts(hosts)
         self.statusbar.showMessage("Host list updated.") # Update status bar
+        self._cache['iface'] = iface
+        self._cache['hosts'][iface] = hosts
+        self.save_cache() # Remember the hosts for the next start
+    
+    def selected_host(self):
+        """
+        :return: The host dict of the selected row, or None if nothing is selected.
+        """
+        index = self.hosts_view.currentIndex()
+        if not index.isValid():
+            return None
+        return self.hosts_model.host(self.hosts_proxy.mapToSource(index).row())
     
     def cut_host(self):
         """
-        Disconnects the selected host from the network by sending a 'cut' request to the server.
-        Updates the status bar and refreshes the host list.
+        Disconnects the selected host from the network by queueing a 'cut' request to the server.
+        The host is shown offline at once and restored if the server refuses.
         """
-        current_item = self.hosts_view.currentItem() # Get the currently selected item
-        if current_item:
-            # Extract victim information from the selected item
-            victim = {
-                'ip': current_item.text(1),
-                'mac': current_item.text(2),
-                'hostname': current_item.text(3)
-            }
-            
-            res = requests.post('http://127.0.0.1:8013/cut', json=victim) # Send cut request
-            if res.status_code == 200 and res.json()['status'] == 'success':
-                # Add to offline list if successful and not already there
-                if victim['ip'] not in self._offline_hosts:
-                    self._offline_hosts.append(victim['ip'])
-                self.statusbar.showMessage(f"Host {victim['ip']} is now offline.") # Update status bar
-                self.refresh_hosts() # Refresh host list to show updated status
-        else:
+        host = self.selected_host() # Get the currently selected host
+        if not host:
             self.statusbar.showMessage("Please select a host to disconnect.") # Prompt user to select a host
+            return
+        if host['ip'] in self._offline_hosts:
+            return # Already cut, or a cut is on its way
+        duration, ok = self.ask_cut_duration(host)
+        if not ok:
+            return
+        victim = self.victim_of(host)
+        victim['duration'] = duration # Seconds, or None to stay cut until resumed; the server lifts the cut itself
+        
+        def apply():
+            self._offline_hosts.append(victim['ip'])
+            if duration:
+                self.set_cut_deadline(victim['mac'], duration)
+            self.hosts_model.host_changed(victim['mac']) # Redraw the row with its new status
+            self.statusbar.showMessage(f"Cutting host {victim['ip']}...")
+        
+        def commit(res):
+            if res.get('remaining') is not None:
+                self.set_cut_deadline(victim['mac'], res['remaining']) # The server's clock started later than ours
+            self.statusbar.showMessage(f"Host {victim['ip']} is now offline.") # Update status bar
+        
+        def rollback(error):
+            logger.error(f"Cut request failed: {error}")
+            if victim['ip'] in self._offline_hosts:
+                self._offline_hosts.remove(victim['ip'])
+            self._cut_until.pop(victim['mac'], None)
+            self.hosts_model.host_changed(victim['mac'])
+            self.statusbar.showMessage(f"Failed to cut host {victim['ip']}.")
+        
+        self.actions.submit('POST', '/cut', victim, apply=apply, commit=commit, rollback=rollback)
     
     def resume_host(self):
         """
-        Reconnects the selected host to the network by sending a 'resume' request to the server.
-        Updates the status bar and refreshes the host list.
+        Reconnects the selected host to the network by queueing a 'resume' request to the server.
+        The host is shown online at once and marked offline again if the server refuses.
         """
-        current_item = self.hosts_view.currentItem() # Get the currently selected item
-        if current_item:
-            # Extract victim information from the selected item
-            victim = {
-                'ip': current_item.text(1),
-                'mac': current_item.text(2),
-                'hostname': current_item.text(3)
-            }
-            
-            res = requests.post('http://127.0.0.1:8013/resume', json=victim) # Send resume request
-            if res.status_code == 200 and res.json()['status'] == 'success':
-                # Remove from offline list if successful
-                if victim['ip'] in self._offline_hosts:
-                    self._offline_hosts.remove(victim['ip'])
-                self.statusbar.showMessage(f"Host {victim['ip']} is back online.") # Update status bar
-                self.refresh_hosts() # Refresh host list to show updated status
+        host = self.selected_host() # Get the currently selected host
+        if not host or host['ip'] not in self._offline_hosts:
+            return
+        victim = self.victim_of(host)
+        deadline = self._cut_until.get(victim['mac'])
+        
+        def apply():
+            self._offline_hosts.remove(victim['ip'])
+            self._cut_until.pop(victim['mac'], None)
+            self.hosts_model.host_changed(victim['mac']) # Redraw the row with its new status
+            self.statusbar.showMessage(f"Resuming host {victim['ip']}...")
+        
+        def commit(res):
+            self.statusbar.showMessage(f"Host {victim['ip']} is back online.") # Update status bar
+        
+        def rollback(error):
+            logger.error(f"Resume request failed: {error}")
+            if victim['ip'] not in self._offline_hosts:
+                self._offline_hosts.append(victim['ip'])
+            if deadline is not None:
+                self._cut_until[victim['mac']] = deadline
+                self.countdown_timer.start()
+            self.hosts_model.host_changed(victim['mac'])
+            self.statusbar.showMessage(f"Failed to resume host {victim['ip']}.")
+        
+        self.actions.submit('POST', '/resume', victim, apply=apply, commit=commit, rollback=rollback)
+    
+    def ask_cut_duration(self, host):
+        """
+        Asks how long the host should stay cut.
+        :param host: The host about to be cut.
+        :return: (seconds or None for no limit, whether the user confirmed).
+        """
+        labels = [label for label, seconds in CUT_DURATIONS]
+        label, ok = QInputDialog.getItem(
+            self,
+            'Cut Host',
+            f'Keep {host["ip"]} cut for:',
+            labels,
+            0, # Until resumed, as before
+            False # Not editable; the server takes any duration but the menu keeps it simple
+        )
+        return dict(CUT_DURATIONS).get(label), ok
+    
+    def set_cut_deadline(self, mac, remaining):
+        """
+        Records when a timed cut ends and makes sure its countdown is drawn.
+        :param mac: MAC address of the cut host.
+        :param remaining: Seconds until the server resumes it.
+        """
+        self._cut_until[mac] = time.monotonic() + remaining
+        self.countdown_timer.start()
+    
+    def tick_countdowns(self):
+        """
+        Redraws the time left on timed cuts once a second. Hosts whose time is up
+        are shown online, as the server resumes them on its own.
+        """
+        now = time.monotonic()
+        for mac, until in list(self._cut_until.items()):
+            if until <= now:
+                del self._cut_until[mac]
+                host = self.hosts_model.host_by_mac(mac)
+                if host and host['ip'] in self._offline_hosts:
+                    self._offline_hosts.remove(host['ip'])
+                    self.statusbar.showMessage(f"Cut of {host['ip']} expired, host is back online.")
+            self.hosts_model.host_changed(mac) # Only the rows of timed cuts are redrawn
+        if not self._cut_until:
+            self.countdown_timer.stop()
+    
+    def victim_of(self, host):
+        """
+        :param host: A host dict from the hosts model.
+        :return: The request body identifying the host to the server.
+        """
+        return {
+            'ip': host['ip'],
+            'mac': host['mac'],
+            'hostname': host.get('hostname', ''),
+            'iface': self.current_iface()
+        }
     
     def change_mac(self):
         """
-        Changes the MAC address of the network interface by sending a request to the server.
-        Updates the status bar with the result.
+        Changes the MAC address of the network interface by queueing a request to the server.
+        Updates the status bar with the result once the server replies.
         """
-        res = requests.get(f'http://127.0.0.1:8013/change-mac/{self._gw["iface"]}') # Send change MAC request
-        if res.status_code == 200:
-            if res.json()['result']['status'] == 'success':
-                self.statusbar.showMessage('MAC Address successfully changed.') # Success message
+        iface = self.current_iface()
+
+        def commit(res):
+            result = res.get('result', {})
+            if result.get('mac'):
+                # Keep the cached own address in step with the interface
+                self._my['mac'] = result['mac']
+                entry = self._interfaces.get(iface)
+                if entry:
+                    entry['my']['mac'] = result['mac']
+                self.save_cache()
+            if result.get('live') is False:
+                self.statusbar.showMessage(f"MAC Address changed to {result['mac']}, "
+                                           f"link was down for {result['outage_ms']:.0f} ms.")
             else:
-                self.statusbar.showMessage("Failed to change MAC Address.") # Failure message
+                self.statusbar.showMessage('MAC Address successfully changed.') # Success message
+        
+        def rollback(error):
+            logger.error(f"Change MAC request failed: {error}")
+            self.statusbar.showMessage("Failed to change MAC Address.") # Failure message
+        
+        self.statusbar.showMessage("Changing MAC Address...")
+        self.actions.submit('GET', f'/change-mac/{iface}', commit=commit, rollback=rollback,
+                            timeout=SCAN_TIMEOUT)
     
     def give_alias(self):
         """
         Prompts the user to enter an alias for the selected host and saves it.
         Updates the status bar and refreshes the host list.
         """
-        current_item = self.hosts_view.currentItem() # Get the currently selected item
-        if not current_item:
+        host = self.selected_host() # Get the currently selected host
+        if not host:
             self.show_error('No Host Selected', 'Please select a host from the list to assign an alias.')
             return # Exit if no host is selected
             
-        mac = current_item.text(2) # Get MAC address of the selected host
+        mac = host['mac'] # Get MAC address of the selected host
         # Open an input dialog to get the alias from the user
         alias, ok = QInputDialog.getText(
             self,
@@ -433,53 +640,41 @@ class MainWindow(QMainWindow):
         if ok and alias: # If user clicked OK and entered an alias
             self.aliases[mac] = alias # Store the alias
             self.save_aliases() # Save aliases to file
-            self.refresh_hosts() # Refresh host list to display new alias
+            self.hosts_model.host_changed(mac) # Redraw the row to display the new alias
     
-    def is_server(self):
-        """
-        Checks if the TuxCut Qt server is running and accessible.
-        :return: True if the server is running and returns success status, False otherwise.
-        """
-        try:
-            res = requests.get('http://127.0.0.1:8013/status') # Send status request to server
-            return res.status_code == 200 and res.json()['status'] == 'success'
-        except Exception as e:
-            logger.error(f"Server status check failed: {sys.exc_info()[1]}", exc_info=True)
-            return False
+    def set_interfaces(self, entries, selected):
+        """
+        Fills the interface selector.
+        :param entries: Interface entries ({'iface', 'my', 'gw'}) as reported by the server.
+        :param selected: The interface to select.
+        """
+        self._interfaces = {entry['iface']: entry for entry in entries}
+        if selected not in self._interfaces:
+            self._interfaces[selected] = {'iface': selected, 'my': self._my, 'gw': self._gw}
+        self.iface_combo.blockSignals(True) # Populating the combo must not trigger a rescan
+        self.iface_combo.clear()
+        self.iface_combo.addItems(sorted(self._interfaces))
+        self.iface_combo.setCurrentText(selected)
+        self.iface_combo.blockSignals(False)
     
-    def get_gw(self):
+    def current_iface(self):
         """
-        Retrieves gateway information from the TuxCut Qt server.
-        Displays an error and closes the application if retrieval fails.
+        :return: The interface selected in the interface selector.
         """
-        try:
-            res = requests.get('http://127.0.0.1:8013/gw') # Request gateway info
-            if res.status_code == 200 and res.json()['status'] == 'success':
-                self._gw = res.json()['gw'] # Store gateway info
-            elif res.status_code == 200 and res.json()['status'] == 'error':
-                # Display server-side error message
-                self.show_error('Error', res.json()['msg'])
-                self.close()
-                sys.exit() # Exit application on critical error
-        except Exception as e:
-            logger.error(f"Failed to get gateway information: {sys.exc_info()[1]}", exc_info=True)
+        return self.iface_combo.currentText() or self._gw.get('iface')
     
-    def get_my(self, iface):
+    def on_interface_changed(self, iface):
         """
-        Retrieves local network information (IP, MAC, etc.) for a given interface from the server.
-        Displays an error and closes the application if retrieval fails.
-        :param iface: The network interface name.
+        Switches the window to another interface and rescans its network.
+        :param iface: The newly selected interface name.
         """
-        try:
-            res = requests.get(f'http://127.0.0.1:8013/my/{iface}') # Request local network info
-            if res.status_code == 200 and res.json()['status'] == 'success':
-                self._my = res.json()['my'] # Store local network info
-            elif res.status_code == 200 and res.json()['status'] == 'error':
-                # Display server-side error message
-                self.show_error('Error', res.json()['msg'])
-                self.close()
-        except Exception as e:
-            logger.error(f"Failed to get local network information: {sys.exc_info()[1]}", exc_info=True)
+        entry = self._interfaces.get(iface)
+        if not entry:
+            return
+        self._my = entry['my']
+        self._gw = entry['gw']
+        self.hosts_model.set_hosts(self._cache['hosts'].get(iface, [])) # Last known hosts until the scan ends
+        self.refresh_hosts()
     
     def show_error(self, title, message):
         """
@@ -498,12 +693,14 @@ class MainWindow(QMainWindow):
             # Attempt to disable protection mode if it's currently enabled
             if self.protect_combo.currentText() == "Enabled":
                 try:
-                    requests.post('http://127.0.0.1:8013/unprotect')
+                    api.post('/unprotect')
                 except Exception as e:
                     logger.warning(f"Failed to disable protection during shutdown: {e}")
             
             # Save any updated aliases
             self.save_aliases()
+            self.actions.shutdown() # Drop queued actions
+            api.close() # Drop pending requests and the kept-alive connection
             
             # Ensure the application truly quits
             self.deleteLater() # Deletes the widget when control returns to the event loop
@@ -532,27 +729,24 @@ class MainWindow(QMainWindow):
     def on_protection_changed(self, text):
         """
         Handles changes in the protection mode combobox.
-        Sends requests to the server to enable or disable protection.
-        Updates the status bar with the operation's result.
+        Queues a request to the server to enable or disable protection; the combobox
+        keeps the new value unless the server refuses, in which case it is reverted.
         :param text: The new text of the combobox (e.g., "Enabled" or "Disabled").
         """
-        try:
-            if text == "Enabled":
-                # Send request to enable protection
-                res = requests.post('http://127.0.0.1:8013/protect', json=self._gw)
-                if res.status_code == 200 and res.json()['status'] == 'success':
-                    self.statusbar.showMessage('Protection mode is now Enabled.')
-                else:
-                    self.protect_combo.setCurrentText("Disabled") # Revert combobox if failed
-                    self.statusbar.showMessage("Failed to enable protection mode.")
-            else:
-                # Send request to disable protection
-                res = requests.post('http://127.0.0.1:8013/unprotect')
-                if res.status_code == 200 and res.json()['status'] == 'success':
-                    self.statusbar.showMessage('Protection mode is now Disabled.')
-                else:
-                    self.protect_combo.setCurrentText("Enabled") # Revert combobox if failed
-                    self.statusbar.showMessage("Failed to disable protection mode.")
-        except Exception as e:
-            logger.error(f"Protection toggle error: {str(e)}", exc_info=True)
-            self.statusbar.showMessage("An error occurred while toggling protection.")
\ No newline at end of file
+        previous = "Disabled" if text == "Enabled" else "Enabled"
+        
+        def commit(res):
+            self.statusbar.showMessage(f'Protection mode is now {text}.')
+        
+        def rollback(error):
+            logger.error(f"Protection toggle error: {error}")
+            self.protect_combo.blockSignals(True) # Reverting must not send another request
+            self.protect_combo.setCurrentText(previous) # Revert combobox if failed
+            self.protect_combo.blockSignals(False)
+            self.statusbar.showMessage(f"Failed to {'enable' if text == 'Enabled' else 'disable'} protection mode.")
+        
+        self.statusbar.showMessage(f"{'Enabling' if text == 'Enabled' else 'Disabling'} protection mode...")
+        if text == "Enabled":
+            self.actions.submit('POST', '/protect', self._gw, commit=commit, rollback=rollback)
+        else:
+            self.actions.submit('POST', '/unprotect', commit=commit, rollback=rollback)
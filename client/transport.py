@@ -0,0 +1,204 @@
+"""
+HTTP transport shared by every client of the TuxCut server.
+
+The server is reached over its Unix domain socket when that exists, and over
+TCP otherwise (tuxcutd.py, or a server started with --tcp). Requests go over keep-alive connections (one per thread) with explicit
+timeouts. Asynchronous requests that are identical and still in flight are
+coalesced into one, and a request submitted on a named channel cancels the
+one it supersedes. This module must not import Qt so that headless tools
+can use it.
+"""
+import os
+import json
+import socket
+import threading
+import http.client
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8013
+SERVER_SOCKET = '/run/tuxcut/tuxcut.sock'
+DEFAULT_TIMEOUT = 5 # Seconds to wait for an ordinary request
+SCAN_TIMEOUT = 60 # Seconds to wait for a network scan
+
+
+class TransportError(Exception):
+    """
+    Raised when the server cannot be reached or does not answer with JSON.
+    """
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    An HTTPConnection over a Unix domain socket.
+    """
+
+    def __init__(self, socket_path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class Transport:
+    """
+    A small pooled HTTP client for the local server API.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, timeout=DEFAULT_TIMEOUT, workers=4,
+                 socket_path=SERVER_SOCKET):
+        """
+        :param socket_path: Unix socket of the server, used instead of host and
+        port whenever it exists. None always uses TCP.
+        """
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = dict() # Request key -> pending Future, for coalescing
+        self._channels = dict() # Channel name -> latest Future, for superseding
+        self._workers = workers
+        self._executor = None # Created on the first submit; one-shot callers never pay for it
+
+    def _connection(self):
+        """
+        :return: The keep-alive connection owned by the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _connect(self, timeout):
+        # Checked per connection: the server may create its socket after we start
+        if self.socket_path and os.path.exists(self.socket_path):
+            return UnixHTTPConnection(self.socket_path, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, body=None, timeout=None):
+        """
+        Performs a request and waits for its decoded JSON reply.
+        :param method: 'GET' or 'POST'.
+        :param path: The API path, e.g. '/status'.
+        :param body: Optional object sent as a JSON body.
+        :param timeout: Seconds to wait, defaults to the transport timeout.
+        :return: The decoded JSON reply.
+        """
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        # A kept-alive connection may have been closed by the server; retry once on a fresh one
+        for attempt in range(2):
+            conn = self._connection()
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                res = conn.getresponse()
+                data = res.read()
+                if res.will_close:
+                    self._reset()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                self._reset()
+                if attempt:
+                    raise TransportError(f'{method} {path} failed: {e}') from e
+            except (OSError, http.client.HTTPException) as e:
+                self._reset()
+                raise TransportError(f'{method} {path} failed: {e}') from e
+        if res.status != 200:
+            raise TransportError(f'{method} {path} returned HTTP {res.status}')
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise TransportError(f'{method} {path} did not return JSON') from e
+
+    def get(self, path, timeout=None):
+        return self.request('GET', path, timeout=timeout)
+
+    def post(self, path, body=None, timeout=None):
+        return self.request('POST', path, body=body, timeout=timeout)
+
+    def submit(self, method, path, body=None, timeout=None, channel=None):
+        """
+        Performs a request on a worker thread.
+        An identical request that is still in flight is shared instead of sent
+        again. When a channel is given, the previous request on that channel is
+        cancelled and its reply discarded.
+        :return: A Future resolving to the decoded JSON reply.
+        """
+        from concurrent.futures import Future, ThreadPoolExecutor
+        key = (method, path, json.dumps(body, sort_keys=True))
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='transport')
+            future = self._inflight.get(key)
+            if future is None or future.cancelled():
+                future = Future()
+                self._inflight[key] = future
+                self._executor.submit(self._run, key, future, method, path, body, timeout)
+            if channel is not None:
+                previous = self._channels.get(channel)
+                if previous is not None and previous is not future:
+                    previous.cancel()
+                self._channels[channel] = future
+        return future
+
+    def _run(self, key, future, method, path, body, timeout):
+        try:
+            result = self.request(method, path, body=body, timeout=timeout)
+            error = None
+        except Exception as e:
+            result, error = None, e
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        # A cancelled future was superseded; drop its reply
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stream(self, path, timeout=None):
+        """
+        Performs a GET whose reply is one JSON document per line, yielding each
+        as soon as it arrives. Uses its own connection, which is closed afterwards.
+        """
+        conn = self._connect(timeout or self.timeout)
+        try:
+            conn.request('GET', path)
+            res = conn.getresponse()
+            if res.status != 200:
+                raise TransportError(f'GET {path} returned HTTP {res.status}')
+            for line in res:
+                if line.strip():
+                    yield json.loads(line)
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportError(f'GET {path} failed: {e}') from e
+        except ValueError as e:
+            raise TransportError(f'GET {path} did not return JSON lines') from e
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._reset()
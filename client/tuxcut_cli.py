@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+tuxcut - command line client for the TuxCut server.
+
+Talks to the same API as the Qt client but imports nothing beyond the
+standard library and transport.py, so it starts fast enough for cron jobs
+and monitoring checks and runs without a display. It needs server.py: the
+legacy tuxcutd.py lacks the interface, victim, log, ingest, ARP watch, name
+and config endpoints that most commands use.
+
+Exit status: 0 on success, 1 when the server reports an error, 2 when the
+server cannot be reached.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from transport import Transport, TransportError, SERVER_HOST, SERVER_PORT, SERVER_SOCKET, SCAN_TIMEOUT
+
+HOST_COLUMNS = ('ip', 'mac', 'hostname', 'source', 'iface', 'ipv6')
+ARP_EVENT_COLUMNS = ('id', 'severity', 'type', 'iface', 'ip', 'mac', 'previous_mac')
+NAME_COLUMNS = ('ip', 'mac', 'name', 'source')
+
+
+class CommandError(Exception):
+    """
+    Raised when the server answers a command with an error.
+    """
+
+
+def status_of(res):
+    """
+    The status of a reply: at the top level, or only inside 'result', as
+    the Qt client's actions also accept.
+    """
+    return res.get('status') or res.get('result', {}).get('status')
+
+
+def checked(res):
+    if status_of(res) != 'success':
+        raise CommandError(res.get('msg') or res.get('log') or 'request failed')
+    return res
+
+
+def hosts_of(res):
+    return res.get('result', {}).get('hosts', res.get('hosts', []))
+
+
+def cell(value):
+    """
+    A table cell: lists, such as the IPv6 addresses of a host, comma separated.
+    """
+    if isinstance(value, list):
+        return ','.join(map(str, value))
+    return str(value or '')
+
+
+def print_table(rows, columns):
+    rows = [[cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(columns)]
+    print('  '.join(column.upper().ljust(width) for column, width in zip(columns, widths)).rstrip())
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def emit(args, data, rows=None, columns=HOST_COLUMNS):
+    """
+    Prints data as JSON, or rows as a table.
+    """
+    if args.json or rows is None:
+        print(json.dumps(data, indent=None if args.json else 2))
+    else:
+        print_table(rows, columns)
+
+
+def default_iface(api, args):
+    if args.iface:
+        return args.iface
+    res = checked(api.get('/interfaces'))
+    if not res.get('default'):
+        raise CommandError('no interface with a default route')
+    return res['default']
+
+
+def cmd_status(api, args):
+    res = checked(api.get('/status'))
+    if args.json:
+        emit(args, res)
+    else:
+        print(res.get('msg', 'TuxCut server is running'))
+
+
+def cmd_gw(api, args):
+    gw = checked(api.get('/gw'))['gw']
+    emit(args, gw, [gw], ('ip', 'mac', 'hostname', 'iface'))
+
+
+def cmd_hosts(api, args):
+    iface = default_iface(api, args)
+    hosts = hosts_of(checked(api.get(f'/interfaces/{iface}/hosts')))
+    emit(args, hosts, hosts)
+
+
+def cmd_scan(api, args):
+    """
+    Prints hosts while the scan runs: kernel-known neighbors first, then the
+    ones answering the sweep. A host may appear twice as its details improve.
+    """
+    iface = default_iface(api, args)
+    if not args.json:
+        print_table([], HOST_COLUMNS)
+    for host in api.stream(f'/interfaces/{iface}/scan/stream', timeout=SCAN_TIMEOUT):
+        if 'status' in host:
+            checked(host)
+        elif args.json:
+            print(json.dumps(host), flush=True)
+        else:
+            print('  '.join(cell(host.get(column)) for column in HOST_COLUMNS), flush=True)
+
+
+def cmd_resume_all(api, args):
+    victims = checked(api.get('/victims'))['victims']
+    failed = 0
+    for victim in victims:
+        res = api.post('/resume', victim)
+        if status_of(res) != 'success':
+            failed += 1
+            print(f"{victim['ip']}: {res.get('msg', 'failed')}", file=sys.stderr)
+    if args.json:
+        emit(args, {'resumed': len(victims) - failed, 'failed': failed})
+    else:
+        print(f'resumed {len(victims) - failed} of {len(victims)} hosts')
+    if failed:
+        raise CommandError(f'{failed} hosts could not be resumed')
+
+
+def cmd_protect(api, args):
+    gw = checked(api.get('/gw'))['gw']
+    checked(api.post('/protect', gw))
+    if args.json:
+        emit(args, {'status': 'success'})
+    else:
+        print('Protection enabled')
+
+
+def cmd_unprotect(api, args):
+    checked(api.post('/unprotect'))
+    if args.json:
+        emit(args, {'status': 'success'})
+    else:
+        print('Protection disabled')
+
+
+def cmd_log(api, args):
+    res = checked(api.get('/log'))
+    sys.stdout.write(res['log'])
+    sys.stdout.flush()
+    offset = res.get('offset')
+    while args.follow and offset is not None:
+        time.sleep(args.interval)
+        res = checked(api.get(f'/log?offset={offset}'))
+        sys.stdout.write(res['log'])
+        sys.stdout.flush()
+        offset = res['offset']
+
+
+def cmd_ingest(api, args):
+    """
+    Has the server read a capture file, printing its progress until it is
+    done, then the hosts and ARP anomalies found in it.
+    """
+    body = {'path': os.path.abspath(args.file), 'iface': args.iface, 'network': args.network}
+    job = checked(api.post('/ingest', body))['job']
+    while not args.no_wait and job['state'] == 'running':
+        time.sleep(args.interval)
+        job = checked(api.get(f"/ingest/{job['id']}"))['job']
+        if not args.json:
+            print(f"\r{job['progress']:6.1%}  {job['packets']} packets  {job['pps']:.0f} packets/s  "
+                  f"{job['hosts']} hosts", end='', file=sys.stderr, flush=True)
+    if args.no_wait:
+        emit(args, job)
+        return
+    res = checked(api.get(f"/ingest/{job['id']}?hosts=1&arp=1"))
+    job = res['job']
+    if args.json:
+        emit(args, res)
+    else:
+        print(file=sys.stderr)
+        rows = [dict(host, evidence='+'.join(host['evidence'])) for host in res['hosts']]
+        print_table(rows, HOST_COLUMNS + ('evidence',))
+        if res.get('events'):
+            print()
+            print_table(res['events'], ARP_EVENT_COLUMNS)
+        print(f"{job['state']}: {job['packets']} packets in {job['elapsed']:.1f} s, {job['pps']:.0f} packets/s, "
+              f"{job['hosts']} hosts", file=sys.stderr)
+    if job['state'] == 'failed':
+        raise CommandError(job['error'])
+
+
+def cmd_arpwatch(api, args):
+    res = checked(api.get('/arpwatch/events'))
+    emit(args, res['events'], res['events'], ARP_EVENT_COLUMNS)
+    last = max([event['id'] for event in res['events']], default=0)
+    while args.follow:
+        time.sleep(args.interval)
+        events = checked(api.get(f'/arpwatch/events?since={last}'))['events']
+        for event in events:
+            print(json.dumps(event) if args.json else '  '.join(str(event[column] or '') for column in ARP_EVENT_COLUMNS))
+            last = event['id']
+        sys.stdout.flush()
+
+
+def cmd_names(api, args):
+    res = checked(api.get('/names'))
+    emit(args, res, res['names'], NAME_COLUMNS)
+
+
+def cmd_config(api, args):
+    res = checked(api.get('/config'))
+    if args.json:
+        emit(args, res['config'])
+        return
+    print(f"# {res['path']}")
+    for section, values in res['config'].items():
+        for key, value in values.items():
+            print(f'{section}.{key} = {json.dumps(value)}')
+
+
+def cmd_reload(api, args):
+    res = checked(api.post('/config/reload'))
+    if args.json:
+        emit(args, res)
+        return
+    print(f"changed: {', '.join(res['changed']) or 'nothing'}")
+    if res['restart_required']:
+        print(f"restart the server to apply: {', '.join(res['restart_required'])}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='tuxcut', description='Command line client for the TuxCut server.')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of tables')
+    parser.add_argument('--socket', default=SERVER_SOCKET, help='server socket (default %(default)s)')
+    parser.add_argument('--tcp', action='store_true', help='use TCP even if the server socket exists')
+    parser.add_argument('--host', default=SERVER_HOST, help='server address for TCP (default %(default)s)')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='server port for TCP (default %(default)s)')
+    parser.add_argument('--timeout', type=float, default=5, help='seconds to wait for the server')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    commands.add_parser('status', help='check that the server is running').set_defaults(func=cmd_status)
+    commands.add_parser('gw', help='show the default gateway').set_defaults(func=cmd_gw)
+    for name, func, text in (('hosts', cmd_hosts, 'show the hosts of the last scan'),
+                             ('scan', cmd_scan, 'scan the network, printing hosts as they are found')):
+        command = commands.add_parser(name, help=text)
+        command.add_argument('-i', '--iface', help='interface (default: the one with the default route)')
+        command.set_defaults(func=func)
+    commands.add_parser('resume-all', help='resume every cut host').set_defaults(func=cmd_resume_all)
+    commands.add_parser('protect', help='enable protection mode').set_defaults(func=cmd_protect)
+    commands.add_parser('unprotect', help='disable protection mode').set_defaults(func=cmd_unprotect)
+    log = commands.add_parser('log', help='print the server log')
+    log.add_argument('-f', '--follow', action='store_true', help='keep printing new log lines')
+    log.add_argument('--interval', type=float, default=1, help='seconds between polls when following')
+    log.set_defaults(func=cmd_log)
+    ingest = commands.add_parser('ingest', help='read hosts and ARP bindings from a pcap or pcapng file')
+    ingest.add_argument('file', help='capture file, read by the server')
+    ingest.add_argument('-i', '--iface', help='interface the hosts are added to (default: the default one)')
+    ingest.add_argument('--network', help='network whose IPv4 sources count as hosts (default: those seen in ARP)')
+    ingest.add_argument('--no-wait', action='store_true', help='start the job and return')
+    ingest.add_argument('--interval', type=float, default=0.5, help='seconds between progress polls')
+    ingest.set_defaults(func=cmd_ingest)
+    arpwatch = commands.add_parser('arpwatch', help='show ARP anomalies seen on the LAN')
+    arpwatch.add_argument('-f', '--follow', action='store_true', help='keep printing new events')
+    arpwatch.add_argument('--interval', type=float, default=1, help='seconds between polls when following')
+    arpwatch.set_defaults(func=cmd_arpwatch)
+    commands.add_parser('names', help='show the hostnames learned from the LAN and DNS').set_defaults(func=cmd_names)
+    commands.add_parser('config', help='show the server configuration').set_defaults(func=cmd_config)
+    commands.add_parser('reload', help='reload the server configuration file').set_defaults(func=cmd_reload)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    api = Transport(args.host, args.port, timeout=args.timeout, socket_path=None if args.tcp else args.socket)
+    try:
+        args.func(api, args)
+    except CommandError as e:
+        print(f'tuxcut: {e}', file=sys.stderr)
+        return 1
+    except TransportError as e:
+        print(f'tuxcut: cannot reach the server: {e}', file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        api.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
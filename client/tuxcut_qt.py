@@ -3,18 +3,17 @@
 import sys
 from PySide6.QtWidgets import QApplication
 from main_window import MainWindow
-import os
+import assets
 
 def main():
     app = QApplication(sys.argv)
     
-    # Load and apply stylesheet
-    style_path = os.path.join(os.path.dirname(__file__), 'styles', 'main_style.qss')
-    if os.path.exists(style_path):
-        with open(style_path, 'r') as f:
-            app.setStyleSheet(f.read())
+    # Apply the stylesheet from the resource bundle
+    style = assets.stylesheet()
+    if style:
+        app.setStyleSheet(style)
     else:
-        print(f"Warning: Stylesheet not found at {style_path}")
+        print("Warning: Stylesheet not found")
 
     window = MainWindow()
     window.show()
@@ -22,12 +21,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
-def main():
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec())
-
-if __name__ == '__main__':
-    main() 
\ No newline at end of file
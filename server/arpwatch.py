@@ -0,0 +1,248 @@
+import time
+import socket
+import struct
+import threading
+from collections import OrderedDict, deque
+from utils import logger, ARP_HEADER
+
+ARP_BPF = 'arp'
+ETHERTYPE_ARP = b'\x08\x06'
+ARP_REQUEST = 1
+ARP_REPLY = 2
+ZERO_IP = b'\0\0\0\0'
+
+# Event types, most severe first
+GATEWAY_SPOOFED = 'gateway_spoofed' # The gateway's IP announced from another MAC
+OWN_IP_CLAIMED = 'own_ip_claimed' # Our IP announced from another MAC
+FLIP_FLOP = 'flip_flop' # A binding keeps switching between MACs
+IP_CONFLICT = 'ip_conflict' # Two MACs active on one IP
+GRATUITOUS_FLOOD = 'gratuitous_flood' # Too many gratuitous ARPs from one MAC
+BINDING_CHANGED = 'binding_changed' # An IP moved to a new MAC
+SEVERITY = {GATEWAY_SPOOFED: 'critical', OWN_IP_CLAIMED: 'critical', FLIP_FLOP: 'warning',
+            IP_CONFLICT: 'warning', GRATUITOUS_FLOOD: 'warning', BINDING_CHANGED: 'info'}
+
+
+def is_arp(frame):
+    return frame[12:14] == ETHERTYPE_ARP
+
+
+def format_mac(mac):
+    return mac.hex(':')
+
+
+class Binding:
+    """
+    What one IP resolved to on one interface: the current MAC and the last
+    few changes, kept as raw bytes in a ring buffer
+    """
+    __slots__ = ('mac', 'first_seen', 'last_seen', 'changes')
+
+    def __init__(self, mac, timestamp, history):
+        self.mac = mac
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.changes = deque(maxlen=history) # (timestamp, previous MAC, previous MAC last seen)
+
+    def to_dict(self, iface, ip):
+        return {
+            'iface': iface,
+            'ip': socket.inet_ntoa(ip),
+            'mac': format_mac(self.mac),
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'changes': [{'t': t, 'previous_mac': format_mac(mac)} for t, mac, seen in self.changes]
+        }
+
+
+class ArpWatch:
+    """
+    Follows the IP to MAC bindings announced on the LAN and raises events
+    when they change or conflict. Bindings are kept per interface, as the
+    same private address is often in use on two LANs. Memory is bounded:
+    the least recently announced bindings are evicted beyond max_ips, and
+    events are kept in a ring.
+    Frames sent by this machine, spoofing included, are ignored.
+    """
+
+    def __init__(self, interfaces, max_ips=4096, history=8, max_events=1000,
+                 conflict_window=10.0, flood_threshold=20, repeat_after=10.0):
+        self.interfaces = interfaces
+        self.max_ips = max_ips
+        self.history = history
+        self.conflict_window = conflict_window # Seconds within which two MACs on one IP conflict
+        self.flood_threshold = flood_threshold # Gratuitous ARPs per second from one MAC
+        self.repeat_after = repeat_after # Seconds before the same event is raised again
+        self.bindings = OrderedDict() # (iface, IP (4 bytes)) -> Binding, least recently announced first
+        self.events = deque(maxlen=max_events)
+        self.counters = dict.fromkeys(('frames', 'requests', 'replies', 'gratuitous', 'probes', 'own',
+                                       'malformed', 'evicted', 'suppressed', 'stale'), 0)
+        self.event_counts = dict.fromkeys(SEVERITY, 0)
+        self._event_id = 0
+        self._raised = dict() # (type, iface, IP, MAC) -> when last raised, for suppressing repeats
+        self._gratuitous = dict() # MAC -> count in the current second
+        self._second = 0
+        self._rate = (time.time(), 0) # Start and frame count of the current rate window
+        self.pps = 0.0
+        self._lock = threading.Lock()
+        self._own = (frozenset(), dict(), dict()) # Our MACs, our IP per iface, gateway (IP, MAC) per iface
+
+    def configure(self, max_ips, history, max_events, conflict_window, flood_threshold):
+        with self._lock:
+            self.max_ips = max_ips
+            self.conflict_window = conflict_window
+            self.flood_threshold = flood_threshold
+            if max_events != self.events.maxlen:
+                self.events = deque(self.events, maxlen=max_events)
+            if history != self.history:
+                self.history = history
+                for binding in self.bindings.values():
+                    binding.changes = deque(binding.changes, maxlen=history)
+            while len(self.bindings) > self.max_ips:
+                self.bindings.popitem(last=False)
+                self.counters['evicted'] += 1
+
+    def spawn(self):
+        """
+        A new, empty ArpWatch with the same settings and own addresses, for
+        traffic that must not mix with this one's, such as a capture file
+        """
+        watch = ArpWatch(self.interfaces, self.max_ips, self.history, self.events.maxlen,
+                         self.conflict_window, self.flood_threshold, self.repeat_after)
+        watch._own = self._own
+        return watch
+
+    def sync(self):
+        """
+        Take our own and the gateways' addresses from the interface contexts
+        """
+        macs, ips, gateways = set(), dict(), dict()
+        for ctx in list(self.interfaces.contexts.values()):
+            try:
+                macs.add(bytes.fromhex(ctx.my['mac'].replace(':', '')))
+                ips[ctx.iface] = socket.inet_aton(ctx.my['ip'])
+                if ctx.gw.get('mac'):
+                    gateways[ctx.iface] = (socket.inet_aton(ctx.gw['ip']),
+                                           bytes.fromhex(ctx.gw['mac'].replace(':', '')))
+            except (KeyError, ValueError, OSError):
+                continue
+        self._own = (frozenset(macs), ips, gateways)
+
+    def subscribe(self, hub):
+        hub.subscribe('arpwatch', ARP_BPF, is_arp, self.handle)
+
+    def handle(self, iface, frame, timestamp):
+        """
+        Account for one captured ARP frame. Runs on the capture thread for
+        every ARP frame of the LAN, so it only uses slicing and dict lookups.
+        """
+        counters = self.counters
+        counters['frames'] += 1
+        try:
+            htype, ptype, hlen, plen, op, sha, spa, tha, tpa = ARP_HEADER.unpack_from(frame, 14)
+        except struct.error:
+            counters['malformed'] += 1
+            return
+        if hlen != 6 or plen != 4 or ptype != 0x0800:
+            counters['malformed'] += 1
+            return
+        own_macs, own_ips, gateways = self._own
+        if frame[6:12] in own_macs or sha in own_macs:
+            counters['own'] += 1
+            return
+        counters['replies' if op == ARP_REPLY else 'requests'] += 1
+        if spa == ZERO_IP:
+            counters['probes'] += 1 # Address conflict detection probes bind nothing
+            return
+        with self._lock:
+            self._rate_tick(timestamp)
+            if spa == tpa:
+                counters['gratuitous'] += 1
+                self._count_gratuitous(iface, spa, sha, timestamp)
+            if spa == own_ips.get(iface):
+                self._raise(OWN_IP_CLAIMED, iface, spa, sha, None, timestamp)
+            gateway = gateways.get(iface)
+            if gateway and spa == gateway[0] and sha != gateway[1]:
+                self._raise(GATEWAY_SPOOFED, iface, spa, sha, gateway[1], timestamp)
+            self._bind(iface, spa, sha, timestamp)
+
+    def _bind(self, iface, ip, mac, timestamp):
+        key = (iface, ip)
+        binding = self.bindings.get(key)
+        if binding is None:
+            if len(self.bindings) >= self.max_ips:
+                self.bindings.popitem(last=False)
+                self.counters['evicted'] += 1
+            self.bindings[key] = Binding(mac, timestamp, self.history)
+            return
+        if timestamp < binding.last_seen:
+            self.counters['stale'] += 1 # Older than what the binding already knows; it says nothing about now
+            return
+        self.bindings.move_to_end(key)
+        if binding.mac == mac:
+            binding.last_seen = timestamp
+            return
+        previous, previous_seen = binding.mac, binding.last_seen
+        recent = [seen for t, old, seen in binding.changes if old == mac and timestamp - t < self.conflict_window]
+        binding.changes.append((timestamp, previous, previous_seen))
+        binding.mac = mac
+        binding.last_seen = timestamp
+        if recent:
+            self._raise(FLIP_FLOP, iface, ip, mac, previous, timestamp)
+        elif timestamp - previous_seen < self.conflict_window:
+            self._raise(IP_CONFLICT, iface, ip, mac, previous, timestamp)
+        else:
+            self._raise(BINDING_CHANGED, iface, ip, mac, previous, timestamp)
+
+    def _count_gratuitous(self, iface, ip, mac, timestamp):
+        second = int(timestamp)
+        if second != self._second:
+            self._second = second
+            self._gratuitous.clear() # Only the current second is kept
+        count = self._gratuitous.get(mac, 0) + 1
+        self._gratuitous[mac] = count
+        if count == self.flood_threshold:
+            self._raise(GRATUITOUS_FLOOD, iface, ip, mac, None, timestamp)
+
+    def _rate_tick(self, timestamp):
+        start, frames = self._rate
+        if timestamp - start >= 1.0:
+            self.pps = (self.counters['frames'] - frames) / (timestamp - start)
+            self._rate = (timestamp, self.counters['frames'])
+
+    def _raise(self, kind, iface, ip, mac, previous, timestamp):
+        key = (kind, iface, ip, mac)
+        last = self._raised.get(key)
+        if last is not None and timestamp - last < self.repeat_after:
+            self.counters['suppressed'] += 1
+            return
+        if len(self._raised) > 4 * self.max_ips:
+            self._raised.clear() # Bounded; the worst case is one repeated event
+        self._raised[key] = timestamp
+        self._event_id += 1
+        self.event_counts[kind] += 1
+        event = {
+            'id': self._event_id,
+            't': timestamp,
+            'type': kind,
+            'severity': SEVERITY[kind],
+            'iface': iface,
+            'ip': socket.inet_ntoa(ip),
+            'mac': format_mac(mac),
+            'previous_mac': format_mac(previous) if previous else None
+        }
+        self.events.append(event)
+        if event['severity'] != 'info':
+            logger.warning('ARP {type} on {iface}: {ip} announced from {mac}'.format(**event))
+
+    def get_events(self, since=0):
+        with self._lock:
+            return [event for event in self.events if event['id'] > since]
+
+    def get_bindings(self):
+        with self._lock:
+            return [binding.to_dict(iface, ip) for (iface, ip), binding in self.bindings.items()]
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, bindings=len(self.bindings), events=dict(self.event_counts),
+                        pps=round(self.pps, 1), last_event=self._event_id)
@@ -0,0 +1,191 @@
+import time
+import select
+import socket
+import struct
+import threading
+from utils import logger
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_ADD_MEMBERSHIP = 1
+PACKET_STATISTICS = 6
+PACKET_MR_ALLMULTI = 2
+PACKET_OUTGOING = 4
+SO_DETACH_FILTER = 27
+SNAPLEN = 2048 # Bytes kept of each frame; every consumer only reads headers
+RCVBUF = 4 << 20 # Bytes the kernel buffers for us, to ride out bursts
+BATCH = 512 # Frames read per wakeup
+
+
+class Subscription:
+    """
+    A consumer of captured frames. bpf is its part of the kernel filter;
+    match tells its frames apart from those of other consumers, since the
+    filter is shared and may not be available at all.
+    """
+    __slots__ = ('name', 'bpf', 'match', 'callback')
+
+    def __init__(self, name, bpf, match, callback):
+        self.name = name
+        self.bpf = bpf
+        self.match = match
+        self.callback = callback
+
+
+class Capture(threading.Thread):
+    """
+    Reads the frames of one interface from a packet socket and hands them,
+    raw, to the subscribers they match. The kernel drops what the socket
+    buffer cannot hold, so a storm cannot grow memory.
+    """
+
+    def __init__(self, hub, iface):
+        super().__init__(name='capture-{}'.format(iface), daemon=True)
+        self.hub = hub
+        self.iface = iface
+        self.frames = 0
+        self.received = 0
+        self.dropped = 0
+        self._version = None # Subscriptions version the attached filter was built for
+        self._socket = None
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        """
+        Frames received and dropped by the kernel so far
+        """
+        try:
+            # The kernel resets its counters on every read
+            received, dropped = struct.unpack('II', self._socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+            self.received += received
+            self.dropped += dropped
+        except (AttributeError, OSError):
+            pass
+        return self.received, self.dropped
+
+    def _open(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        sock.bind((self.iface, ETH_P_ALL))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        sock.setblocking(False)
+        # Multicast announcements reach us even if no local service joined their group
+        mreq = struct.pack('iHH8s', socket.if_nametoindex(self.iface), PACKET_MR_ALLMULTI, 0, b'')
+        sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP, mreq)
+        return sock
+
+    def _update_filter(self):
+        if self._version == self.hub.version:
+            return
+        self._version = self.hub.version
+        expression = self.hub.filter()
+        try:
+            self._socket.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
+        except OSError:
+            pass # No filter attached yet
+        if not expression:
+            return
+        try:
+            from scapy.arch.linux import attach_filter
+            attach_filter(self._socket, expression, self.iface)
+        except Exception as e:
+            self.hub.filter_failed(e)
+
+    def run(self):
+        try:
+            self._socket = self._open()
+        except OSError as e:
+            logger.error('Cannot capture on {}: {}'.format(self.iface, str(e)))
+            return
+        try:
+            while not self._stopped.is_set():
+                self._update_filter()
+                if not select.select([self._socket], [], [], 0.5)[0]:
+                    continue
+                timestamp = time.time()
+                subscriptions = self.hub.subscriptions
+                for _ in range(BATCH):
+                    try:
+                        frame, address = self._socket.recvfrom(SNAPLEN)
+                    except BlockingIOError:
+                        break
+                    if address[2] == PACKET_OUTGOING:
+                        continue # Our own frames
+                    self.frames += 1
+                    for subscription in subscriptions:
+                        if subscription.match(frame):
+                            try:
+                                subscription.callback(self.iface, frame, timestamp)
+                            except Exception as e:
+                                logger.error('Capture consumer {} failed: {}'.format(subscription.name, str(e)))
+        except OSError as e:
+            logger.error('Capture on {} stopped: {}'.format(self.iface, str(e)))
+        finally:
+            self._socket.close()
+
+
+class CaptureHub:
+    """
+    One capture per interface, shared by every passive feature. Each
+    subscriber adds its part to the interface's BPF filter and receives only
+    the frames it matches, so a single socket per interface serves them all.
+    """
+
+    def __init__(self):
+        self.subscriptions = tuple() # Replaced, never changed in place, so captures can iterate freely
+        self.version = 0 # Bumped on every change of the subscriptions
+        self.captures = dict()
+        self._lock = threading.Lock()
+        self._filter_warned = False
+
+    def subscribe(self, name, bpf, match, callback):
+        """
+        Receive the frames matching bpf (kernel side) and match (a predicate
+        on the raw frame) as callback(iface, frame, timestamp). The callback
+        runs on the capture thread and must be quick.
+        """
+        with self._lock:
+            self.subscriptions = self.subscriptions + (Subscription(name, bpf, match, callback),)
+            self.version += 1
+
+    def unsubscribe(self, name):
+        with self._lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s.name != name)
+            self.version += 1
+
+    def filter(self):
+        return ' or '.join('({})'.format(s.bpf) for s in self.subscriptions)
+
+    def filter_failed(self, error):
+        if not self._filter_warned:
+            logger.warning('Cannot compile capture filter ({}), filtering in Python instead'.format(str(error)))
+            self._filter_warned = True
+
+    def sync(self, ifaces):
+        """
+        Capture on exactly the given interfaces
+        """
+        with self._lock:
+            for iface in list(self.captures):
+                if iface not in ifaces:
+                    self.captures.pop(iface).stop()
+            for iface in ifaces:
+                if iface not in self.captures:
+                    capture = Capture(self, iface)
+                    self.captures[iface] = capture
+                    capture.start()
+
+    def stats(self):
+        """
+        Frames delivered and dropped by the kernel, per interface
+        """
+        result = dict()
+        for iface, capture in list(self.captures.items()):
+            received, dropped = capture.stats()
+            result[iface] = {'frames': capture.frames, 'kernel_received': received, 'kernel_dropped': dropped}
+        return result
+
+    def shutdown(self):
+        self.sync(())
@@ -0,0 +1,283 @@
+import os
+import time
+import socket
+import struct
+import itertools
+import ipaddress
+import threading
+from scapy.utils import RawPcapReader, RawPcapNgReader
+from utils import logger, ARP_HEADER, new_host
+from names import BOOTP_HEADER, DHCP_COOKIE, DHCP_ACK, dhcp_options
+
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV4 = b'\x08\x00'
+ETHERTYPE_ARP = b'\x08\x06'
+ETHERTYPE_VLAN = (b'\x81\x00', b'\x88\xa8')
+ZERO_IP = b'\0\0\0\0'
+ZERO_MAC = b'\0' * 6
+MAX_HOSTS = 65536 # MACs followed per capture at most
+CHECK_EVERY = 8192 # Packets between progress updates and cancellation checks
+EVIDENCE = ('arp', 'dhcp', 'ip') # From strongest to weakest
+
+
+def ingest_path(path, peer_uid, directory):
+    """
+    The real path of a capture a client may have the server read, or None.
+    The server runs as root, so root clients may name any file and others
+    only files below directory. Symlinks are resolved before the check, and
+    nothing is opened or looked up for a refused path, so a refusal tells
+    nothing about the file.
+    """
+    path = os.path.realpath(path)
+    if peer_uid == 0:
+        return path
+    if not directory:
+        return None
+    directory = os.path.realpath(directory)
+    return path if os.path.commonpath([path, directory]) == directory and path != directory else None
+
+
+class IngestJob(threading.Thread):
+    """
+    Reads a pcap or pcapng file packet by packet, without loading it, and
+    collects the IP to MAC evidence in it: ARP senders and repliers, DHCP
+    leases and the IPv4 sources of on-link networks. ARP frames also go to
+    an ArpWatch of the job's own, so the capture's bindings and anomalies
+    are reported with the job; its old timestamps never reach the live table.
+    The hosts found are merged into the interface's known hosts at the end.
+    """
+
+    def __init__(self, job_id, path, iface, interfaces, arpwatch, network=None, prefix=24):
+        super().__init__(name='ingest-{}'.format(job_id), daemon=True)
+        self.id = job_id
+        self.path = path
+        self.iface = iface
+        self.interfaces = interfaces
+        self.arpwatch = arpwatch
+        self.prefix = prefix
+        self.state = 'running'
+        self.error = None
+        self.size = os.path.getsize(path)
+        self.position = 0
+        self.counters = dict.fromkeys(('packets', 'bytes', 'arp', 'dhcp', 'ip', 'skipped', 'dropped'), 0)
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.capture_span = (None, None)
+        self._evidence = dict() # MAC -> [IP, evidence kinds, first seen, last seen], raw bytes
+        self._names = dict() # MAC -> hostname from DHCP option 12
+        self._cancelled = threading.Event()
+        if network:
+            network = ipaddress.ip_network(network, strict=False)
+            self._mask = int(network.netmask)
+            self._networks = {int(network.network_address)}
+            self._learn = False # Networks are fixed by the caller
+        else:
+            self._mask = (0xffffffff << (32 - prefix)) & 0xffffffff
+            self._networks = set()
+            self._learn = True # On-link networks are those ARP is seen in
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            self._ingest()
+            self.state = 'cancelled' if self._cancelled.is_set() else 'done'
+        except Exception as e:
+            logger.error('Ingesting {} failed: {}'.format(self.path, str(e)))
+            self.error = str(e)
+            self.state = 'failed'
+        self.elapsed = time.time() - self.started
+        self._merge()
+        logger.info('Ingested {}: {} packets in {:.1f} s ({:.0f} packets/s), {} hosts'.format(
+            self.path, self.counters['packets'], self.elapsed, self.pps(), len(self._evidence)))
+
+    def _ingest(self):
+        reader = RawPcapReader(self.path)
+        n = 0
+        try:
+            linktype = getattr(reader, 'linktype', LINKTYPE_ETHERNET)
+            nano = getattr(reader, 'nano', False)
+            pcapng = isinstance(reader, RawPcapNgReader)
+            counters = self.counters
+            first = last = None
+            for n, (frame, meta) in enumerate(reader, 1):
+                if pcapng:
+                    linktype = meta.linktype
+                    timestamp = ((meta.tshigh << 32) | meta.tslow) / meta.tsresol
+                else:
+                    timestamp = meta.sec + meta.usec / (1e9 if nano else 1e6)
+                counters['bytes'] += len(frame)
+                if first is None:
+                    first = timestamp
+                last = timestamp
+                if linktype != LINKTYPE_ETHERNET or len(frame) < 14:
+                    counters['skipped'] += 1
+                else:
+                    try:
+                        self._frame(frame, timestamp)
+                    except (IndexError, ValueError, struct.error):
+                        counters['skipped'] += 1 # One malformed frame does not end the file
+                if n % CHECK_EVERY == 0:
+                    counters['packets'] = n
+                    self.position = reader.f.tell()
+                    self.elapsed = time.time() - self.started
+                    self.capture_span = (first, last)
+                    if self._cancelled.is_set():
+                        break
+            else:
+                self.position = self.size
+            self.capture_span = (first, last)
+        finally:
+            self.counters['packets'] = n # Also when reading stopped on an error
+            reader.close()
+
+    def _frame(self, frame, timestamp):
+        ethertype = frame[12:14]
+        if ethertype in ETHERTYPE_VLAN:
+            frame = frame[:12] + frame[16:] # Untagged, as the parsers expect
+            ethertype = frame[12:14]
+        if ethertype == ETHERTYPE_ARP:
+            self._arp(frame, timestamp)
+        elif ethertype == ETHERTYPE_IPV4:
+            self._ipv4(frame, timestamp)
+        else:
+            self.counters['skipped'] += 1
+
+    def _arp(self, frame, timestamp):
+        try:
+            htype, ptype, hlen, plen, op, sha, spa, tha, tpa = ARP_HEADER.unpack_from(frame, 14)
+        except struct.error:
+            self.counters['skipped'] += 1
+            return
+        if hlen != 6 or plen != 4 or ptype != 0x0800:
+            self.counters['skipped'] += 1
+            return
+        self.counters['arp'] += 1
+        if self.arpwatch:
+            self.arpwatch.handle(self.iface, frame, timestamp)
+        if spa != ZERO_IP:
+            self._record(sha, spa, 'arp', timestamp)
+        if op == 2 and tpa != ZERO_IP and tha != ZERO_MAC and not tha[0] & 1:
+            self._record(tha, tpa, 'arp', timestamp)
+
+    def _ipv4(self, frame, timestamp):
+        if len(frame) < 34 or frame[6] & 1:
+            self.counters['skipped'] += 1
+            return
+        header = (frame[14] & 0x0f) * 4
+        src = frame[26:30]
+        if frame[23] == 17 and len(frame) >= 14 + header + 8:
+            ports = frame[14 + header:18 + header]
+            if ports in (b'\x00\x44\x00\x43', b'\x00\x43\x00\x44'): # 68 -> 67 or 67 -> 68
+                self._dhcp(frame[22 + header:], timestamp)
+                return
+        if src == ZERO_IP:
+            return
+        self.counters['ip'] += 1
+        if (int.from_bytes(src, 'big') & self._mask) in self._networks:
+            self._record(frame[6:12], src, 'ip', timestamp)
+
+    def _dhcp(self, payload, timestamp):
+        if len(payload) < 240 or payload[236:240] != DHCP_COOKIE:
+            return
+        self.counters['dhcp'] += 1
+        op, ciaddr, yiaddr, chaddr = BOOTP_HEADER.unpack_from(payload)
+        options = dhcp_options(payload)
+        kind = options.get(53, b'\0')[0]
+        name = options.get(12)
+        if name:
+            self._names[chaddr] = name.decode(errors='replace').rstrip('\0')
+        if op == 2 and kind == DHCP_ACK and yiaddr != ZERO_IP:
+            self._record(chaddr, yiaddr, 'dhcp', timestamp)
+
+    def _record(self, mac, ip, kind, timestamp):
+        entry = self._evidence.get(mac)
+        if entry is None:
+            if len(self._evidence) >= MAX_HOSTS:
+                self.counters['dropped'] += 1
+                return
+            self._evidence[mac] = [ip, {kind}, timestamp, timestamp]
+        else:
+            # ARP and DHCP evidence outweighs what IP sources suggest
+            if entry[0] != ip and (kind != 'ip' or entry[1] == {'ip'}):
+                entry[0] = ip
+            entry[1].add(kind)
+            entry[3] = timestamp
+        if self._learn and kind != 'ip':
+            self._networks.add(int.from_bytes(ip, 'big') & self._mask)
+
+    def hosts(self):
+        hosts = list()
+        for mac, (ip, kinds, first, last) in list(self._evidence.items()):
+            host = new_host(socket.inet_ntoa(ip), mac.hex(':'), 'pcap', self._names.get(mac, ''))
+            host.update(iface=self.iface, evidence=[kind for kind in EVIDENCE if kind in kinds],
+                        first_seen=first, last_seen=last)
+            hosts.append(host)
+        return hosts
+
+    def _merge(self):
+        ctx = self.interfaces.get(self.iface)
+        if ctx and self._evidence:
+            found = {host['mac']: host for host in self.hosts()}
+            ctx.hosts = dict(found, **ctx.hosts) # Hosts of the live scan win
+
+    def pps(self):
+        return self.counters['packets'] / self.elapsed if self.elapsed else 0.0
+
+    def status(self):
+        elapsed = self.elapsed if self.state != 'running' else time.time() - self.started
+        first, last = self.capture_span
+        return {
+            'id': self.id,
+            'path': self.path,
+            'iface': self.iface,
+            'state': self.state,
+            'error': self.error,
+            'size': self.size,
+            'progress': round(self.position / self.size, 4) if self.size else 1.0,
+            'elapsed': round(elapsed, 3),
+            'pps': round(self.counters['packets'] / elapsed, 1) if elapsed else 0.0,
+            'mbps': round(self.counters['bytes'] * 8 / elapsed / 1e6, 1) if elapsed else 0.0,
+            'capture_start': first,
+            'capture_end': last,
+            'hosts': len(self._evidence),
+            'arp_events': self.arpwatch.metrics()['last_event'] if self.arpwatch else 0,
+            **self.counters
+        }
+
+
+class IngestManager:
+    """
+    Runs ingest jobs in the background and keeps the last few for polling
+    """
+
+    def __init__(self, interfaces, arpwatch, keep=16):
+        self.interfaces = interfaces
+        self.arpwatch = arpwatch # Live watch whose settings each job's own watch copies
+        self.keep = keep
+        self.jobs = dict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, path, iface, network=None, prefix=24):
+        if not os.path.isfile(path):
+            raise ValueError('{} is not a file'.format(path))
+        if network:
+            ipaddress.ip_network(network, strict=False) # Raises ValueError if malformed
+        with self._lock:
+            arpwatch = self.arpwatch.spawn() if self.arpwatch else None
+            job = IngestJob(next(self._ids), path, iface, self.interfaces, arpwatch, network, prefix)
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, old in self.jobs.items() if not old.is_alive() and old is not job]
+            for job_id in finished[:max(0, len(self.jobs) - self.keep)]:
+                del self.jobs[job_id]
+        job.start()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel_all(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
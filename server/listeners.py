@@ -0,0 +1,181 @@
+import os
+import grp
+import pwd
+import socket
+import struct
+import logging
+from io import BytesIO
+from socketserver import ThreadingMixIn, TCPServer
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, ServerHandler
+
+logger = logging.getLogger('tuxcut-server')
+
+SOCKET_PATH = '/run/tuxcut/tuxcut.sock'
+SOCKET_GROUP = 'tuxcut'
+TCP_HOST = '127.0.0.1'
+TCP_PORT = 8013
+MAX_BODY = 1 << 20 # Bytes; API requests are small JSON documents
+PEER_UID = 'tuxcut.peer_uid' # Environ key of the uid of a Unix socket client; absent over TCP
+
+
+def peer_credentials(sock):
+    """
+    The (pid, uid, gid) of the process at the other end of a Unix socket
+    """
+    return struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """
+    Answers with HTTP/1.1 so the connection can be reused, unless the reply
+    has no length (a streamed scan), in which case it ends the connection
+    """
+    http_version = '1.1'
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        if 'Content-Length' not in self.headers:
+            self.headers['Connection'] = 'close'
+            self.request_handler.close_connection = True
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Serves requests one after another on the same connection, instead of the
+    single request per connection of the wsgiref handler
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = 60 # Seconds an idle kept-alive connection holds its thread
+    # Buffered, so headers and body leave in one write instead of stalling on
+    # Nagle and delayed ACK; streamed replies are still flushed line by line
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        self.peer_uid = None
+        if self.request.family == socket.AF_UNIX:
+            self.peer_uid = peer_credentials(self.request)[1]
+        else:
+            # Replies larger than the buffer still leave in pieces; send the last one at once
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.handle_one_request()
+
+    def handle_one_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.timeout:
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        environ = self.get_environ()
+        if self.peer_uid is not None:
+            environ[PEER_UID] = self.peer_uid
+        # Read the whole body up front, so what the application leaves unread
+        # cannot be taken for the next request on this connection
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self.send_error(413)
+            self.close_connection = True
+            return
+        environ['wsgi.input'] = BytesIO(self.rfile.read(length))
+        handler = KeepAliveServerHandler(
+            environ['wsgi.input'], self.wfile, self.get_stderr(), environ,
+            multithread=True,
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+        self.wfile.flush()
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class UnixWSGIServer(ThreadingWSGIServer):
+    """
+    Serves the API on a Unix domain socket. Access is limited by the
+    permissions of the socket file and, for every connection, by the
+    credentials of the connecting process: root, the user the server runs
+    as, or a member of the socket group.
+    """
+    address_family = socket.AF_UNIX
+
+    def __init__(self, path, handler, group=SOCKET_GROUP):
+        self.group = group_id(group)
+        os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path) # Left behind by a previous run
+        super().__init__(path, handler)
+
+    def server_bind(self):
+        TCPServer.server_bind(self)
+        os.chmod(self.server_address, 0o660 if self.group is not None else 0o600)
+        if self.group is not None and os.geteuid() == 0:
+            os.chown(self.server_address, 0, self.group)
+        self.server_name = 'localhost'
+        self.server_port = 0
+        self.setup_environ()
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('local', 0)
+
+    def verify_request(self, request, client_address):
+        pid, uid, gid = peer_credentials(request)
+        if uid in (0, os.geteuid()) or in_group(uid, gid, self.group):
+            return True
+        logger.warning('Refused API connection from pid {} (uid {})'.format(pid, uid))
+        return False
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def group_id(name):
+    try:
+        return grp.getgrnam(name).gr_gid if name else None
+    except KeyError:
+        logger.warning('Group {} does not exist, the API socket is limited to its owner'.format(name))
+        return None
+
+
+def in_group(uid, gid, group):
+    if group is None:
+        return False
+    if gid == group:
+        return True
+    try:
+        return pwd.getpwuid(uid).pw_name in grp.getgrgid(group).gr_mem
+    except KeyError:
+        return False
+
+
+def make_unix_server(app, path=SOCKET_PATH, group=SOCKET_GROUP):
+    server = UnixWSGIServer(path, KeepAliveRequestHandler, group)
+    server.set_app(app)
+    return server
+
+
+def make_tcp_server(app, host=TCP_HOST, port=TCP_PORT):
+    server = ThreadingWSGIServer((host, port), KeepAliveRequestHandler)
+    server.set_app(app)
+    return server
@@ -0,0 +1,329 @@
+import time
+import socket
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('tuxcut-server')
+
+ETHERTYPE_IPV4 = b'\x08\x00'
+UDP = 17
+MDNS_PORT = 5353
+NETBIOS_NS_PORT = 137
+NETBIOS_DGM_PORT = 138
+DHCP_PORTS = (67, 68)
+NAME_PORTS = frozenset((MDNS_PORT, NETBIOS_NS_PORT, NETBIOS_DGM_PORT) + DHCP_PORTS)
+NAMES_BPF = 'udp and (port 5353 or port 137 or port 138 or port 67 or port 68)'
+PORT_PAIR = struct.Struct('!HH')
+DNS_HEADER = struct.Struct('!HHHHHH') # id, flags, questions, answers, authority, additional
+RR_HEADER = struct.Struct('!HHIH') # type, class, TTL, data length
+NETBIOS_DGM_HEADER = struct.Struct('!BBH4sHHH') # type, flags, id, source IP, source port, length, offset
+BOOTP_HEADER = struct.Struct('!B11x4s4s8x6s') # op, ciaddr, yiaddr, chaddr
+DHCP_COOKIE = b'\x63\x82\x53\x63'
+DHCP_ACK = 5
+ZERO_IP = b'\0\0\0\0'
+TYPE_A = 1
+TYPE_AAAA = 28
+TYPE_NB = 0x20
+NB_GROUP = 0x8000
+NETBIOS_HOST_SUFFIXES = (0x00, 0x20) # Workstation and file server names; the others name services
+MAX_POINTERS = 32 # Compression pointers followed per DNS name, against loops
+
+# Where a name came from, passive sources first
+MDNS = 'mdns'
+NETBIOS = 'netbios'
+DHCP = 'dhcp'
+PTR = 'ptr'
+
+
+def dhcp_options(payload):
+    """
+    Return {code: value} of the options of a BOOTP payload
+    """
+    options = dict()
+    i = 240
+    while i < len(payload):
+        code = payload[i]
+        if code == 255:
+            break
+        if code == 0:
+            i += 1
+            continue
+        if i + 1 >= len(payload):
+            break
+        length = payload[i + 1]
+        options[code] = payload[i + 2:i + 2 + length]
+        i += 2 + length
+    return options
+
+
+def dns_name(message, offset):
+    """
+    Return the name at offset in a DNS message and the offset after it,
+    following compression pointers
+    """
+    labels = list()
+    end = None
+    for _ in range(MAX_POINTERS):
+        while True:
+            length = message[offset]
+            if length & 0xc0 == 0xc0:
+                break
+            offset += 1
+            if not length:
+                return '.'.join(labels), end if end is not None else offset
+            labels.append(message[offset:offset + length].decode(errors='replace'))
+            offset += length
+        if end is None:
+            end = offset + 2
+        offset = ((length & 0x3f) << 8) | message[offset + 1]
+    raise ValueError('too many compression pointers')
+
+
+def netbios_name(encoded):
+    """
+    Decode a first-level encoded NetBIOS name, 32 letters from 'A' to 'P'
+    holding 16 bytes. Returns the name and its suffix byte.
+    """
+    if len(encoded) != 32:
+        raise ValueError('not an encoded NetBIOS name')
+    raw = bytes(((encoded[i] - 65) << 4) | (encoded[i + 1] - 65) & 0x0f for i in range(0, 32, 2))
+    return raw[:15].decode(errors='replace').rstrip(' \0'), raw[15]
+
+
+def is_name_traffic(frame):
+    """
+    An IPv4 UDP datagram to or from a port names are announced on
+    """
+    if len(frame) < 42 or frame[12:14] != ETHERTYPE_IPV4 or frame[23] != UDP:
+        return False
+    header = 14 + (frame[14] & 0x0f) * 4
+    if len(frame) < header + 8:
+        return False
+    src, dst = PORT_PAIR.unpack_from(frame, header)
+    return src in NAME_PORTS or dst in NAME_PORTS
+
+
+class Name:
+    __slots__ = ('name', 'source', 'mac', 'seen', 'expires')
+
+    def __init__(self, name, source, mac, seen, expires=None):
+        self.name = name
+        self.source = source
+        self.mac = mac # Of the host that announced it, to notice when its IP moves on
+        self.seen = seen
+        self.expires = expires # time.monotonic() after which a PTR answer is asked again
+
+
+class NameCache:
+    """
+    Hostnames by IP, and by MAC for DHCP clients whose address is not known
+    yet. Hosts announce their own names in mDNS responses, NetBIOS
+    registrations and datagrams, and DHCP requests; those are learned from
+    the capture and win over PTR records. PTR answers are cached as well,
+    unanswered lookups included, so a host costs at most one DNS query per
+    ttl instead of one per scan.
+    Memory is bounded: the least recently learned entries are evicted
+    beyond max_entries.
+    """
+
+    def __init__(self, max_entries=4096, ptr=True, ptr_ttl=3600.0, negative_ttl=300.0):
+        self.max_entries = max_entries
+        self.ptr = ptr # Whether unknown names are asked from DNS at all
+        self.ptr_ttl = ptr_ttl
+        self.negative_ttl = negative_ttl
+        self.ips = OrderedDict() # IP -> Name, least recently learned first
+        self.macs = OrderedDict() # MAC -> Name, passive sources only
+        self.counters = dict.fromkeys(('frames', MDNS, NETBIOS, DHCP, 'learned', 'malformed',
+                                       'hits', 'misses', 'ptr_queries', 'evicted'), 0)
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries, ptr, ptr_ttl, negative_ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ptr = ptr
+            self.ptr_ttl = ptr_ttl
+            self.negative_ttl = negative_ttl
+            for table in (self.ips, self.macs):
+                while len(table) > max_entries:
+                    table.popitem(last=False)
+                    self.counters['evicted'] += 1
+
+    def subscribe(self, hub):
+        hub.subscribe('names', NAMES_BPF, is_name_traffic, self.handle)
+
+    def handle(self, iface, frame, timestamp):
+        """
+        Learn the names announced in one captured datagram, on the capture thread
+        """
+        self.counters['frames'] += 1
+        header = 14 + (frame[14] & 0x0f) * 4
+        src_port, dst_port = PORT_PAIR.unpack_from(frame, header)
+        payload = frame[header + 8:]
+        src, mac = frame[26:30], frame[6:12].hex(':')
+        try:
+            if MDNS_PORT in (src_port, dst_port):
+                self._mdns(payload, socket.inet_ntoa(src), mac, timestamp)
+            elif NETBIOS_NS_PORT in (src_port, dst_port):
+                self._netbios_ns(payload, socket.inet_ntoa(src), mac, timestamp)
+            elif NETBIOS_DGM_PORT in (src_port, dst_port):
+                self._netbios_dgm(payload, mac, timestamp)
+            else:
+                self._dhcp(payload, timestamp)
+        except (IndexError, ValueError, struct.error):
+            self.counters['malformed'] += 1
+
+    def _mdns(self, message, src, mac, timestamp):
+        ident, flags, questions, answers, authority, additional = DNS_HEADER.unpack_from(message)
+        if not flags & 0x8000:
+            return # Queries only carry names the asker already knows
+        self.counters[MDNS] += 1
+        offset = DNS_HEADER.size
+        for _ in range(questions):
+            name, offset = dns_name(message, offset)
+            offset += 4
+        records = list()
+        for _ in range(answers + authority + additional):
+            name, offset = dns_name(message, offset)
+            kind, rclass, ttl, length = RR_HEADER.unpack_from(message, offset)
+            data = message[offset + RR_HEADER.size:offset + RR_HEADER.size + length]
+            offset += RR_HEADER.size + length
+            if not ttl or not name:
+                continue # A goodbye: the record is withdrawn
+            if kind == TYPE_A and length == 4:
+                records.append((name, socket.inet_ntoa(data)))
+            elif kind == TYPE_AAAA and length == 16:
+                records.append((name, socket.inet_ntop(socket.AF_INET6, data)))
+        # Sleep proxies answer for others, so only the names of the sender's own address get its MAC
+        own = {name for name, ip in records if ip == src}
+        for name, ip in records:
+            short = name[:-6] if name.lower().endswith('.local') else name
+            self.learn(ip, short, MDNS, mac if name in own else None, timestamp)
+
+    def _netbios_ns(self, message, src, mac, timestamp):
+        ident, flags, questions, answers, authority, additional = DNS_HEADER.unpack_from(message)
+        opcode = (flags >> 11) & 0x0f
+        # Registrations and refreshes come from the name's owner, positive answers to queries from anyone
+        if opcode not in (0, 5, 8, 9) or (opcode == 0 and not flags & 0x8000) or answers + additional != 1:
+            return
+        self.counters[NETBIOS] += 1
+        offset = DNS_HEADER.size
+        for _ in range(questions):
+            name, offset = dns_name(message, offset)
+            offset += 4
+        name, offset = dns_name(message, offset)
+        kind, rclass, ttl, length = RR_HEADER.unpack_from(message, offset)
+        if kind != TYPE_NB or length < 6:
+            return
+        nb_flags, ip = struct.unpack_from('!H4s', message, offset + RR_HEADER.size)
+        name, suffix = netbios_name(name.split('.')[0].encode())
+        if not nb_flags & NB_GROUP and suffix in NETBIOS_HOST_SUFFIXES and ip != ZERO_IP:
+            ip = socket.inet_ntoa(ip)
+            self.learn(ip, name, NETBIOS, mac if ip == src else None, timestamp)
+
+    def _netbios_dgm(self, message, mac, timestamp):
+        kind, flags, ident, ip, port, length, offset = NETBIOS_DGM_HEADER.unpack_from(message)
+        if kind not in (0x10, 0x11, 0x12): # Direct unique, direct group and broadcast datagrams
+            return
+        self.counters[NETBIOS] += 1
+        name, offset = dns_name(message, NETBIOS_DGM_HEADER.size)
+        name, suffix = netbios_name(name.split('.')[0].encode())
+        if suffix in NETBIOS_HOST_SUFFIXES and ip != ZERO_IP:
+            self.learn(socket.inet_ntoa(ip), name, NETBIOS, mac, timestamp)
+
+    def _dhcp(self, payload, timestamp):
+        if len(payload) < 240 or payload[236:240] != DHCP_COOKIE:
+            return
+        self.counters[DHCP] += 1
+        op, ciaddr, yiaddr, chaddr = BOOTP_HEADER.unpack_from(payload)
+        options = dhcp_options(payload)
+        mac = chaddr.hex(':')
+        name = options.get(12, b'').decode(errors='replace').rstrip('\0')
+        if op == 1:
+            # A client naming itself; its address is the one it asks for or already has
+            if name:
+                ip = options.get(50) if len(options.get(50, b'')) == 4 else ciaddr
+                self.learn(socket.inet_ntoa(ip) if ip != ZERO_IP else None, name, DHCP, mac, timestamp)
+        elif options.get(53, b'\0')[0] == DHCP_ACK and yiaddr != ZERO_IP:
+            # The lease binds the name the client sent to its address
+            if not name:
+                with self._lock:
+                    entry = self.macs.get(mac)
+                    name = entry.name if entry is not None and entry.source == DHCP else ''
+            if name:
+                self.learn(socket.inet_ntoa(yiaddr), name, DHCP, mac, timestamp)
+
+    def learn(self, ip, name, source, mac=None, timestamp=None):
+        """
+        Record a name a host announced; ip may be None if only its MAC is known
+        """
+        name = name.strip().rstrip('.')
+        if not name:
+            return
+        entry = Name(name, source, mac, timestamp or time.time())
+        with self._lock:
+            if ip is not None:
+                previous = self.ips.get(ip)
+                if previous is None or (previous.name, previous.source) != (name, source):
+                    self.counters['learned'] += 1
+                self._put(self.ips, ip, entry)
+            if mac is not None:
+                self._put(self.macs, mac, entry)
+
+    def _put(self, table, key, entry):
+        if key in table:
+            table.move_to_end(key)
+        elif len(table) >= self.max_entries:
+            table.popitem(last=False)
+            self.counters['evicted'] += 1
+        table[key] = entry
+
+    def lookup(self, ip, mac=None):
+        """
+        Return the cached name of ip, '' if it is known to have none, or
+        None if DNS has to be asked. Passing the host's MAC skips names its
+        IP had under a previous owner.
+        """
+        with self._lock:
+            entry = self.ips.get(ip)
+            if entry is not None and entry.source != PTR and not (mac and entry.mac and entry.mac != mac):
+                self.counters['hits'] += 1
+                return entry.name
+            by_mac = self.macs.get(mac) if mac else None
+            if by_mac is not None:
+                self.counters['hits'] += 1
+                return by_mac.name
+            if entry is not None and entry.source == PTR and entry.expires > time.monotonic():
+                self.counters['hits'] += 1
+                return entry.name
+            self.counters['misses'] += 1
+            return None
+
+    def store_ptr(self, ip, name):
+        """
+        Cache the answer to a PTR query, '' when there was none
+        """
+        ttl = self.ptr_ttl if name else self.negative_ttl
+        with self._lock:
+            self.counters['ptr_queries'] += 1
+            previous = self.ips.get(ip)
+            if previous is not None and previous.source != PTR and previous.seen > time.time() - ttl:
+                return # Learned while the query ran
+            self._put(self.ips, ip, Name(name, PTR, None, time.time(), time.monotonic() + ttl))
+
+    def entries(self):
+        """
+        Every cached name, as dicts with its IP or MAC, source and when it was learned
+        """
+        with self._lock:
+            by_ip = [{'ip': ip, 'mac': entry.mac, 'name': entry.name, 'source': entry.source, 'seen': entry.seen}
+                     for ip, entry in self.ips.items() if entry.name]
+            ips = {entry.mac for entry in self.ips.values() if entry.mac}
+            by_mac = [{'ip': None, 'mac': mac, 'name': entry.name, 'source': entry.source, 'seen': entry.seen}
+                      for mac, entry in self.macs.items() if mac not in ips]
+        return by_ip + by_mac
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, ips=len(self.ips), macs=len(self.macs))
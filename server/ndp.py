@@ -0,0 +1,261 @@
+import os
+import time
+import errno
+import select
+import socket
+import struct
+import itertools
+import ipaddress
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import psutil
+from utils import logger
+from netlink import get_neighbors6
+
+ETHERTYPE_IPV6 = b'\x86\xdd'
+ICMPV6 = 58
+ECHO_REQUEST = 128
+ECHO_REPLY = 129
+ROUTER_SOLICIT = 133
+ROUTER_ADVERT = 134
+NEIGHBOR_SOLICIT = 135
+NEIGHBOR_ADVERT = 136
+NDP_TYPES = frozenset((ROUTER_SOLICIT, ROUTER_ADVERT, NEIGHBOR_SOLICIT, NEIGHBOR_ADVERT))
+OPT_SOURCE_LLADDR = 1
+OPT_TARGET_LLADDR = 2
+NDP_BPF = 'icmp6 and (ip6[40] == 129 or (ip6[40] >= 133 and ip6[40] <= 136))'
+ALL_NODES = 'ff02::1'
+ZERO_IP6 = bytes(16)
+ECHO_HEADER = struct.Struct('!BBHHH') # type, code, checksum, identifier, sequence
+MAX_HOSTS = 4096 # MACs followed at most
+MAX_ADDRESSES = 8 # IPv6 addresses kept per MAC, most recently seen
+
+
+def is_ndp(frame):
+    """
+    An ICMPv6 echo reply or neighbor discovery message without extension headers
+    """
+    return (len(frame) >= 58 and frame[12:14] == ETHERTYPE_IPV6 and frame[20] == ICMPV6
+            and (frame[54] == ECHO_REPLY or frame[54] in NDP_TYPES))
+
+
+def is_unicast(ip):
+    """
+    Whether ip (16 bytes) can be a host's own address
+    """
+    return ip[0] != 0xff and ip != ZERO_IP6 and ip != b'\0' * 15 + b'\1'
+
+
+def link_layer_option(frame, offset, kind):
+    """
+    Return the link-layer address option of the given kind among the NDP
+    options from offset on, or None
+    """
+    while offset + 8 <= len(frame):
+        length = frame[offset + 1] * 8
+        if not length:
+            break
+        if frame[offset] == kind:
+            return frame[offset + 2:offset + 8]
+        offset += length
+    return None
+
+
+def own_addresses(iface):
+    """
+    Return the IPv6 addresses of iface, link-local first
+    """
+    addresses = list()
+    for addr in psutil.net_if_addrs().get(iface, ()):
+        if addr.family == socket.AF_INET6:
+            address = ipaddress.IPv6Address(addr.address.split('%')[0])
+            if not address.is_loopback:
+                addresses.append(address)
+    return sorted(addresses, key=lambda address: not address.is_link_local)
+
+
+def sort_addresses(addresses):
+    """
+    Global addresses first, then link-local, each in numeric order
+    """
+    return sorted(addresses, key=lambda address: (ipaddress.IPv6Address(address).is_link_local,
+                                                  ipaddress.IPv6Address(address)))
+
+
+def echo_all_nodes(iface, wait=1.0, sequence=0):
+    """
+    Ping the all-nodes group of iface once from each of our addresses and
+    collect who answers for wait seconds. Hosts answer a link-local source
+    from their link-local address and a global one from a global address,
+    so both kinds are found without probing any single address.
+    Returns the set of addresses that replied.
+    """
+    sources = own_addresses(iface)
+    if not sources:
+        return set()
+    index = socket.if_nametoindex(iface)
+    identifier = os.getpid() & 0xffff
+    replies = set()
+    sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+    try:
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, index)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, 1)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, 0)
+        sock.setblocking(False)
+        # The kernel fills in the checksum of raw ICMPv6
+        request = ECHO_HEADER.pack(ECHO_REQUEST, 0, 0, identifier, sequence & 0xffff) + b'tuxcut'
+        for source in sources:
+            pktinfo = struct.pack('16sI', source.packed, index)
+            try:
+                sock.sendmsg([request], [(socket.IPPROTO_IPV6, socket.IPV6_PKTINFO, pktinfo)], 0,
+                               (ALL_NODES, 0, 0, index))
+            except OSError as e:
+                logger.warning('Cannot ping {}%{} from {}: {}'.format(ALL_NODES, iface, source, str(e)))
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                break
+            while True:
+                try:
+                    data, address = sock.recvfrom(1500)
+                except OSError as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    raise
+                if len(data) < ECHO_HEADER.size:
+                    continue
+                kind, code, checksum, reply_id, reply_seq = ECHO_HEADER.unpack_from(data)
+                # Only link-local sources carry the interface; the sequence tells concurrent scans apart
+                if kind == ECHO_REPLY and reply_id == identifier and reply_seq == sequence & 0xffff \
+                        and address[3] in (0, index):
+                    replies.add(address[0].split('%')[0])
+    finally:
+        sock.close()
+    return replies
+
+
+class NeighborWatch:
+    """
+    Learns the IPv6 addresses of LAN hosts from the neighbor discovery and
+    echo traffic the capture sees, keyed by interface and MAC, and runs the
+    active part of IPv6 discovery for scans. A /64 cannot be swept, so
+    hosts are found from what they announce, from their answers to one
+    all-nodes ping and from the kernel's neighbor table.
+    Memory is bounded: the least recently seen MACs are evicted beyond
+    MAX_HOSTS and each keeps its MAX_ADDRESSES latest addresses.
+    """
+
+    def __init__(self, enabled=True, wait=1.0):
+        self.enabled = enabled
+        self.wait = wait # Seconds a scan listens for echo replies
+        self.neighbors = OrderedDict() # (iface, MAC bytes) -> OrderedDict of IPv6 bytes -> last seen
+        self.counters = dict.fromkeys(('frames', 'echo', 'ndp', 'learned', 'evicted', 'malformed'), 0)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix='ndp')
+
+    def configure(self, enabled, wait):
+        self.enabled = enabled
+        self.wait = wait
+
+    def subscribe(self, hub):
+        hub.subscribe('ndp', NDP_BPF, is_ndp, self.handle)
+
+    def handle(self, iface, frame, timestamp):
+        """
+        Account for one captured ICMPv6 frame, on the capture thread
+        """
+        self.counters['frames'] += 1
+        mac = frame[6:12]
+        if mac[0] & 1:
+            return
+        src, dst, kind = frame[22:38], frame[38:54], frame[54]
+        if kind == ECHO_REPLY:
+            self.counters['echo'] += 1
+            self._learn(iface, mac, src, timestamp)
+            return
+        if frame[21] != 255:
+            self.counters['malformed'] += 1 # NDP is only valid from the link itself
+            return
+        self.counters['ndp'] += 1
+        if kind == NEIGHBOR_SOLICIT:
+            if len(frame) < 78:
+                self.counters['malformed'] += 1
+            elif src == ZERO_IP6:
+                self._learn(iface, mac, frame[62:78], timestamp) # Duplicate address detection of its next address
+            else:
+                self._learn(iface, link_layer_option(frame, 78, OPT_SOURCE_LLADDR) or mac, src, timestamp)
+        elif kind == NEIGHBOR_ADVERT:
+            if len(frame) < 78:
+                self.counters['malformed'] += 1
+            else:
+                self._learn(iface, link_layer_option(frame, 78, OPT_TARGET_LLADDR) or mac, frame[62:78], timestamp)
+        else:
+            self._learn(iface, mac, src, timestamp) # Router solicitations and advertisements
+
+    def _learn(self, iface, mac, ip, timestamp):
+        if not is_unicast(ip):
+            return
+        key = (iface, mac)
+        with self._lock:
+            addresses = self.neighbors.get(key)
+            if addresses is None:
+                if len(self.neighbors) >= MAX_HOSTS:
+                    self.neighbors.popitem(last=False)
+                    self.counters['evicted'] += 1
+                addresses = self.neighbors[key] = OrderedDict()
+            else:
+                self.neighbors.move_to_end(key)
+            if ip not in addresses:
+                self.counters['learned'] += 1
+                if len(addresses) >= MAX_ADDRESSES:
+                    addresses.popitem(last=False)
+            addresses[ip] = timestamp
+            addresses.move_to_end(ip)
+
+    def addresses(self, iface):
+        """
+        Return {MAC: [IPv6 addresses]} of the hosts seen on iface
+        """
+        with self._lock:
+            return {mac.hex(':'): [socket.inet_ntop(socket.AF_INET6, ip) for ip in addresses]
+                    for (seen_on, mac), addresses in self.neighbors.items() if seen_on == iface}
+
+    def discover(self, iface):
+        """
+        Start the active discovery of iface's IPv6 neighbors, for running
+        beside the ARP sweep. Returns a future of {MAC: [addresses]}, global
+        addresses first.
+        """
+        return self._executor.submit(self._discover, iface, self.wait, next(self._sequence))
+
+    def _discover(self, iface, wait, sequence):
+        started = time.perf_counter()
+        try:
+            replied = echo_all_nodes(iface, wait, sequence)
+        except OSError as e:
+            logger.warning('IPv6 echo on {} failed: {}'.format(iface, str(e)))
+            replied = set()
+        found = dict()
+        for mac, addresses in self.addresses(iface).items():
+            found.setdefault(mac, set()).update(addresses)
+        # Hosts that answered have resolved us and, with that, we them
+        try:
+            for address, mac in get_neighbors6(iface):
+                found.setdefault(mac, set()).add(address)
+        except OSError as e:
+            logger.warning('Cannot read the IPv6 neighbors of {}: {}'.format(iface, str(e)))
+        found = {mac: sort_addresses(addresses) for mac, addresses in found.items()}
+        resolved = set(itertools.chain.from_iterable(found.values()))
+        logger.info('IPv6 discovery on {}: {} hosts, {} echo replies ({} without a MAC) in {:.0f} ms'.format(
+            iface, len(found), len(replied), len(replied - resolved), (time.perf_counter() - started) * 1000))
+        return found
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.counters, hosts=len(self.neighbors))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,295 @@
+import os
+import time
+import errno
+import socket
+import struct
+import logging
+import threading
+
+logger = logging.getLogger('tuxcut-server')
+
+# rtnetlink constants, from linux/netlink.h, linux/rtnetlink.h and linux/if_link.h
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x01
+NLM_F_ACK = 0x04
+NLM_F_REPLACE = 0x100
+NLM_F_DUMP = 0x300
+NLM_F_CREATE = 0x400
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+RTA_OIF = 4
+RTPROT_KERNEL = 2
+RT_TABLE_LOCAL = 255
+RTNH_F_DEAD = 0x1
+RTNH_F_LINKDOWN = 0x10
+IFF_UP = 0x1
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_INCOMPLETE = 0x01
+NUD_FAILED = 0x20
+NUD_NOARP = 0x40
+
+NLMSG_HEADER = struct.Struct('=IHHII') # length, type, flags, sequence, port id
+IFINFOMSG = struct.Struct('=BxHiII') # family, device type, index, flags, change mask
+RTATTR = struct.Struct('=HH') # length, type
+RTMSG = struct.Struct('=BBBBBBBBI') # family, dst len, src len, tos, table, protocol, scope, type, flags
+NDMSG = struct.Struct('=BxxxiHBB') # family, index, state, flags, type
+
+CARRIER_TIMEOUT = 10 # Seconds to wait for the link to come back after a change
+
+_change_lock = threading.Lock()
+
+
+class NetlinkError(OSError):
+    """
+    Raised when the kernel rejects a netlink request.
+    """
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _attr(kind, data):
+    return RTATTR.pack(RTATTR.size + len(data), kind) + data + b'\0' * (_align(len(data)) - len(data))
+
+
+def _parse_attrs(data):
+    attrs = dict()
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[kind] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+class RouteSocket:
+    """
+    A NETLINK_ROUTE socket for reading and changing links. Every request
+    waits for the kernel's answer, so changes are applied in order and their
+    errors are seen.
+    """
+
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self._socket.bind((0, 0))
+        self._socket.settimeout(5)
+        self._seq = int(time.time())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._socket.close()
+
+    def request(self, kind, payload, flags=0):
+        """
+        Send one request and collect its replies until the kernel acknowledges
+        it, raising NetlinkError if it was refused
+        """
+        self._seq += 1
+        seq = self._seq
+        flags |= NLM_F_REQUEST | NLM_F_ACK
+        self._socket.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), kind, flags, seq, 0) + payload)
+        replies = list()
+        while True:
+            data = self._socket.recv(65536)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, kind, flags, reply_seq, port = NLMSG_HEADER.unpack_from(data, offset)
+                body = data[offset + NLMSG_HEADER.size:offset + length]
+                offset += _align(length)
+                if reply_seq != seq:
+                    continue
+                if kind == NLMSG_ERROR:
+                    code = -struct.unpack_from('=i', body)[0]
+                    if code:
+                        raise NetlinkError(code, os.strerror(code))
+                    return replies # Acknowledged
+                if kind == NLMSG_DONE:
+                    return replies
+                replies.append((kind, body))
+
+    def get_link(self, index):
+        """
+        Return the name, flags, MAC and operational state of a link
+        """
+        replies = self.request(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, 0, 0))
+        for kind, body in replies:
+            if kind != RTM_NEWLINK:
+                continue
+            family, dev_type, index, flags, change = IFINFOMSG.unpack_from(body)
+            attrs = _parse_attrs(body[IFINFOMSG.size:])
+            return {
+                'index': index,
+                'name': attrs.get(IFLA_IFNAME, b'').rstrip(b'\0').decode(),
+                'flags': flags,
+                'mac': ':'.join('%02x' % b for b in attrs.get(IFLA_ADDRESS, b'')),
+                'operstate': attrs.get(IFLA_OPERSTATE, b'\0')[0]
+            }
+        raise NetlinkError(errno.ENODEV, os.strerror(errno.ENODEV))
+
+    def set_link(self, index, mac=None, up=None):
+        """
+        Set the MAC of a link and/or bring it up or down, in one request.
+        The kernel applies the address before the flags.
+        """
+        flags = change = 0
+        if up is not None:
+            change = IFF_UP
+            flags = IFF_UP if up else 0
+        attrs = _attr(IFLA_ADDRESS, bytes.fromhex(mac.replace(':', ''))) if mac else b''
+        self.request(RTM_NEWLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change) + attrs)
+
+    def get_routes(self, index):
+        """
+        Return the IPv4 routes through a link that the kernel would not bring
+        back by itself when the link comes up, as raw route messages
+        """
+        routes = list()
+        for kind, body in self.request(RTM_GETROUTE, RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0), NLM_F_DUMP):
+            if kind != RTM_NEWROUTE:
+                continue
+            family, dst_len, src_len, tos, table, protocol, scope, kind, flags = RTMSG.unpack_from(body)
+            oif = _parse_attrs(body[RTMSG.size:]).get(RTA_OIF)
+            if table == RT_TABLE_LOCAL or protocol == RTPROT_KERNEL or oif is None:
+                continue
+            if struct.unpack('=I', oif)[0] == index:
+                flags &= ~(RTNH_F_DEAD | RTNH_F_LINKDOWN)
+                routes.append(RTMSG.pack(family, dst_len, src_len, tos, table, protocol, scope, kind, flags)
+                              + body[RTMSG.size:])
+        return routes
+
+    def add_route(self, route):
+        self.request(RTM_NEWROUTE, route, NLM_F_CREATE | NLM_F_REPLACE)
+
+    def get_neighbors(self, family, index=0):
+        """
+        Return the resolved entries of the kernel's neighbor table for family
+        as (address, MAC) pairs, only those of one link if index is given
+        """
+        neighbors = list()
+        for kind, body in self.request(RTM_GETNEIGH, NDMSG.pack(family, index, 0, 0, 0), NLM_F_DUMP):
+            if kind != RTM_NEWNEIGH:
+                continue
+            family, link, state, flags, kind = NDMSG.unpack_from(body)
+            if (index and link != index) or state & (NUD_INCOMPLETE | NUD_FAILED | NUD_NOARP):
+                continue
+            attrs = _parse_attrs(body[NDMSG.size:])
+            if NDA_DST in attrs and len(attrs.get(NDA_LLADDR, b'')) == 6:
+                neighbors.append((socket.inet_ntop(family, attrs[NDA_DST]), attrs[NDA_LLADDR].hex(':')))
+        return neighbors
+
+
+def get_neighbors6(iface):
+    """
+    Return the IPv6 neighbors the kernel has resolved on iface, as (address, MAC)
+    """
+    with RouteSocket() as nl:
+        return nl.get_neighbors(socket.AF_INET6, socket.if_nametoindex(iface))
+
+
+def _wait_operstate(nl, index, operstate, timeout=CARRIER_TIMEOUT):
+    """
+    Wait for a link to return to its operational state, e.g. for a wireless
+    link to reassociate. Returns False on timeout.
+    """
+    deadline = time.perf_counter() + timeout
+    while nl.get_link(index)['operstate'] != operstate:
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _apply(nl, index, mac, was_up):
+    """
+    Set mac on a link, live if its driver allows that, otherwise with the
+    link down for as short as possible.
+    Returns True if the change was live.
+    """
+    try:
+        nl.set_link(index, mac=mac)
+        return True
+    except NetlinkError as e:
+        if e.errno != errno.EBUSY or not was_up:
+            raise
+    # The driver needs the link down: one request down, one to set the
+    # address and bring it back up. Taking the link down drops its routes,
+    # the default route among them, so they are put back afterwards.
+    routes = nl.get_routes(index)
+    nl.set_link(index, up=False)
+    try:
+        nl.set_link(index, mac=mac, up=True)
+    except NetlinkError:
+        nl.set_link(index, up=True)
+        raise
+    finally:
+        for route in routes:
+            try:
+                nl.add_route(route)
+            except NetlinkError as e:
+                logger.warning('Could not restore a route after changing the MAC: {}'.format(str(e)))
+    return False
+
+
+def _restore(nl, index, before):
+    """
+    Put a link back to its state before a failed change, touching only what
+    differs
+    """
+    try:
+        now = nl.get_link(index)
+        was_up = bool(before['flags'] & IFF_UP)
+        if now['mac'] != before['mac']:
+            logger.info('Restoring the MAC of {} to {}'.format(before['name'], before['mac']))
+            _apply(nl, index, before['mac'], bool(now['flags'] & IFF_UP))
+            now = nl.get_link(index)
+        if bool(now['flags'] & IFF_UP) != was_up:
+            nl.set_link(index, up=was_up)
+    except Exception as e:
+        logger.error('Restoring {} failed: {}'.format(before['name'], str(e)))
+
+
+def change_mac(iface, mac):
+    """
+    Change the MAC address of iface as one verified transaction: the new
+    address is checked after the change, and on any failure the old address
+    and link state are restored.
+    Returns a dict with the old and new MAC, whether the change was live and
+    the outage in milliseconds, measured until the link was operational again.
+    """
+    index = socket.if_nametoindex(iface)
+    with _change_lock, RouteSocket() as nl:
+        before = nl.get_link(index)
+        was_up = bool(before['flags'] & IFF_UP)
+        started = time.perf_counter()
+        try:
+            live = _apply(nl, index, mac, was_up)
+            after = nl.get_link(index)
+            if after['mac'] != mac.lower():
+                raise NetlinkError(errno.EIO, 'address is {} after the change'.format(after['mac']))
+            if was_up and not _wait_operstate(nl, index, before['operstate']):
+                raise NetlinkError(errno.ETIMEDOUT, 'link did not come back up')
+        except Exception as e:
+            logger.error('Changing the MAC of {} failed: {}'.format(iface, str(e)))
+            _restore(nl, index, before)
+            raise
+        outage_ms = 0.0 if live else (time.perf_counter() - started) * 1000
+    logger.info('MAC of {} changed from {} to {} ({}, {:.0f} ms outage)'.format(
+        iface, before['mac'], mac, 'live' if live else 'link restarted', outage_ms))
+    return {'iface': iface, 'old_mac': before['mac'], 'mac': mac.lower(), 'live': live, 'outage_ms': round(outage_ms, 1)}
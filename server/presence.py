@@ -0,0 +1,162 @@
+import time
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scapy.all import srp, Ether, ARP
+from utils import logger
+
+
+class HostHistory:
+    """
+    Fixed-size history of one host: the last probe samples and up/down
+    transitions live in ring buffers, so memory does not grow over time.
+    """
+    __slots__ = ('ip', 'mac', 'iface', 'up', 'added', 'last_seen', 'due', 'samples', 'transitions')
+
+    def __init__(self, ip, mac, iface, size, due):
+        self.ip = ip
+        self.mac = mac
+        self.iface = iface
+        self.up = None
+        self.added = time.time()
+        self.last_seen = 0.0
+        self.due = due # time.monotonic() of the next probe
+        self.samples = deque(maxlen=size)      # (timestamp, rtt in ms or None when down)
+        self.transitions = deque(maxlen=size)  # (timestamp, up)
+
+    def record(self, timestamp, rtt):
+        up = rtt is not None
+        self.samples.append((timestamp, rtt))
+        if up:
+            self.last_seen = timestamp
+        if up != self.up:
+            self.transitions.append((timestamp, up))
+            self.up = up
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'mac': self.mac,
+            'iface': self.iface,
+            'up': self.up,
+            'last_seen': self.last_seen,
+            'samples': [{'t': t, 'rtt': rtt} for t, rtt in self.samples],
+            'transitions': [{'t': t, 'up': up} for t, up in self.transitions]
+        }
+
+
+class PresenceMonitor:
+    """
+    Probes known hosts with unicast ARP requests. Every host starts at a
+    fixed offset within the interval, so the probes are spread evenly over
+    it instead of going out in one burst, and is then probed whenever its
+    deadline has passed: a tick that runs late catches up instead of
+    skipping hosts. The interfaces are probed in parallel.
+    """
+
+    def __init__(self, interfaces, interval=30, history=120, timeout=0.8, max_hosts=4096):
+        self.interfaces = interfaces
+        self.interval = interval
+        self.history = history
+        self.timeout = timeout
+        self.max_hosts = max_hosts
+        self.hosts = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix='presence')
+
+    def configure(self, interval, history, timeout, max_hosts):
+        """
+        Apply new settings, keeping the collected history: ring buffers are
+        resized and followed hosts only evicted down to the new maximum
+        """
+        with self._lock:
+            self.interval = interval
+            self.timeout = timeout
+            self.max_hosts = max_hosts
+            latest = time.monotonic() + interval
+            for entry in self.hosts.values():
+                entry.due = min(entry.due, latest) # A shorter interval applies from now on
+            if history != self.history:
+                self.history = history
+                for entry in self.hosts.values():
+                    entry.samples = deque(entry.samples, maxlen=history)
+                    entry.transitions = deque(entry.transitions, maxlen=history)
+            while len(self.hosts) > max_hosts:
+                self._evict()
+
+    def track(self):
+        """
+        Start following every host found by the latest scans
+        """
+        with self._lock:
+            for ctx in self.interfaces.contexts.values():
+                for host in ctx.hosts.values():
+                    if ':' in host['ip']:
+                        continue # IPv6-only hosts cannot be probed with ARP
+                    entry = self.hosts.get(host['mac'])
+                    if entry is None:
+                        if len(self.hosts) >= self.max_hosts:
+                            self._evict()
+                        due = time.monotonic() + self._offset(host['mac'])
+                        self.hosts[host['mac']] = HostHistory(host['ip'], host['mac'], ctx.iface, self.history, due)
+                    else:
+                        entry.ip = host['ip']
+                        entry.iface = ctx.iface
+
+    def _evict(self):
+        # The host longest without a reply, counting being added as one, so new hosts do not evict each other
+        oldest = min(self.hosts.values(), key=lambda entry: max(entry.last_seen, entry.added))
+        del self.hosts[oldest.mac]
+
+    def _offset(self, mac):
+        return zlib.crc32(mac.encode()) % self.interval
+
+    def tick(self):
+        """
+        Probe the hosts whose deadline has passed, all interfaces at once
+        """
+        self.track()
+        now = time.monotonic()
+        due = dict()
+        for entry in list(self.hosts.values()):
+            if entry.due <= now:
+                # Keep the host's offset, unless the ticks fell a whole interval behind
+                entry.due += self.interval
+                if entry.due <= now:
+                    entry.due = now + self.interval
+                due.setdefault(entry.iface, list()).append(entry)
+        list(self._executor.map(lambda item: self._probe(*item), due.items()))
+
+    def _probe(self, iface, entries):
+        ctx = self.interfaces.get(iface)
+        if not ctx:
+            return
+        probes = [Ether(src=ctx.my['mac'], dst=entry.mac) /
+                  ARP(op=1, psrc=ctx.my['ip'], hwsrc=ctx.my['mac'], pdst=entry.ip)
+                  for entry in entries]
+        try:
+            ans, unans = srp(probes, iface=iface, timeout=self.timeout, verbose=0)
+        except Exception as e:
+            logger.error('Presence probe on {} failed: {}'.format(iface, str(e)))
+            return
+        now = time.time()
+        rtts = dict()
+        for s, r in ans:
+            rtts[r.hwsrc] = round((r.time - s.sent_time) * 1000, 3)
+        for entry in entries:
+            entry.record(now, rtts.get(entry.mac))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def get(self, mac):
+        entry = self.hosts.get(mac)
+        return entry.to_dict() if entry else None
+
+    def summary(self):
+        """
+        Up state and recent RTT samples of every host, keyed by MAC
+        """
+        return {mac: {'up': entry.up, 'rtt': [rtt for t, rtt in entry.samples]}
+                for mac, entry in list(self.hosts.items())}
@@ -0,0 +1,103 @@
+import os
+import time
+import socket
+import logging
+import threading
+
+logger = logging.getLogger('tuxcut-server')
+
+
+def notify(state):
+    """
+    Send a state change such as 'READY=1' to systemd. Does nothing when the
+    daemon was not started by systemd.
+    Returns True if the message was sent.
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        address = '\0' + address[1:] # Abstract socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+        return True
+    except OSError as e:
+        logger.warning('Could not notify systemd: {}'.format(str(e)))
+        return False
+
+
+def watchdog_interval():
+    """
+    Return how often to send watchdog keep-alives (half of WatchdogSec), or
+    None if systemd does not expect them from this process
+    """
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    # A one-file build runs the daemon as a child of its bootloader, which is
+    # the process systemd started
+    if not usec or (pid and int(pid) not in (os.getpid(), os.getppid())):
+        return None
+    return int(usec) / 1e6 / 2
+
+
+class Health:
+    """
+    Tracks whether the daemon is making progress: every periodic loop beats
+    its heartbeat, and every request is timed while it runs.
+    """
+
+    def __init__(self, request_timeout=60):
+        self.request_timeout = request_timeout
+        self._beats = dict() # Loop name -> (last beat, longest allowed silence)
+        self._requests = dict() # Worker thread id -> start of its request
+
+    def beat(self, name, max_age):
+        self._beats[name] = (time.monotonic(), max_age)
+
+    def request_started(self):
+        self._requests[threading.get_ident()] = time.monotonic()
+
+    def request_finished(self):
+        self._requests.pop(threading.get_ident(), None)
+
+    def problems(self):
+        """
+        Return why the daemon looks stuck, or an empty list if it is healthy
+        """
+        now = time.monotonic()
+        problems = list()
+        for name, (last, max_age) in list(self._beats.items()):
+            if now - last > max_age:
+                problems.append('{} loop stalled for {:.0f}s'.format(name, now - last))
+        stuck = [started for started in list(self._requests.values()) if now - started > self.request_timeout]
+        if stuck:
+            problems.append('{} requests running for over {}s'.format(len(stuck), self.request_timeout))
+        return problems
+
+
+class Watchdog(threading.Thread):
+    """
+    Sends systemd watchdog keep-alives, but only while the daemon is healthy,
+    so a wedged daemon is restarted
+    """
+
+    def __init__(self, health, interval):
+        super().__init__(name='watchdog', daemon=True)
+        self.health = health
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            problems = self.health.problems()
+            if problems:
+                status = '; '.join(problems)
+                logger.error('Withholding watchdog keep-alive: {}'.format(status))
+                notify('STATUS=Unhealthy: {}'.format(status))
+            else:
+                notify('WATCHDOG=1')
@@ -1,8 +1,27 @@
-from bottle import Bottle, response, request, run
+import time
+STARTED = time.monotonic() # Before the slow imports, for the startup-to-ready time
+
+from bottle import Bottle, HTTPResponse, response, request, abort
 import json
 import logging
+import signal
+import math
+import argparse
+import functools
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 from utils import *
+from interfaces import InterfaceRegistry
+from presence import PresenceMonitor
+from capture import CaptureHub
+from arpwatch import ArpWatch
+from ndp import NeighborWatch
+from ingest import IngestManager, ingest_path
+from timerwheel import TimerWheel
+from netlink import change_mac as change_link_mac
+from listeners import make_unix_server, make_tcp_server, SOCKET_PATH, SOCKET_GROUP, TCP_HOST, TCP_PORT, PEER_UID
+from sdnotify import notify, watchdog_interval, Health, Watchdog
+from settings import Settings, ConfigError, CONFIG_PATH, load as load_settings, changes as setting_changes
 
 # Setup loggincg untuk terminal
 logging.basicConfig(
@@ -14,14 +33,39 @@ logging.basicConfig(
 )
 
 app = Bottle()
-victims = list()
+config_path = CONFIG_PATH
+settings = Settings()
+victims = dict()
+cut_timers = TimerWheel() # Victim key -> end of a time-limited cut
+neighbors = NeighborWatch()
+interfaces = InterfaceRegistry(neighbors=neighbors)
+presence = PresenceMonitor(interfaces)
+capture = CaptureHub()
+arpwatch = ArpWatch(interfaces)
+arpwatch.subscribe(capture)
+neighbors.subscribe(capture)
+name_cache.subscribe(capture)
+ingests = IngestManager(interfaces, arpwatch)
 scheduler = BackgroundScheduler()
+health = Health()
+
+@app.hook('before_request')
+def track_request_start():
+    health.request_started()
 
 @app.hook('after_request')
-def enable_cors():
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Origin, Accept, Content-Type, X-Requested-With, X-CSRF-Token'
+def track_request_end():
+    health.request_finished()
+
+@app.hook('before_request')
+def refuse_browsers():
+    """
+    The API is for local tools only. Browsers mark the requests of web pages
+    with Origin or Sec-Fetch-Site; refuse those, so a page cannot drive the
+    API through the optional TCP listener
+    """
+    if request.get_header('Origin') or request.get_header('Sec-Fetch-Site', 'none') != 'none':
+        abort(403, 'Browser requests are not allowed')
 
 @app.get('/status')
 def status():
@@ -29,85 +73,536 @@ def status():
 
 @app.get('/gw')
 def get_gateway():
-    gw = get_default_gw()
-    if gw:
-        return {'status': 'success', 'gw': gw}
+    ctx = interfaces.default()
+    if ctx and ctx.gw:
+        return {'status': 'success', 'gw': ctx.gw}
     return {'status': 'error', 'msg': 'Computer is not connected'}
 
 @app.get('/my/<iface>')
 def get_my_info(iface):
-    my = get_my(iface)
+    ctx = interfaces.get(iface)
+    my = ctx.my if ctx else get_my(iface)
     if my:
         return {'status': 'success', 'my': my}
     return {'status': 'error', 'msg': 'Could not get interface information'}
 
+@app.get('/bootstrap')
+def bootstrap():
+    """
+    Everything a client needs to draw its first screen, in one call: the
+    default interface with its gateway and own addresses, every interface,
+    the hosts of the last scans and the hosts currently cut
+    """
+    ctx = interfaces.default()
+    if not ctx or not ctx.gw:
+        return {'status': 'error', 'msg': 'Computer is not connected'}
+    return {'status': 'success',
+            'iface': ctx.iface,
+            'gw': ctx.gw,
+            'my': ctx.my,
+            'interfaces': [c.info() for c in interfaces.contexts.values()],
+            'hosts': {c.iface: list(c.hosts.values()) for c in interfaces.contexts.values()},
+            'victims': victim_list()}
+
+@app.get('/interfaces')
+def list_interfaces():
+    default = interfaces.default()
+    return {'status': 'success',
+            'default': default.iface if default else None,
+            'interfaces': [ctx.info() for ctx in interfaces.contexts.values()]}
+
+def query_number(name, default, kind=float):
+    """
+    A non-negative number from the query string. A malformed one ends the
+    request with the usual JSON error, also from inside a streaming reply
+    """
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        number = None
+    if number is None or number != number or number < 0: # number != number catches NaN
+        raise HTTPResponse(json.dumps({'status': 'error', 'msg': '{} must be a non-negative number, not {!r}'.format(
+            name, value)}), headers={'Content-Type': 'application/json'})
+    return number
+
+def max_scan_age():
+    """
+    Oldest scan result a request accepts: ?max_age=N seconds, 0 for a new
+    scan, by default scan.fresh_for
+    """
+    return query_number('max_age', settings.scan.fresh_for)
+
+@app.get('/interfaces/<iface>/scan')
+def scan_interface(iface):
+    """
+    Scan the network of iface. Requests arriving while a scan of it runs,
+    or shortly after, share that scan; age is how old its result is
+    """
+    ctx = interfaces.get(iface)
+    if not ctx:
+        return {'status': 'error', 'msg': 'Unknown interface {}'.format(iface)}
+    flight = ctx.join_scan(settings.scan.prefix, max_scan_age())
+    hosts = flight.result()
+    return {'status': 'success', 'result': {'iface': iface, 'hosts': hosts, 'age': round(flight.age(), 3)}}
+
+@app.get('/interfaces/<iface>/scan/stream')
+def scan_interface_stream(iface):
+    """
+    Same scan as /interfaces/<iface>/scan, emitted as one JSON host per line;
+    the X-Scan-Age header is the age of a finished scan being replayed
+    """
+    ctx = interfaces.get(iface)
+    if not ctx:
+        return {'status': 'error', 'msg': 'Unknown interface {}'.format(iface)}
+    flight = ctx.join_scan(settings.scan.prefix, max_scan_age())
+    response.content_type = 'application/x-ndjson'
+    response.set_header('X-Scan-Age', '{:.3f}'.format(flight.age()))
+    return (json.dumps(host) + '\n' for host in flight.follow())
+
+@app.get('/interfaces/<iface>/hosts')
+def interface_hosts(iface):
+    ctx = interfaces.get(iface)
+    if not ctx:
+        return {'status': 'error', 'msg': 'Unknown interface {}'.format(iface)}
+    return {'status': 'success', 'result': {'iface': iface, 'hosts': list(ctx.hosts.values())}}
+
+@app.get('/scan')
+def scan_all():
+    """
+    Scan every interface concurrently
+    """
+    return {'status': 'success',
+            'result': {'interfaces': interfaces.scan(prefix=settings.scan.prefix, max_age=max_scan_age())}}
+
 @app.get('/scan/<ip>')
 def scan_network(ip):
-    ans, unans = arping(ip + '/24', verbose=0)
-    hosts = list()
-    for s, r in ans:
-        host = dict()
-        host['ip'] = r.psrc
-        host['mac'] = r.hwsrc
-        host['hostname'] = get_hostname(r.psrc)
-        hosts.append(host)
-    return {'status': 'success', 'result': {'hosts': hosts}}
+    ctx = interfaces.for_address(ip, settings.scan.prefix)
+    if ctx:
+        flight = ctx.join_scan(settings.scan.prefix, max_scan_age())
+        return {'status': 'success', 'result': {'hosts': flight.result(), 'age': round(flight.age(), 3)}}
+    hosts = dict()
+    for host in scan_hosts(ip, prefix=settings.scan.prefix):
+        hosts[host['mac']] = host
+    return {'status': 'success', 'result': {'hosts': list(hosts.values()), 'age': 0.0}}
+
+@app.get('/scan/<ip>/stream')
+def scan_network_stream(ip):
+    """
+    Same scan as /scan/<ip>, emitted as one JSON host per line while it runs.
+    The kernel's known neighbors come first, before any probe is sent.
+    """
+    response.content_type = 'application/x-ndjson'
+    ctx = interfaces.for_address(ip, settings.scan.prefix)
+    if ctx:
+        flight = ctx.join_scan(settings.scan.prefix, max_scan_age())
+        response.set_header('X-Scan-Age', '{:.3f}'.format(flight.age()))
+        hosts = flight.follow()
+    else:
+        hosts = scan_hosts(ip, prefix=settings.scan.prefix)
+    for host in hosts:
+        yield json.dumps(host) + '\n'
+
+def read_victim():
+    """
+    The host in the request body, or None unless it is a JSON object with
+    an "ip" and a "mac"
+    """
+    try:
+        victim = request.json
+    except HTTPResponse: # Bottle's 400 for a body that is not JSON
+        return None
+    if not isinstance(victim, dict) or not isinstance(victim.get('ip'), str) \
+            or not isinstance(victim.get('mac'), str):
+        return None
+    return victim
+
+def victim_key(victim):
+    """
+    Victims are identified by interface, IP and MAC; the interface defaults
+    to the one carrying the default route
+    """
+    ctx = interfaces.get(victim.get('iface'))
+    if not ctx:
+        return None, None
+    return (ctx.iface, victim['ip'], victim['mac']), ctx
+
+@app.get('/hosts/history')
+def hosts_history():
+    return {'status': 'success', 'hosts': presence.summary()}
+
+@app.get('/hosts/<mac>/history')
+def host_history(mac):
+    history = presence.get(mac.lower())
+    if history:
+        return {'status': 'success', 'history': history}
+    return {'status': 'error', 'msg': 'Host is not monitored'}
+
+@app.get('/arpwatch/events')
+def arpwatch_events():
+    """
+    ARP anomalies seen on the LAN, or with ?since=N only those after event N
+    """
+    since = query_number('since', 0, int)
+    return {'status': 'success', 'events': arpwatch.get_events(since)}
+
+@app.get('/arpwatch/bindings')
+def arpwatch_bindings():
+    return {'status': 'success', 'bindings': arpwatch.get_bindings()}
+
+@app.get('/arpwatch/metrics')
+def arpwatch_metrics():
+    return {'status': 'success', 'metrics': arpwatch.metrics(), 'capture': capture.stats()}
+
+@app.get('/ndp')
+def ndp_neighbors():
+    """
+    IPv6 addresses seen per MAC in neighbor discovery and echo traffic, by interface
+    """
+    return {'status': 'success',
+            'neighbors': {iface: neighbors.addresses(iface) for iface in interfaces.contexts},
+            'metrics': neighbors.metrics()}
+
+@app.get('/names')
+def hostnames():
+    """
+    Hostnames learned from mDNS, NetBIOS and DHCP traffic and cached PTR
+    answers, each with its source
+    """
+    return {'status': 'success', 'names': name_cache.entries(), 'metrics': name_cache.metrics()}
+
+@app.post('/ingest')
+def ingest_start():
+    """
+    Read the hosts and ARP bindings of a pcap or pcapng file on this machine
+    in the background: {"path": ..., "iface": ..., "network": "10.0.0.0/24"}.
+    Clients other than root may only name files below ingest.directory.
+    Poll /ingest/<id> for its progress.
+    """
+    body = request.json
+    if not isinstance(body, dict) or not isinstance(body.get('path'), str) or not body['path']:
+        return {'status': 'error', 'msg': 'path is required'}
+    path = ingest_path(body['path'], request.environ.get(PEER_UID), settings.ingest.directory)
+    if path is None:
+        return {'status': 'error', 'msg': 'Only root may ingest files outside ingest.directory'}
+    ctx = interfaces.get(body.get('iface'))
+    iface = body.get('iface') or (ctx.iface if ctx else 'pcap')
+    try:
+        job = ingests.start(path, iface, body.get('network'), settings.scan.prefix)
+    except ValueError as e:
+        return {'status': 'error', 'msg': str(e)}
+    logger.info('Ingesting {} into {}'.format(path, iface))
+    return {'status': 'success', 'job': job.status()}
+
+@app.get('/ingest')
+def ingest_list():
+    return {'status': 'success', 'jobs': [job.status() for job in list(ingests.jobs.values())]}
+
+@app.get('/ingest/<job_id:int>')
+def ingest_status(job_id):
+    """
+    Progress of an ingest job; with ?hosts=1 also the hosts found so far,
+    with ?arp=1 the ARP events and bindings of the capture
+    """
+    job = ingests.get(job_id)
+    if not job:
+        return {'status': 'error', 'msg': 'No ingest job {}'.format(job_id)}
+    result = {'status': 'success', 'job': job.status()}
+    if request.query.get('hosts'):
+        result['hosts'] = job.hosts()
+    if request.query.get('arp') and job.arpwatch:
+        result['events'] = job.arpwatch.get_events()
+        result['bindings'] = job.arpwatch.get_bindings()
+    return result
+
+@app.post('/ingest/<job_id:int>/cancel')
+def ingest_cancel(job_id):
+    job = ingests.get(job_id)
+    if not job:
+        return {'status': 'error', 'msg': 'No ingest job {}'.format(job_id)}
+    job.cancel()
+    return {'status': 'success'}
+
+@app.get('/config')
+def get_config():
+    return {'status': 'success', 'path': config_path, 'config': settings.to_dict()}
+
+@app.post('/config/reload')
+def config_reload():
+    """
+    Re-read the configuration file, as on SIGHUP
+    """
+    try:
+        live, restart = reload_settings()
+    except ConfigError as e:
+        return {'status': 'error', 'msg': str(e)}
+    return {'status': 'success', 'changed': live, 'restart_required': restart}
+
+def victim_list():
+    """
+    The cut hosts; those cut for a limited time carry the seconds remaining
+    """
+    result = list()
+    for key, victim in list(victims.items()):
+        remaining = cut_timers.remaining(key)
+        result.append(dict(victim, remaining=round(remaining, 1) if remaining is not None else None))
+    return result
+
+def cut_duration(victim):
+    """
+    The optional duration of a cut, in seconds; None for until resumed
+    """
+    duration = victim.get('duration')
+    if duration is None:
+        return None
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) \
+            or not math.isfinite(duration) or duration <= 0:
+        raise ValueError('duration must be a positive number of seconds')
+    return float(duration)
+
+def set_cut_timer(key, duration):
+    """
+    Time-limit the cut of key, or make it last until resumed if duration
+    is None. Returns the seconds remaining.
+    """
+    if duration is None:
+        cut_timers.cancel(key)
+        victims[key].update(duration=None)
+        victims[key].pop('expires', None)
+        return None
+    cut_timers.schedule(key, duration)
+    victims[key].update(duration=duration, expires=time.time() + duration)
+    return duration
+
+def restore_victim(key):
+    """
+    Stop cutting the host of key and put the real addresses back in its
+    and the gateway's ARP caches. Raises ValueError, with the host still
+    cut, if the restoring frames cannot be built.
+    """
+    victim = victims.get(key)
+    if victim is None:
+        return False
+    ctx = interfaces.get(key[0])
+    if ctx:
+        ctx.unspoof(victim, settings.spoof.unspoof_count)
+    victims.pop(key, None)
+    cut_timers.cancel(key)
+    if not victims:
+        disable_ip_forward()
+    return True
+
+@app.get('/victims')
+def list_victims():
+    return {'status': 'success', 'victims': victim_list()}
 
 @app.post('/cut')
 def cut_victim():
-    victim = request.json
-    if victim not in victims:
-        victims.append(victim)
-        enable_ip_forward()
-        arp_spoof(victim)
-        return {'status': 'success'}
-    return {'status': 'error', 'msg': 'Host already cut'}
+    """
+    Cut a host: {"ip", "mac", "iface"}. With "duration": N it is resumed by
+    itself after N seconds; for a host already cut, this sets a new limit,
+    and "duration": null lifts it.
+    """
+    victim = read_victim()
+    if victim is None:
+        return {'status': 'error', 'msg': 'A host with an "ip" and a "mac" is required'}
+    key, ctx = victim_key(victim)
+    if not ctx:
+        return {'status': 'error', 'msg': 'Unknown interface'}
+    if ':' in victim['ip']:
+        return {'status': 'error', 'msg': 'Only hosts with an IPv4 address can be cut'}
+    try:
+        duration = cut_duration(victim)
+    except ValueError as e:
+        return {'status': 'error', 'msg': str(e)}
+    if key in victims:
+        if 'duration' not in victim:
+            return {'status': 'error', 'msg': 'Host already cut'}
+        return {'status': 'success', 'remaining': set_cut_timer(key, duration)}
+    try:
+        ctx.spoof(victim, settings.spoof.count)
+    except ValueError as e:
+        return {'status': 'error', 'msg': str(e)}
+    victims[key] = dict(victim, iface=ctx.iface)
+    enable_ip_forward()
+    return {'status': 'success', 'remaining': set_cut_timer(key, duration)}
 
 @app.post('/resume')
 def resume_victim():
-    victim = request.json
-    if victim in victims:
-        victims.remove(victim)
-        arp_unspoof(victim)
-        if not victims:
-            disable_ip_forward()
-        return {'status': 'success'}
+    victim = read_victim()
+    if victim is None:
+        return {'status': 'error', 'msg': 'A host with an "ip" and a "mac" is required'}
+    key, ctx = victim_key(victim)
+    try:
+        if restore_victim(key):
+            return {'status': 'success'}
+    except ValueError as e:
+        return {'status': 'error', 'msg': str(e)}
     return {'status': 'error', 'msg': 'Host is not cut'}
 
 @app.get('/change-mac/<iface>')
 def change_mac(iface):
+    """
+    Give iface a random MAC. The change is verified and rolled back on
+    failure; the reply tells whether the link had to go down and for how long
+    """
     try:
-        new_mac = generate_mac()
-        sp.Popen(['ip', 'link', 'set', 'dev', iface, 'down'])
-        sp.Popen(['ip', 'link', 'set', 'dev', iface, 'address', new_mac])
-        sp.Popen(['ip', 'link', 'set', 'dev', iface, 'up'])
-        return {'status': 'success', 'result': {'status': 'success', 'mac': new_mac}}
-    except Exception as e:
-        logger.error(sys.exc_info()[1], exc_info=True)
-        return {'status': 'error', 'result': {'status': 'failed'}}
+        result = change_link_mac(iface, generate_mac())
+    except OSError as e:
+        logger.error('Changing the MAC of {} failed: {}'.format(iface, str(e)))
+        return {'status': 'error', 'msg': str(e), 'result': {'status': 'failed'}}
+    ctx = interfaces.get(iface)
+    if ctx:
+        # Frames built with the old MAC are dropped with it
+        ctx.update(dict(ctx.my, mac=result['mac']), ctx.gw.get('ip'))
+        arpwatch.sync()
+    return {'status': 'success', 'result': dict(result, status='success')}
 
 def spoof_victims():
-    for victim in victims:
-        arp_spoof(victim)
+    """
+    One spoofing round, which first resumes the hosts whose cut ran out
+    """
+    for key in cut_timers.advance():
+        try:
+            if restore_victim(key):
+                logger.info('Cut of {} on {} expired, host resumed'.format(key[1], key[0]))
+        except ValueError as e:
+            # The wheel already dropped the timer; fire again next round rather than stay cut for good
+            cut_timers.schedule(key, settings.spoof.interval)
+            logger.warning('Cannot resume {} on {}, retrying: {}'.format(key[1], key[0], str(e)))
+    for (iface, ip, mac), victim in list(victims.items()):
+        ctx = interfaces.get(iface)
+        if not ctx:
+            continue
+        try:
+            ctx.spoof(victim, settings.spoof.count)
+        except ValueError as e:
+            # The gateway may be gone since the last refresh; the other victims still get their round
+            logger.warning('Cannot spoof {} on {}: {}'.format(ip, iface, str(e)))
 
-def start_server():
+def refresh_interfaces():
+    """
+    Re-resolve the interfaces and point the passive capture at them
+    """
+    interfaces.refresh()
+    arpwatch.sync()
+    capture.sync(list(interfaces.contexts))
+
+def heartbeat(name, job, max_age):
+    """
+    Wrap a periodic job so that each run beats its heartbeat; the watchdog
+    holds back once the job has not finished a run for max_age() seconds
+    """
+    @functools.wraps(job) # Keeps the job's name in the scheduler log
+    def run():
+        try:
+            job()
+        finally:
+            health.beat(name, max_age())
+    health.beat(name, max_age())
+    return run
+
+def apply_settings(new):
+    """
+    Make new the current settings without dropping any state: victims,
+    hosts and presence history are kept, and jobs are only rescheduled if
+    their interval changed. Returns the changed settings, split into those
+    applied now and those needing a restart.
+    """
+    global settings
+    old, settings = settings, new
+    interfaces.gateway_timeout = new.scan.gateway_timeout
+    neighbors.configure(new.scan.ipv6, new.scan.ipv6_wait)
+    name_cache.configure(new.names.max_entries, new.names.ptr, new.names.ptr_ttl, new.names.negative_ttl)
+    presence.configure(new.presence.interval, new.presence.history, new.presence.timeout, new.presence.max_hosts)
+    arpwatch.configure(new.arpwatch.max_ips, new.arpwatch.history, new.arpwatch.events,
+                       new.arpwatch.conflict_window, new.arpwatch.flood_threshold)
+    health.request_timeout = new.api.request_timeout
+    for job, seconds, previous in (('arp_spoof', new.spoof.interval, old.spoof.interval),
+                                   ('refresh_interfaces', new.scan.refresh_interval, old.scan.refresh_interval)):
+        if seconds != previous and scheduler.get_job(job):
+            scheduler.reschedule_job(job, trigger='interval', seconds=seconds)
+    return setting_changes(old, new)
+
+def reload_settings():
+    """
+    Re-read the configuration file. If it is invalid, ConfigError is raised
+    and the current settings stay in effect.
+    """
+    live, restart = apply_settings(load_settings(config_path))
+    logger.info('Configuration reloaded, changed: {}'.format(', '.join(live + restart) or 'nothing'))
+    if restart:
+        logger.warning('Restart the server to apply {}'.format(', '.join(restart)))
+    return live, restart
+
+def on_sighup(signum, frame):
+    def reload():
+        try:
+            reload_settings()
+        except ConfigError as e:
+            logger.error('Configuration not reloaded: {}'.format(str(e)))
+    # Off the signal handler, which may have interrupted a thread holding a lock
+    threading.Thread(target=reload, name='reload', daemon=True).start()
+
+def start_server(socket_path=SOCKET_PATH, group=SOCKET_GROUP, tcp=None):
+    """
+    Serve the API on the Unix socket at socket_path and, if tcp is given as
+    (host, port), on TCP as well. Under systemd, readiness is reported once
+    the interfaces are resolved and the listeners are bound.
+    """
+    servers = []
+    watchdog = None
     try:
-        scheduler.add_job(spoof_victims, 'interval', seconds=1, id='arp_spoof')
+        refresh_interfaces()
+        scheduler.add_job(heartbeat('spoof', spoof_victims, lambda: max(10, 10 * settings.spoof.interval)),
+                          'interval', seconds=settings.spoof.interval, id='arp_spoof')
+        scheduler.add_job(heartbeat('refresh', refresh_interfaces, lambda: 4 * settings.scan.refresh_interval),
+                          'interval', seconds=settings.scan.refresh_interval, id='refresh_interfaces')
+        scheduler.add_job(heartbeat('presence', presence.tick, lambda: 30), 'interval', seconds=1, id='presence',
+                          max_instances=1, coalesce=True)
         scheduler.start()
+        servers.append(make_unix_server(app, socket_path, group))
+        if tcp:
+            servers.append(make_tcp_server(app, *tcp))
         print("\n" + "="*50)
         print("TuxCut Qt Server v7.0")
         print("="*50)
         print("\nServer starting...")
-        print("Listening on http://127.0.0.1:8013")
+        print("Listening on unix:{}".format(socket_path))
+        if tcp:
+            print("Listening on http://{}:{}".format(*tcp))
         print("\nLog output:")
         print("-"*50)
-        run(app, host='127.0.0.1', port=8013, quiet=False)
+        for server in servers[1:]:
+            threading.Thread(target=server.serve_forever, name='tcp-listener', daemon=True).start()
+        ready_ms = (time.monotonic() - STARTED) * 1000
+        logger.info('Ready in {:.0f} ms, {} interfaces'.format(ready_ms, len(interfaces.contexts)))
+        notify('READY=1\nSTATUS=Serving {} interfaces, ready in {:.0f} ms'.format(len(interfaces.contexts), ready_ms))
+        interval = watchdog_interval()
+        if interval:
+            watchdog = Watchdog(health, interval)
+            watchdog.start()
+        servers[0].serve_forever()
     except KeyboardInterrupt:
         print("\nServer shutting down...")
-        scheduler.shutdown()
     except Exception as e:
         print(f"\nError: {str(e)}")
-        scheduler.shutdown()
+        sys.exit(1) # A failure, so that systemd restarts the daemon
+    finally:
+        notify('STOPPING=1')
+        if watchdog:
+            watchdog.stop()
+        for server in servers:
+            server.server_close()
+        if scheduler.running:
+            scheduler.shutdown()
+        capture.shutdown()
+        ingests.cancel_all()
+        interfaces.shutdown()
+        neighbors.shutdown()
+        presence.shutdown()
 
 @app.post('/protect')
 def protect_computer():
@@ -123,7 +618,7 @@ def protect_computer():
         to_gw.pdst = gw['ip']
         to_gw.hwdst = gw['mac']
         
-        send(to_gw, count=5, verbose=0)
+        send(to_gw, count=settings.protect.count, verbose=0)
         logger.info('Protection enabled')
         return {'status': 'success'}
     except Exception as e:
@@ -142,17 +637,53 @@ def unprotect_computer():
 
 @app.get('/log')
 def get_log():
+    """
+    Return the last lines of the log, or with ?offset=N everything written
+    after byte N. The returned offset is where the next poll should start.
+    """
     try:
         log_file = '/var/log/tuxcut/tuxcut.log'
         if os.path.exists(log_file):
-            with open(log_file, 'r') as f:
-                # Get last 50 lines
-                lines = f.readlines()[-50:]
-                return {'status': 'success', 'log': ''.join(lines)}
+            with open(log_file, 'rb') as f:
+                offset = request.query.get('offset')
+                if offset is not None:
+                    offset = int(offset)
+                    f.seek(0, os.SEEK_END)
+                    if offset > f.tell():
+                        offset = 0  # the log was truncated, start over
+                    f.seek(offset)
+                    data = f.read()
+                    return {'status': 'success', 'log': data.decode(errors='replace'), 'offset': f.tell()}
+                lines = f.readlines()[-settings.api.log_tail:]
+                return {'status': 'success', 'log': b''.join(lines).decode(errors='replace'), 'offset': f.tell()}
         return {'status': 'error', 'log': 'Log file not found'}
     except Exception as e:
         logger.error(f"Error reading log: {str(e)}")
         return {'status': 'error', 'log': str(e)}
 
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or settings.api.host, int(port)
+
 if __name__ == '__main__':
-    start_server() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='TuxCut server')
+    parser.add_argument('--config', default=CONFIG_PATH, help='configuration file (default %(default)s)')
+    parser.add_argument('--socket', help='Unix socket to serve the API on (default: api.socket, {})'.format(SOCKET_PATH))
+    parser.add_argument('--group', help='group allowed to use the socket (default: api.group, {})'.format(SOCKET_GROUP))
+    parser.add_argument('--tcp', nargs='?', const='', metavar='[HOST:]PORT',
+                        help='also serve the API on TCP (default address: api.host and api.port, {}:{})'.format(
+                            TCP_HOST, TCP_PORT))
+    args = parser.parse_args()
+    config_path = args.config
+    try:
+        apply_settings(load_settings(config_path))
+    except ConfigError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    tcp = None
+    if args.tcp is not None or settings.api.tcp:
+        tcp = parse_address(args.tcp) if args.tcp else (settings.api.host, settings.api.port)
+    # Stop on SIGTERM like on Ctrl+C, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGHUP, on_sighup)
+    start_server(args.socket or settings.api.socket, args.group or settings.api.group, tcp)
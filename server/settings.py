@@ -0,0 +1,178 @@
+import os
+import logging
+from dataclasses import dataclass, field, fields, asdict
+from listeners import SOCKET_PATH, SOCKET_GROUP, TCP_HOST, TCP_PORT
+
+try:
+    import tomllib # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+logger = logging.getLogger('tuxcut-server')
+
+CONFIG_PATH = '/etc/tuxcut/tuxcut.toml'
+
+
+class ConfigError(ValueError):
+    """
+    Raised when the configuration file cannot be read or has invalid values.
+    """
+
+
+def knob(default, low=None, high=None, restart=False):
+    """
+    A setting with its default, its allowed range and whether changing it
+    only takes effect after a restart
+    """
+    return field(default=default, metadata={'low': low, 'high': high, 'restart': restart})
+
+
+@dataclass(frozen=True)
+class SpoofSettings:
+    interval: float = knob(1.0, 0.1, 60) # Seconds between spoofing rounds
+    count: int = knob(5, 1, 100) # Frames sent to each cut host per round
+    unspoof_count: int = knob(10, 1, 100) # Frames sent to restore a resumed host
+
+
+@dataclass(frozen=True)
+class ProtectSettings:
+    count: int = knob(5, 1, 100) # Frames that restore the gateway's real MAC when protection is enabled
+
+
+@dataclass(frozen=True)
+class ScanSettings:
+    prefix: int = knob(24, 16, 30) # Size of the swept network around our address
+    gateway_timeout: float = knob(2.0, 0.1, 30) # Seconds to wait for the gateway's ARP reply
+    refresh_interval: float = knob(30.0, 5, 3600) # Seconds between interface and gateway refreshes
+    fresh_for: float = knob(5.0, 0, 300) # Seconds a finished scan still answers new scan requests
+    ipv6: bool = knob(True) # Also find IPv6 neighbors, merged into the hosts by MAC
+    ipv6_wait: float = knob(1.0, 0.1, 10) # Seconds a scan listens for replies to its all-nodes ping
+
+
+@dataclass(frozen=True)
+class PresenceSettings:
+    interval: int = knob(30, 1, 3600) # Seconds in which every host is probed once
+    history: int = knob(120, 1, 10000) # Samples kept per host
+    timeout: float = knob(0.8, 0.05, 10) # Seconds to wait for probe replies
+    max_hosts: int = knob(4096, 1, 1000000) # Hosts followed at most
+
+
+@dataclass(frozen=True)
+class ArpWatchSettings:
+    max_ips: int = knob(4096, 1, 1000000) # IP to MAC bindings followed at most
+    history: int = knob(8, 1, 1000) # Changes kept per binding
+    events: int = knob(1000, 1, 1000000) # Events kept
+    conflict_window: float = knob(10.0, 0.1, 3600) # Seconds within which two MACs on one IP conflict
+    flood_threshold: int = knob(20, 2, 100000) # Gratuitous ARPs per second from one MAC counted as a flood
+
+
+@dataclass(frozen=True)
+class NamesSettings:
+    ptr: bool = knob(True) # Ask DNS for the PTR record of hosts that did not announce a name
+    ptr_ttl: float = knob(3600.0, 0, 604800) # Seconds a PTR answer is reused
+    negative_ttl: float = knob(300.0, 0, 86400) # Seconds before a host without a PTR record is asked again
+    max_entries: int = knob(4096, 1, 1000000) # Names kept at most
+
+
+@dataclass(frozen=True)
+class IngestSettings:
+    directory: str = knob('') # Captures other clients than root may ingest live below it; empty for root only
+
+
+@dataclass(frozen=True)
+class ApiSettings:
+    socket: str = knob(SOCKET_PATH, restart=True)
+    group: str = knob(SOCKET_GROUP, restart=True) # Group allowed to use the socket
+    tcp: bool = knob(False, restart=True) # Also listen on TCP
+    host: str = knob(TCP_HOST, restart=True)
+    port: int = knob(TCP_PORT, 1, 65535, restart=True)
+    log_tail: int = knob(50, 1, 100000) # Lines returned by /log
+    request_timeout: float = knob(60.0, 1, 3600) # Seconds after which a running request counts as stuck
+
+
+@dataclass(frozen=True)
+class Settings:
+    spoof: SpoofSettings = field(default_factory=SpoofSettings)
+    protect: ProtectSettings = field(default_factory=ProtectSettings)
+    scan: ScanSettings = field(default_factory=ScanSettings)
+    presence: PresenceSettings = field(default_factory=PresenceSettings)
+    arpwatch: ArpWatchSettings = field(default_factory=ArpWatchSettings)
+    names: NamesSettings = field(default_factory=NamesSettings)
+    ingest: IngestSettings = field(default_factory=IngestSettings)
+    api: ApiSettings = field(default_factory=ApiSettings)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _check(section, item, value):
+    """
+    Validate one value against the type and range of its field
+    """
+    name = '{}.{}'.format(section, item.name)
+    kind = item.type
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if type(value) is not kind:
+        raise ConfigError('{} must be {}, not {!r}'.format(name, kind.__name__, value))
+    low, high = item.metadata['low'], item.metadata['high']
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ConfigError('{} must be between {} and {}, not {!r}'.format(name, low, high, value))
+    return value
+
+
+def parse(data):
+    """
+    Build Settings from the parsed TOML document, rejecting unknown sections
+    and keys, wrong types and values out of range
+    """
+    sections = dict()
+    known = {item.name: item for item in fields(Settings)}
+    for section, values in data.items():
+        if section not in known:
+            raise ConfigError('Unknown section [{}]'.format(section))
+        if not isinstance(values, dict):
+            raise ConfigError('[{}] must be a table'.format(section))
+        cls = known[section].default_factory
+        items = {item.name: item for item in fields(cls)}
+        for key in values:
+            if key not in items:
+                raise ConfigError('Unknown setting {}.{}'.format(section, key))
+        sections[section] = cls(**{key: _check(section, items[key], value) for key, value in values.items()})
+    return Settings(**sections)
+
+
+def load(path=CONFIG_PATH):
+    """
+    Load and validate the configuration file. A missing file gives the
+    defaults; an invalid one raises ConfigError.
+    """
+    if not os.path.exists(path):
+        return Settings()
+    if tomllib is None:
+        logger.warning('Cannot read {} without tomllib (Python 3.11) or tomli, using defaults'.format(path))
+        return Settings()
+    try:
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError('Cannot read {}: {}'.format(path, str(e)))
+    return parse(data)
+
+
+def changes(old, new):
+    """
+    Return the names of the settings that differ between old and new, split
+    into those applied at once and those needing a restart
+    """
+    live, restart = list(), list()
+    for section in fields(Settings):
+        old_section, new_section = getattr(old, section.name), getattr(new, section.name)
+        for item in fields(old_section):
+            if getattr(old_section, item.name) != getattr(new_section, item.name):
+                name = '{}.{}'.format(section.name, item.name)
+                (restart if item.metadata['restart'] else live).append(name)
+    return live, restart
@@ -0,0 +1,85 @@
+import math
+import time
+import threading
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel. A timer due at tick T sits in slot T % slots,
+    so scheduling and cancelling are O(1) whatever the number of timers,
+    and advancing only visits the slots of the ticks that went by. Timers
+    more than one turn of the wheel away share their slot with nearer ones
+    and are passed over until their turn comes.
+    Ticks are integers, so a timer fires on the first advance at or after
+    the end of its tick, never a turn late.
+    """
+
+    def __init__(self, resolution=0.1, slots=4096, clock=time.monotonic):
+        self.resolution = resolution # Seconds per tick
+        self.clock = clock
+        self._slots = [dict() for _ in range(slots)] # Key -> due tick
+        self._timers = dict() # Key -> (due tick, deadline)
+        self._tick = math.floor(clock() / resolution) # Last tick advanced over
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, delay):
+        """
+        Fire key in delay seconds, replacing any timer it had.
+        Returns the deadline on the wheel's clock.
+        """
+        deadline = self.clock() + delay
+        with self._lock:
+            self._remove(key)
+            due = max(math.ceil(deadline / self.resolution), self._tick + 1)
+            self._slots[due % len(self._slots)][key] = due
+            self._timers[key] = (due, deadline)
+        return deadline
+
+    def cancel(self, key):
+        """
+        Drop the timer of key; returns whether it had one
+        """
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        del self._slots[timer[0] % len(self._slots)][key]
+        return True
+
+    def remaining(self, key):
+        """
+        Seconds until key fires, or None if it has no timer
+        """
+        timer = self._timers.get(key)
+        if timer is None:
+            return None
+        return max(0.0, timer[1] - self.clock())
+
+    def advance(self):
+        """
+        Move the wheel to now and return the keys whose timers fired,
+        earliest first
+        """
+        target = math.floor(self.clock() / self.resolution)
+        fired = list()
+        with self._lock:
+            if target <= self._tick:
+                return fired
+            # After a stall of a whole turn or more, every slot is visited once
+            for tick in range(self._tick + 1, min(target, self._tick + len(self._slots)) + 1):
+                slot = self._slots[tick % len(self._slots)]
+                for key in [key for key, due in slot.items() if due <= target]:
+                    del slot[key]
+                    fired.append((self._timers.pop(key)[1], key))
+            self._tick = target
+        fired.sort(key=lambda timer: timer[0])
+        return [key for deadline, key in fired]
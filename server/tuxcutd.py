@@ -16,6 +16,7 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from utils import logger
 from utils import get_default_gw, get_my, get_hostname, generate_mac
+from netlink import change_mac as change_link_mac
 from utils import enable_ip_forward, disable_ip_forward, arp_spoof, arp_unspoof
 
 setproctitle('tuxcut-server')
@@ -199,14 +200,11 @@ def scan(iface):
     logger.info('Changing MAC Address for interface {}'.format(iface))
     new_MAC = generate_mac()
     try:
-        # sp.Popen(['ifconfig', iface, 'down'], stdout=sp.PIPE)
-        sp.Popen(['ifconfig', iface, 'down', 'hw', 'ether', new_MAC], stdout=sp.PIPE)
-        sp.Popen(['ifconfig', iface, 'up'], stdout=sp.PIPE)
+        result = change_link_mac(iface, new_MAC)
         logger.info('MAC Address for interface {} Changed to {}'.format(iface, new_MAC))
+        result['status'] = 'success'
         return json.dumps({
-            'result': {
-                'status': 'success'
-            }
+            'result': result
         })
     except Exception as e:
         logger.error(sys.exc_info()[1], exc_info=True)
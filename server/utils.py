@@ -5,10 +5,12 @@ import logging
 import socket
 import struct
 import random
+import ipaddress
 from scapy.all import *
 import psutil
 import dns.resolver
 import dns.reversename
+from names import NameCache
 
 
 LOG_DIR = '/var/log/tuxcut'
@@ -26,8 +28,15 @@ handler.setFormatter(formatter)
 
 logger.addHandler(handler)
 
+# /proc/net/arp flag for a completed entry (REACHABLE, STALE, DELAY or PROBE)
+ATF_COM = 0x02
 
-def get_hostname(ip):
+
+# Names learned from the LAN and PTR answers, shared by every lookup
+name_cache = NameCache()
+
+
+def resolve_ptr(ip):
     """
     Use dnspython to get the hostname for an IP address.
     """
@@ -42,54 +51,188 @@ def get_hostname(ip):
         return ''
 
 
-def get_default_gw():
+def get_hostname(ip, mac=None):
     """
-    Get the default gw ip address with the iface
+    Get the hostname of ip: the name the host announced itself, if it was
+    heard, else its PTR record. PTR answers are cached, missing ones too.
     """
-    gw = dict()
+    name = name_cache.lookup(ip, mac)
+    if name is not None:
+        return name
+    if not name_cache.ptr:
+        return ''
+    name = resolve_ptr(ip)
+    name_cache.store_ptr(ip, name)
+    return name
+
+
+def get_neighbors(iface=None):
+    """
+    Read the resolved IPv4 neighbors the kernel already knows from /proc/net/arp.
+    This costs no packets on the wire, so it is used as the first pass of a scan.
+    """
+    neighbors = list()
+    try:
+        with open('/proc/net/arp') as f:
+            next(f)  # skip the header line
+            for line in f:
+                fields = line.split()
+                if len(fields) < 6:
+                    continue
+                ip, _, flags, mac, _, dev = fields[:6]
+                if not int(flags, 16) & ATF_COM or mac == '00:00:00:00:00:00':
+                    continue
+                if iface and dev != iface:
+                    continue
+                neighbors.append({'ip': ip, 'mac': mac, 'iface': dev})
+    except Exception as e:
+        logger.error(f"Error reading kernel neighbor table: {str(e)}")
+    return neighbors
+
+
+def get_neighbor_mac(ip, iface=None):
+    """
+    Return the MAC address the kernel has resolved for ip, or '' if it has none
+    """
+    for neighbor in get_neighbors(iface):
+        if neighbor['ip'] == ip:
+            return neighbor['mac']
+    return ''
+
+
+ARP_HEADER = struct.Struct('!HHBBH6s4s6s4s') # htype, ptype, hlen, plen, op, sha, spa, tha, tpa
+
+
+def new_host(ip, mac, source, hostname=''):
+    """
+    A host as reported by scans and capture ingestion
+    """
+    return {'ip': ip, 'mac': mac, 'hostname': hostname, 'source': source}
+
+
+def scan_hosts(ip, iface=None, prefix=24):
+    """
+    Scan the network of the given prefix length around ip and yield host dicts as they are discovered.
+    The kernel neighbor table is emitted first without any probing, then an
+    active ARP sweep fills in the rest. Each host carries a 'source' of
+    'kernel', 'arp' or 'kernel+arp'. A host may be yielded a second time
+    once it is confirmed by the sweep and its hostname is resolved.
+    """
+    network = ipaddress.ip_network('{}/{}'.format(ip, prefix), strict=False)
+    known = dict()
+    for neighbor in get_neighbors(iface):
+        if ipaddress.ip_address(neighbor['ip']) not in network:
+            continue
+        host = new_host(neighbor['ip'], neighbor['mac'], 'kernel')
+        known[host['mac']] = host
+        yield dict(host)
+
+    kwargs = {'iface': iface} if iface else {}
+    ans, unans = arping(str(network), verbose=0, **kwargs)
+    for s, r in ans:
+        host = known.get(r.hwsrc)
+        if host and host['ip'] == r.psrc:
+            host['source'] = 'kernel+arp'
+        else:
+            host = new_host(r.psrc, r.hwsrc, 'arp')
+            known[host['mac']] = host
+        host['hostname'] = get_hostname(host['ip'], host['mac'])
+        yield dict(host)
+
+    for host in known.values():
+        if host['source'] == 'kernel':
+            host['hostname'] = get_hostname(host['ip'], host['mac'])
+            yield dict(host)
+
+
+def get_default_routes():
+    """
+    Return every default route in /proc/net/route as (iface, gw_ip, metric),
+    lowest metric first
+    """
+    routes = list()
     try:
-        gws = psutil.net_if_addrs()
-        for iface, addrs in gws.items():
-            for addr in addrs:
-                if addr.family == psutil.AF_LINK:
-                    # This is a MAC address, but we need the gateway IP first
-                    pass
-
-        # Using psutil's net_if_gateways is not straightforward.
-        # Let's stick to a method that is more reliable for finding the default gateway.
         with open("/proc/net/route") as f:
+            next(f)  # skip the header line
             for line in f:
                 fields = line.strip().split()
-                if fields[1] == '00000000':
-                    gw_ip = socket.inet_ntoa(struct.pack("<L", int(fields[2], 16)))
-                    iface = fields[0]
-                    
-                    # Get MAC of gateway
-                    gw_mac = ''
-                    results, unanswered = sr(ARP(op=1, psrc=get_if_addr(iface), pdst=gw_ip),
-                                           timeout=2, verbose=0)
-                    if results:
-                        for s, r in results:
-                            if r.psrc == gw_ip:
-                                gw_mac = r.hwsrc
-                                break
-
-                    gw['ip'] = gw_ip
-                    gw['mac'] = gw_mac
-                    gw['hostname'] = get_hostname(gw_ip)
-                    gw['iface'] = iface
-                    
-                    if not gw_mac:
-                        logger.info('Could not get gateway MAC address')
-                    else:
-                        logger.info('Gateway information retrieved successfully')
-                    return gw
+                if len(fields) < 7 or fields[1] != '00000000':
+                    continue
+                gw_ip = socket.inet_ntoa(struct.pack("<L", int(fields[2], 16)))
+                routes.append((fields[0], gw_ip, int(fields[6])))
     except Exception as e:
-        logger.error(f"Error in get_default_gw: {str(e)}")
-    
+        logger.error(f"Error reading routing table: {str(e)}")
+    return sorted(routes, key=lambda route: route[2])
+
+
+def get_interfaces():
+    """
+    Return {iface: {'ip', 'netmask', 'mac'}} for every interface that is up
+    and has an IPv4 address, loopback excluded
+    """
+    interfaces = dict()
+    stats = psutil.net_if_stats()
+    for iface, addrs in psutil.net_if_addrs().items():
+        if iface not in stats or not stats[iface].isup:
+            continue
+        info = dict()
+        for addr in addrs:
+            if addr.family == socket.AF_INET and 'ip' not in info:
+                info['ip'] = addr.address
+                info['netmask'] = addr.netmask
+            if addr.family == psutil.AF_LINK:
+                info['mac'] = addr.address
+        if 'ip' not in info or not info.get('mac'):
+            continue
+        if ipaddress.ip_address(info['ip']).is_loopback:
+            continue
+        interfaces[iface] = info
+    return interfaces
+
+
+def resolve_mac(ip, iface, timeout=2):
+    """
+    Find the MAC address of ip on iface, asking the kernel before probing
+    """
+    mac = get_neighbor_mac(ip, iface)
+    if mac:
+        return mac
+    results, unanswered = sr(ARP(op=1, psrc=get_if_addr(iface), pdst=ip),
+                             iface=iface, timeout=timeout, verbose=0)
+    for s, r in results:
+        if r.psrc == ip:
+            return r.hwsrc
+    return ''
+
+
+def get_gw(iface, gw_ip, timeout=2):
+    """
+    Build the gateway dict for gw_ip reached through iface
+    """
+    gw = dict()
+    gw['ip'] = gw_ip
+    gw['mac'] = resolve_mac(gw_ip, iface, timeout)
+    gw['hostname'] = get_hostname(gw_ip)
+    gw['iface'] = iface
+    if not gw['mac']:
+        logger.info('Could not get gateway MAC address')
+    else:
+        logger.info('Gateway information retrieved successfully')
     return gw
 
 
+def get_default_gw():
+    """
+    Get the default gw ip address with the iface
+    """
+    try:
+        for iface, gw_ip, metric in get_default_routes():
+            return get_gw(iface, gw_ip)
+    except Exception as e:
+        logger.error(f"Error in get_default_gw: {str(e)}")
+    return dict()
+
+
 def get_my(iface):
     """
     find the IP and MAC  addressess for the given interface
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The client and the server are flat directories of modules, imported by name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('server', 'client'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qt_app():
+    """
+    The Qt application the client models need, created once
+    """
+    QtCore = pytest.importorskip('PySide6.QtCore')
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
@@ -0,0 +1,63 @@
+import socket
+
+from arpwatch import ArpWatch, IP_CONFLICT, FLIP_FLOP, BINDING_CHANGED
+from utils import ARP_HEADER
+
+A, B = b'\xaa' * 6, b'\xbb' * 6
+
+
+class Registry:
+    contexts = dict()
+
+
+def frame(ip, mac):
+    return b'\xff' * 6 + mac + b'\x08\x06' + ARP_HEADER.pack(
+        1, 0x0800, 6, 4, 2, mac, socket.inet_aton(ip), b'\0' * 6, socket.inet_aton('192.168.1.9'))
+
+
+def types(watch):
+    return [event['type'] for event in watch.get_events()]
+
+
+def test_two_macs_on_one_ip_conflict_then_flip_flop():
+    watch = ArpWatch(Registry())
+    watch.handle('eth0', frame('192.168.1.1', A), 100.0)
+    watch.handle('eth0', frame('192.168.1.1', B), 101.0)
+    watch.handle('eth0', frame('192.168.1.1', A), 102.0)
+    assert types(watch) == [IP_CONFLICT, FLIP_FLOP]
+
+
+def test_a_late_move_is_a_binding_change():
+    watch = ArpWatch(Registry())
+    watch.handle('eth0', frame('192.168.1.1', A), 100.0)
+    watch.handle('eth0', frame('192.168.1.1', B), 500.0)
+    assert types(watch) == [BINDING_CHANGED]
+
+
+def test_the_same_ip_on_two_interfaces_is_two_bindings():
+    watch = ArpWatch(Registry())
+    watch.handle('eth0', frame('192.168.1.1', A), 100.0)
+    watch.handle('wlan0', frame('192.168.1.1', B), 101.0)
+    watch.handle('eth0', frame('192.168.1.1', A), 102.0)
+    assert types(watch) == []
+    assert sorted((binding['iface'], binding['mac']) for binding in watch.get_bindings()) == \
+        [('eth0', 'aa:aa:aa:aa:aa:aa'), ('wlan0', 'bb:bb:bb:bb:bb:bb')]
+
+
+def test_older_frames_never_replace_a_binding():
+    watch = ArpWatch(Registry())
+    watch.handle('eth0', frame('192.168.1.1', A), 100.0)
+    watch.handle('eth0', frame('192.168.1.1', B), 100.0 - 30 * 86400)
+    assert types(watch) == []
+    binding, = watch.get_bindings()
+    assert binding['mac'] == 'aa:aa:aa:aa:aa:aa' and binding['last_seen'] == 100.0
+    assert watch.metrics()['stale'] == 1
+
+
+def test_a_spawned_watch_keeps_its_own_bindings():
+    watch = ArpWatch(Registry())
+    watch.handle('eth0', frame('192.168.1.1', A), 100.0)
+    capture = watch.spawn()
+    capture.handle('eth0', frame('192.168.1.1', B), 50.0)
+    assert len(capture.get_bindings()) == 1
+    assert watch.get_bindings()[0]['mac'] == 'aa:aa:aa:aa:aa:aa'
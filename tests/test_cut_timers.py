@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip('bottle')
+pytest.importorskip('scapy')
+
+import server
+from timerwheel import TimerWheel
+
+VICTIM = {'ip': '10.0.0.5', 'mac': 'aa:00:00:00:00:05'}
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Context:
+    """
+    An interface that records the frames it is asked to send
+    """
+    iface = 'eth0'
+
+    def __init__(self):
+        self.gw = {'ip': '10.0.0.1', 'mac': 'aa:00:00:00:00:01'}
+        self.sent = list()
+
+    def _check(self):
+        if not self.gw.get('mac'):
+            raise ValueError('Interface {} has no reachable gateway'.format(self.iface))
+
+    def spoof(self, victim, count):
+        self._check()
+        self.sent.append(('spoof', victim['ip']))
+
+    def unspoof(self, victim, count):
+        self._check()
+        self.sent.append(('unspoof', victim['ip']))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    ctx = Context()
+    clock = Clock()
+    monkeypatch.setattr(server, 'victims', dict())
+    monkeypatch.setattr(server, 'cut_timers', TimerWheel(clock=clock))
+    monkeypatch.setattr(server.interfaces, 'get', lambda iface=None: ctx if iface in (None, 'eth0') else None)
+    monkeypatch.setattr(server, 'enable_ip_forward', lambda: None)
+    monkeypatch.setattr(server, 'disable_ip_forward', lambda: None)
+
+    def call(method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+                   'SERVER_PORT': '0', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+                   'wsgi.input': io.BytesIO(data), 'CONTENT_LENGTH': str(len(data)),
+                   'CONTENT_TYPE': 'application/json', 'wsgi.errors': io.StringIO()}
+        return json.loads(b''.join(server.app(environ, lambda status, headers, exc_info=None: None)))
+
+    call.ctx, call.clock = ctx, clock
+    return call
+
+
+def test_timed_cut_is_resumed_once_it_expires(api):
+    assert api('POST', '/cut', dict(VICTIM, duration=5)) == {'status': 'success', 'remaining': 5.0}
+    victim, = api('GET', '/victims')['victims']
+    assert victim['remaining'] == 5.0 and victim['duration'] == 5.0
+    api.clock.now += 4
+    server.spoof_victims()
+    assert api('GET', '/victims')['victims'][0]['remaining'] == 1.0
+    api.clock.now += 1.2
+    server.spoof_victims()
+    assert api('GET', '/victims')['victims'] == []
+    assert ('unspoof', VICTIM['ip']) in api.ctx.sent
+
+
+def test_duration_retimes_and_null_lifts_the_limit(api):
+    api('POST', '/cut', dict(VICTIM, duration=5))
+    assert api('POST', '/cut', VICTIM)['msg'] == 'Host already cut'
+    assert api('POST', '/cut', dict(VICTIM, duration=60))['remaining'] == 60.0
+    assert api('POST', '/cut', dict(VICTIM, duration=None))['remaining'] is None
+    api.clock.now += 3600
+    server.spoof_victims()
+    victim, = api('GET', '/victims')['victims']
+    assert victim['remaining'] is None and victim['duration'] is None
+
+
+@pytest.mark.parametrize('duration', [0, -1, 'soon', True])
+def test_invalid_durations_are_refused(api, duration):
+    assert api('POST', '/cut', dict(VICTIM, duration=duration))['status'] == 'error'
+    assert server.victims == {}
+
+
+def test_resume_cancels_the_timer(api):
+    api('POST', '/cut', dict(VICTIM, duration=5))
+    assert api('POST', '/resume', VICTIM) == {'status': 'success'}
+    assert len(server.cut_timers) == 0
+
+
+def test_failed_expiry_keeps_the_host_cut_and_retries(api):
+    api('POST', '/cut', dict(VICTIM, duration=1))
+    api.ctx.gw['mac'] = ''
+    api.clock.now += 2
+    server.spoof_victims()
+    assert len(server.victims) == 1 and len(server.cut_timers) == 1
+    assert api('POST', '/resume', VICTIM)['status'] == 'error'
+    api.ctx.gw['mac'] = 'aa:00:00:00:00:01'
+    api.clock.now += server.settings.spoof.interval + 0.2
+    server.spoof_victims()
+    assert server.victims == {}
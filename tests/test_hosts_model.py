@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip('PySide6')
+
+from PySide6.QtCore import Qt
+
+from hosts_model import HostTableModel, make_proxy, IP, SORT_ROLE
+
+
+def host(ip, mac, **fields):
+    return dict({'ip': ip, 'mac': mac, 'hostname': ''}, **fields)
+
+
+def sorted_ips(proxy):
+    return [proxy.index(row, IP).data() for row in range(proxy.rowCount())]
+
+
+@pytest.fixture
+def model(qt_app):
+    return HostTableModel(dict(), list(), dict())
+
+
+def test_sorts_mixed_address_families(model):
+    proxy = make_proxy(model)
+    model.set_hosts([host('fe80::1', 'aa:00:00:00:00:01'), host('10.0.0.10', 'aa:00:00:00:00:02'),
+                     host('2001:db8::2', 'aa:00:00:00:00:03'), host('10.0.0.9', 'aa:00:00:00:00:04'),
+                     host('2001:db8::10', 'aa:00:00:00:00:05')])
+    proxy.sort(IP, Qt.AscendingOrder)
+    assert sorted_ips(proxy) == ['10.0.0.9', '10.0.0.10', '2001:db8::2', '2001:db8::10', 'fe80::1']
+    proxy.sort(IP, Qt.DescendingOrder)
+    assert sorted_ips(proxy) == ['fe80::1', '2001:db8::10', '2001:db8::2', '10.0.0.10', '10.0.0.9']
+
+
+def test_sort_key_of_an_ipv6_host(model):
+    model.set_hosts([host('ff02::fb', 'aa:00:00:00:00:01')])
+    assert isinstance(model.index(0, IP).data(SORT_ROLE), str)
+
+
+def test_diff_signals_only_what_changed(model):
+    proxy = make_proxy(model)
+    proxy.sort(IP, Qt.AscendingOrder)
+    model.set_hosts([host('10.0.0.1', 'aa:00:00:00:00:01'), host('fe80::2', 'aa:00:00:00:00:02'),
+                     host('10.0.0.3', 'aa:00:00:00:00:03'), host('2001:db8::4', 'aa:00:00:00:00:04')])
+    signals = list()
+    model.rowsRemoved.connect(lambda parent, first, last: signals.append(('removed', first, last)))
+    model.rowsInserted.connect(lambda parent, first, last: signals.append(('inserted', first, last)))
+    model.dataChanged.connect(lambda first, last, roles=(): signals.append(('changed', first.row(), last.row())))
+    # fe80::2 leaves, 10.0.0.3 gets a name, 2001:db8::4 is unchanged and fe80::5 joins
+    model.set_hosts([host('10.0.0.1', 'aa:00:00:00:00:01'), host('10.0.0.3', 'aa:00:00:00:00:03', hostname='nas'),
+                     host('2001:db8::4', 'aa:00:00:00:00:04'), host('fe80::5', 'aa:00:00:00:00:05')])
+    assert signals == [('removed', 1, 1), ('changed', 1, 1), ('inserted', 3, 3)]
+    assert [model.host(row)['mac'] for row in range(model.rowCount())] == \
+        ['aa:00:00:00:00:01', 'aa:00:00:00:00:03', 'aa:00:00:00:00:04', 'aa:00:00:00:00:05']
+    assert sorted_ips(proxy) == ['10.0.0.1', '10.0.0.3', '2001:db8::4', 'fe80::5']
+
+
+def test_unchanged_hosts_signal_nothing(model):
+    hosts = [host('10.0.0.1', 'aa:00:00:00:00:01'), host('fe80::2', 'aa:00:00:00:00:02')]
+    model.set_hosts(hosts)
+    signals = list()
+    model.dataChanged.connect(lambda *args: signals.append(args))
+    model.rowsInserted.connect(lambda *args: signals.append(args))
+    model.set_hosts([dict(entry) for entry in hosts])
+    assert signals == []
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+pytest.importorskip('scapy')
+
+from ingest import ingest_path
+
+
+@pytest.fixture
+def captures(tmp_path):
+    directory = tmp_path / 'captures'
+    directory.mkdir()
+    (directory / 'lan.pcap').write_bytes(b'')
+    (tmp_path / 'secret').write_bytes(b'')
+    os.symlink(tmp_path / 'secret', directory / 'link.pcap')
+    return directory
+
+
+def test_root_may_ingest_any_file(captures):
+    path = str(captures.parent / 'secret')
+    assert ingest_path(path, 0, '') == path
+
+
+def test_others_only_below_the_directory(captures):
+    assert ingest_path(str(captures / 'lan.pcap'), 1000, str(captures)) == str(captures / 'lan.pcap')
+    assert ingest_path(str(captures / '..' / 'secret'), 1000, str(captures)) is None
+    assert ingest_path(str(captures), 1000, str(captures)) is None
+
+
+def test_symlinks_are_resolved_before_the_check(captures):
+    assert ingest_path(str(captures / 'link.pcap'), 1000, str(captures)) is None
+
+
+def test_without_a_directory_only_root_may_ingest(captures):
+    assert ingest_path(str(captures / 'lan.pcap'), 1000, '') is None
+    assert ingest_path(str(captures / 'lan.pcap'), None, '') is None # TCP clients have no uid
@@ -0,0 +1,80 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('scapy')
+
+from presence import PresenceMonitor
+
+
+class Context:
+    def __init__(self, iface, hosts):
+        self.iface = iface
+        self.hosts = {mac: {'ip': ip, 'mac': mac} for ip, mac in hosts}
+
+
+class Registry:
+    def __init__(self, *contexts):
+        self.contexts = {ctx.iface: ctx for ctx in contexts}
+
+    def get(self, iface):
+        return self.contexts.get(iface)
+
+
+class RecordingMonitor(PresenceMonitor):
+    """
+    A monitor that records its probes instead of sending them
+    """
+
+    def __init__(self, *args, delay=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.probed = list()
+        self.threads = set()
+
+    def _probe(self, iface, entries):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        self.probed.extend(entry.mac for entry in entries)
+
+
+def macs(count, prefix='aa'):
+    return [('10.0.0.{}'.format(n + 1), '{}:00:00:00:00:{:02x}'.format(prefix, n)) for n in range(count)]
+
+
+def test_late_tick_probes_every_host_that_came_due():
+    monitor = RecordingMonitor(Registry(Context('eth0', macs(50))), interval=10)
+    monitor.track()
+    for entry in monitor.hosts.values():
+        entry.due -= 20 # As if the ticks of the whole interval were missed
+    monitor.tick()
+    assert sorted(monitor.probed) == sorted(monitor.hosts)
+    monitor.probed.clear()
+    monitor.tick()
+    assert monitor.probed == [] # Not again before the next interval
+
+
+def test_interfaces_are_probed_in_parallel():
+    monitor = RecordingMonitor(Registry(Context('eth0', macs(3)), Context('wlan0', macs(3, 'bb'))),
+                               interval=10, delay=0.3)
+    monitor.track()
+    for entry in monitor.hosts.values():
+        entry.due = 0
+    started = time.monotonic()
+    monitor.tick()
+    assert time.monotonic() - started < 0.5
+    assert len(monitor.probed) == 6 and len(monitor.threads) == 2
+
+
+def test_new_hosts_evict_stale_ones_not_each_other():
+    ctx = Context('eth0', macs(3))
+    monitor = RecordingMonitor(Registry(ctx), max_hosts=3)
+    monitor.track()
+    for entry in monitor.hosts.values():
+        entry.added -= 3600
+    alive = monitor.hosts['aa:00:00:00:00:01']
+    alive.last_seen = time.time()
+    ctx.hosts = {mac: {'ip': ip, 'mac': mac} for ip, mac in macs(2, 'cc')}
+    monitor.track()
+    assert sorted(monitor.hosts) == ['aa:00:00:00:00:01', 'cc:00:00:00:00:00', 'cc:00:00:00:00:01']
@@ -0,0 +1,35 @@
+import pytest
+
+import settings
+from settings import ConfigError, Settings, parse
+
+
+def test_empty_document_gives_the_defaults():
+    assert parse({}) == Settings()
+
+
+def test_values_are_checked_and_ints_widen_to_floats():
+    parsed = parse({'spoof': {'interval': 2}, 'protect': {'count': 7}, 'ingest': {'directory': '/srv/pcap'}})
+    assert parsed.spoof.interval == 2.0 and isinstance(parsed.spoof.interval, float)
+    assert parsed.protect.count == 7
+    assert parsed.ingest.directory == '/srv/pcap'
+
+
+@pytest.mark.parametrize('document', [
+    {'nope': {}},
+    {'spoof': {'nope': 1}},
+    {'spoof': 3},
+    {'spoof': {'count': 'many'}},
+    {'spoof': {'count': True}},
+    {'protect': {'count': 0}},
+    {'scan': {'prefix': 31}},
+])
+def test_invalid_documents_are_refused(document):
+    with pytest.raises(ConfigError):
+        parse(document)
+
+
+def test_the_shipped_file_parses_to_the_defaults():
+    tomllib = settings.tomllib or pytest.skip('no TOML parser')
+    with open(settings.os.path.join(settings.os.path.dirname(settings.__file__), 'tuxcut.toml'), 'rb') as f:
+        assert parse(tomllib.load(f)) == Settings()
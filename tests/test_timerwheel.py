@@ -0,0 +1,81 @@
+from timerwheel import TimerWheel
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def wheel(slots=16):
+    clock = Clock()
+    return TimerWheel(resolution=0.1, slots=slots, clock=clock), clock
+
+
+def test_fires_once_its_deadline_has_passed():
+    timers, clock = wheel()
+    timers.schedule('a', 1.0)
+    clock.now += 0.95
+    assert timers.advance() == []
+    clock.now += 0.1
+    assert timers.advance() == ['a']
+    assert timers.advance() == []
+    assert 'a' not in timers and len(timers) == 0
+
+
+def test_fires_earliest_first():
+    timers, clock = wheel()
+    timers.schedule('late', 0.5)
+    timers.schedule('early', 0.2)
+    timers.schedule('middle', 0.35)
+    clock.now += 1
+    assert timers.advance() == ['early', 'middle', 'late']
+
+
+def test_cancel():
+    timers, clock = wheel()
+    timers.schedule('a', 0.5)
+    timers.schedule('b', 0.5)
+    assert timers.cancel('a')
+    assert not timers.cancel('a')
+    assert not timers.cancel('never scheduled')
+    clock.now += 1
+    assert timers.advance() == ['b']
+
+
+def test_reschedule_replaces_the_timer():
+    timers, clock = wheel()
+    timers.schedule('a', 0.5)
+    timers.schedule('a', 3.0)
+    assert len(timers) == 1
+    clock.now += 1
+    assert timers.advance() == []
+    assert 1.9 < timers.remaining('a') <= 2.0
+    clock.now += 2
+    assert timers.advance() == ['a']
+    assert timers.remaining('a') is None
+
+
+def test_timers_beyond_one_turn_wait_for_their_turn():
+    timers, clock = wheel(slots=16) # One turn is 1.6 s
+    timers.schedule('far', 5.0)
+    timers.schedule('near', 0.3)
+    fired = list()
+    for step in range(48): # Three turns, up to 4.8 s
+        clock.now += 0.1
+        fired += timers.advance()
+    assert fired == ['near']
+    clock.now += 0.3
+    assert timers.advance() == ['far']
+
+
+def test_a_stall_longer_than_a_turn_fires_everything_due():
+    timers, clock = wheel(slots=16)
+    for n in range(40):
+        timers.schedule(n, 0.1 * n)
+    timers.schedule('later', 60.0)
+    clock.now += 10
+    assert timers.advance() == list(range(40))
+    assert 'later' in timers